@@ -1,23 +1,23 @@
-import streamlit as st
-from docx import Document
-from docx.shared import Inches, Mm, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
-from docx.oxml import OxmlElement, ns 
-import google.generativeai as genai
-from io import BytesIO
-import time
 import os
-import re
-import uuid
-import itertools
-import random
-import string
-
-# --- LIBRERÍAS PRO ---
-import pyphen  
-import mammoth 
-from bs4 import BeautifulSoup 
-from ebooklib import epub 
+import time
+from functools import partial
+
+RUN_STARTED = time.perf_counter()
+
+import streamlit as st
+
+from nativeflow.startup import STARTUP
+
+# Solo lo ligero y lo común a todos los módulos; lo pesado se importa en cada módulo
+with STARTUP.imports("núcleo (caché, cuota, métricas)"):
+    from nativeflow.batch import collect_inputs, run_batch
+    from nativeflow.cache import ResponseCache
+    from nativeflow.jobqueue import FINISHED, QUEUED, RUNNING, JobQueue, SharedRateLimiter
+    from nativeflow.journal import JobJournal, content_hash
+    from nativeflow.metrics import Metrics
+    from nativeflow.llm import InstructedModels, LLMError, LLMExecutor, LiveOutput, call_model, gemini_model, DEFAULT_WORKERS
+with STARTUP.imports("python-docx"):
+    from nativeflow.docx_tools import DocumentCache
 
 # --- 1. CONFIGURACIÓN GLOBAL ---
 st.set_page_config(page_title="Suite Autores 360 ULTIMATE", page_icon="📚", layout="wide")
@@ -33,13 +33,61 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- 2. DICCIONARIO DE TEMAS ---
-THEMES = {
-    "Neutro (Estándar)": {"font": "Calibri", "header": "Calibri", "size": 11},
-    "Romance / Fantasía (Serif)": {"font": "Garamond", "header": "Garamond", "size": 12},
-    "Thriller / Crimen (Sharp)": {"font": "Georgia", "header": "Arial Black", "size": 11},
-    "No Ficción / Negocios": {"font": "Arial", "header": "Arial", "size": 10}
-}
+# --- 2. RECURSOS COMPARTIDOS ---
+@st.cache_resource
+def get_response_cache():
+    # Persistente en disco y compartida por todas las sesiones del proceso
+    return ResponseCache()
+
+@st.cache_resource
+def get_document_cache():
+    # Documentos ya parseados por hash de contenido: los reruns y botones no vuelven a abrir el zip
+    return DocumentCache(max_entries=8)
+
+@st.cache_resource
+def get_model(model_name, api_key):
+    # Un cliente por proceso y prompt (system_instruction); google.generativeai solo se importa
+    # si se abre un módulo con IA
+    with STARTUP.imports("google.generativeai"):
+        import google.generativeai as genai
+    t0 = time.perf_counter()
+    genai.configure(api_key=api_key)
+    models = InstructedModels(lambda system: gemini_model(model_name, api_key, system))
+    models.get(None)
+    STARTUP.record("cliente del modelo", time.perf_counter() - t0)
+    return models
+
+@st.cache_resource
+def get_rate_limiter():
+    # Cuota global en SQLite: la comparten todas las sesiones y los trabajadores de la cola
+    return SharedRateLimiter()
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+# Procesos trabajadores por servidor (0 = solo los lanzados aparte con `python -m nativeflow.worker`)
+QUEUE_PROCESSES = int(os.environ.get("NATIVEFLOW_QUEUE_PROCESSES", 2))
+
+@st.cache_resource
+def get_worker_pool(api_key):
+    # Se arrancan al encolar el primer trabajo (o si al abrir la app ya hay trabajos pendientes)
+    with STARTUP.imports("trabajadores de la cola"):
+        from nativeflow.worker import start_workers
+    return start_workers(QUEUE_PROCESSES, api_key=api_key, threads=DEFAULT_WORKERS)
+
+def show_startup():
+    # Informe de arranque: primer pintado, este rerun e importaciones perezosas del proceso
+    s = STARTUP.summary()
+    with st.expander("⏱️ Arranque y tiempos de carga", expanded=False):
+        if s["first_paint"] is not None:
+            st.caption(f"Primer pintado: {s['first_paint']:.2f} s desde el inicio del proceso · {s['runs']} ejecuciones")
+        st.caption(f"Este rerun: {time.perf_counter() - RUN_STARTED:.2f} s")
+        if s["entries"]:
+            st.table({"Carga": [e[0] for e in s["entries"]],
+                      "Segundos": [round(e[1], 3) for e in s["entries"]],
+                      "Módulos": [e[2] for e in s["entries"]],
+                      "Paquetes": [", ".join(e[3][:6]) for e in s["entries"]]})
 
 # --- 3. BARRA LATERAL ---
 with st.sidebar:
@@ -48,11 +96,16 @@ with st.sidebar:
     
     try:
         api_key = st.secrets["GOOGLE_API_KEY"]
-        genai.configure(api_key=api_key)
         st.success("✅ Motor IA Activo")
     except:
         st.error("❌ Falta API Key en Secrets")
         st.stop()
+
+    # Identidad para la cola de trabajos; va en la URL para recuperar "Mis trabajos" tras cerrar la pestaña
+    url_user = st.query_params.get("user", "")
+    user_name = st.text_input("👤 Tu nombre (cola de trabajos):", url_user).strip()
+    if user_name != url_user: st.query_params["user"] = user_name
+    user_name = user_name or "anónimo"
         
     st.divider()
     
@@ -69,106 +122,201 @@ with st.sidebar:
     
     st.divider()
     MODEL_NAME = 'models/gemini-2.5-pro' 
-    model = genai.GenerativeModel(MODEL_NAME)
+    # Solo los módulos 1 y 3 llaman al modelo
+    model = get_model(MODEL_NAME, api_key) if selected_module[:2] in ("1.", "3.") else None
+
+    rate_limiter = get_rate_limiter()
+    with st.expander("🚦 Cuota y Paralelismo IA", expanded=False):
+        rates = rate_limiter.rates()
+        api_rpm = st.number_input("Peticiones por minuto (RPM):", 1, 2000, rates["rpm"])
+        api_tpm = st.number_input("Tokens por minuto (TPM):", 1000, 10_000_000, rates["tpm"], step=1000)
+        if (api_rpm, api_tpm) != (rates["rpm"], rates["tpm"]): rate_limiter.set_rates(int(api_rpm), int(api_tpm))
+        st.caption("🌐 Cuota global: la comparten todos los usuarios y los trabajos en cola.")
+        api_workers = st.number_input("Llamadas simultáneas:", 1, 32, DEFAULT_WORKERS)
+        stream_output = st.checkbox("📡 Mostrar respuestas en vivo (streaming)", value=True)
+
+    with st.expander("🗄️ Caché de Respuestas IA", expanded=False):
+        use_cache = st.checkbox("Reutilizar respuestas guardadas", value=True)
+        if st.button("🗑️ Vaciar caché", key="btn_clear_cache"):
+            get_response_cache().clear()
+            st.toast("Caché vaciada.")
+        c_stats = get_response_cache().stats()
+        st.caption(f"{c_stats['entries']} respuestas · {c_stats['bytes'] / 1e6:.1f} MB · "
+                   f"aciertos {c_stats['hits']} / fallos {c_stats['misses']}")
+        d_stats = get_document_cache().stats()
+        st.caption(f"📄 Documentos: {d_stats['parses']} parseados · {d_stats['hits']} reutilizados · "
+                   f"{d_stats['seconds_saved']:.2f} s ahorrados")
+
+job_queue = get_job_queue()
+if job_queue.counts(): get_worker_pool(api_key)  # Trabajos pendientes de una ejecución anterior
+response_cache = get_response_cache() if use_cache else None
+doc_cache = get_document_cache()
+api_errors = []
 
 # --- 4. FUNCIONES AUXILIARES ---
 
-def create_element(name): return OxmlElement(name)
-def create_attribute(element, name, value): element.set(ns.qn(name), value)
-
-def add_page_number(paragraph):
-    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    page_run = paragraph.add_run()
-    t1 = create_element('w:fldChar'); create_attribute(t1, 'w:fldCharType', 'begin'); page_run._r.append(t1)
-    t2 = create_element('w:instrText'); create_attribute(t2, 'xml:space', 'preserve'); t2.text = "PAGE"; page_run._r.append(t2)
-    t3 = create_element('w:fldChar'); create_attribute(t3, 'w:fldCharType', 'end'); page_run._r.append(t3)
-
-def enable_native_hyphenation(doc):
-    settings = doc.settings.element
-    hyphenation_zone = OxmlElement('w:autoHyphenation')
-    create_attribute(hyphenation_zone, 'w:val', 'true')
-    settings.append(hyphenation_zone)
-
-def prevent_runts_in_paragraph(paragraph):
-    text = paragraph.text.strip()
-    if not text or len(text) < 20: return 
-    last_space = text.rfind(' ')
-    if last_space != -1:
-        paragraph.text = text[:last_space] + "\u00A0" + text[last_space+1:]
-
-def delete_paragraph(paragraph):
-    p = paragraph._element
-    p.getparent().remove(p)
-    p._p = p._element = None
-
-def stitch_paragraphs(doc):
-    for i in range(len(doc.paragraphs) - 2, -1, -1):
-        p_curr = doc.paragraphs[i]
-        p_next = doc.paragraphs[i+1]
-        text_curr = p_curr.text.strip()
-        text_next = p_next.text.strip()
-        if not text_curr or not text_next: continue
-        if p_curr.style.name.startswith('Heading') or p_next.style.name.startswith('Heading'): continue
-        if text_curr[-1] not in ['.', '!', '?', '"', '”', ':']:
-            p_curr.text = text_curr + " " + text_next
-            delete_paragraph(p_next)
-
-def nuclear_clean(text):
-    if not text: return text
-    text = text.replace('\n', ' ').replace('\r', ' ').replace('\v', ' ').replace('\f', ' ')
-    return " ".join(text.split())
-
-def clean_markdown(text):
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text) 
-    text = re.sub(r'\*(.*?)\*', r'\1', text)      
-    text = re.sub(r'__(.*?)__', r'\1', text)      
-    text = re.sub(r'^#+\s*', '', text) 
-    return nuclear_clean(text).strip()
-
-def call_api(prompt, temp=0.7):
-    # 1. Apagamos los filtros de seguridad para que permita términos de psicología (ansiedad, miedo, etc.)
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
-    ]
-    
-    last_error = ""
-    
-    for intento in range(3):
-        try:
-            # 2. Llamamos a la API con los filtros apagados
-            response = model.generate_content(
-                prompt, 
-                generation_config={"temperature": temp},
-                safety_settings=safety_settings
-            )
-            
-            # 3. Pausa OBLIGATORIA de 2.5 segundos para no saturar el servidor de Google
-            time.sleep(2.5) 
-            
-            return response.text.strip()
-            
-        except Exception as e:
-            # Si hay un error, guardamos el mensaje real y esperamos 4 segundos antes de reintentar
-            last_error = str(e)
-            time.sleep(4) 
-            
+def call_api(prompt, temp=0.7, metrics=None, live=None, target=None, system=None):
+    # Se ejecuta en hilos del executor: nada de st.* aquí, los errores se muestran al final
+    # `target` permite usar otro modelo (p. ej. el rápido de la cascada) con la misma cuota
+    # `system`: el prompt del módulo, fijado en el modelo una vez; aquí solo viaja el texto
+    try:
+        return call_model((target or model).get(system), prompt, temp=temp, limiter=rate_limiter, cache=response_cache,
+                          metrics=metrics, on_chunk=live.update if live is not None else None, system=system)
+    except LLMError as e:
+        api_errors.append(str(e))
+        return "[ERROR API]"
+    finally:
+        if live is not None: live.finish()
+
+def was_cancelled(job):
+    # El botón "Cancelar" interrumpe la ejecución (rerun) y deja esta marca para la siguiente
+    if st.session_state.get("cancelled_job") == job:
+        st.session_state.cancelled_job = None
+        return True
+    return False
+
+def job_controls(job, stopped=False):
+    """Executor propio del trabajo con botón de cancelar y vista previa en vivo.
+
+    Si `stopped`, el executor ya nace cancelado: el trabajo solo recupera lo guardado en
+    el diario y devuelve el resultado parcial sin llamar al modelo.
+    """
+    if stopped:
+        job_executor = LLMExecutor(max_workers=int(api_workers))
+        job_executor.cancel.set()
+        return job_executor, None
+    st.button("⏹️ Cancelar (se conserva lo terminado)", key=f"btn_cancel_{job}",
+              on_click=lambda: st.session_state.update(cancelled_job=job))
+    live = LiveOutput() if stream_output else None
+    preview = st.empty()
+
+    def on_tick():
+        text, running = live.snapshot()
+        if text: preview.caption(f"📡 En vivo ({running} en curso): …{text[-600:]}")
+
+    return LLMExecutor(max_workers=int(api_workers), on_tick=on_tick if live else None), live
+
+def show_cancelled(job_executor, unit):
+    if job_executor.cancelled:
+        st.warning(f"⏹️ Trabajo cancelado: el resultado incluye solo los {unit} terminados. "
+                   "Vuelve a pulsar el botón para continuar desde ahí.")
+
+def show_api_errors():
     # Si falla los 3 intentos, mostramos el ERROR REAL en la pantalla para saber exactamente qué pasó
-    st.error(f"🛑 Error interno de Google: {last_error}")
-    return "[ERROR API]"
+    for err in dict.fromkeys(api_errors):
+        st.error(f"🛑 Error interno de Google: {err}")
+    api_errors.clear()
+
+def batch_panel(pipeline, options, key):
+    """Modo lote: .docx sueltos o un ZIP, procesados en paralelo y devueltos en un ZIP."""
+    files = st.file_uploader("Sube varios .docx o un .zip", type=["docx", "zip"],
+                             accept_multiple_files=True, key=f"batch_{key}")
+    workers = st.number_input("Procesos en paralelo:", 1, 64, os.cpu_count() or 1, key=f"batch_workers_{key}")
+    if files and st.button("📦 Procesar lote", key=f"btn_batch_{key}"):
+        inputs, bad = collect_inputs([(f.name, f.getvalue()) for f in files])
+        for name, err in bad: st.error(f"❌ {name}: {err}")
+        if not inputs:
+            st.warning("No se encontraron archivos .docx en la subida.")
+            return
+        p_bar = st.progress(0, text=f"0/{len(inputs)} archivos")
+        log = st.empty()
+        lines = []
+
+        def on_file(done, total, result):
+            filename, _, _, error, seconds = result
+            lines.append(f"❌ {filename}: {error}" if error else f"✅ {filename} ({seconds:.1f}s)")
+            p_bar.progress(done / total, text=f"{done}/{total} archivos")
+            log.text("\n".join(lines[-15:]))
+
+        metrics = Metrics(f"batch_{pipeline}")
+        archive, results = run_batch(pipeline, inputs, options, workers=int(workers), on_file=on_file, metrics=metrics)
+        failed = [r for r in results if r[2]]
+        if failed:
+            st.warning(f"⚠️ {len(failed)} de {len(results)} archivos fallaron (detalle en informe_lote.txt).")
+            for filename, _, error, _ in failed: st.error(f"❌ {filename}: {error}")
+        st.success(f"✅ Lote terminado: {len(results) - len(failed)}/{len(results)} archivos.")
+        st.download_button("⬇️ Descargar ZIP", archive, f"lote_{pipeline}.zip", mime="application/zip", key=f"dl_batch_{key}")
+        show_metrics(metrics)
+
+def show_metrics(metrics):
+    # Panel de instrumentación al final de cada trabajo + exportación JSON / Prometheus
+    s = metrics.summary()
+    c = s["counters"]
+    base = metrics.export()
+    with st.expander("⏱️ Instrumentación del trabajo", expanded=False):
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Tiempo total", f"{s['wall_seconds']:.1f} s")
+        m2.metric("Llamadas al modelo", c.get("model_calls", 0))
+        m3.metric("Latencia p50 / p95", f"{s['latency']['p50']:.1f} / {s['latency']['p95']:.1f} s")
+        m4.metric("Aciertos de caché", f"{c.get('cache_hits', 0)} / {c.get('cache_hits', 0) + c.get('cache_misses', 0)}")
+        st.caption(f"Tokens: {c.get('prompt_tokens', 0)} entrada · {c.get('response_tokens', 0)} salida · "
+                   f"reintentos {c.get('retries', 0)} · caracteres {c.get('prompt_chars', 0)} → {c.get('response_chars', 0)}")
+        if c.get("doc_parses") or c.get("doc_cache_hits"):
+            st.caption(f"📄 Documento: {c.get('doc_parses', 0)} parseos · {c.get('doc_cache_hits', 0)} copias desde caché · "
+                       f"{c.get('parse_seconds_saved', 0):.3f} s ahorrados")
+        if s["first_output"]["count"]:
+            st.caption(f"📡 Primer fragmento (streaming) p50 / p95: "
+                       f"{s['first_output']['p50']:.2f} / {s['first_output']['p95']:.2f} s")
+        # 'model', 'rate_limit_wait' y 'retry_wait' suman el tiempo de todos los hilos
+        st.table({"Etapa": list(s["stages"]), "Segundos": [round(v, 3) for v in s["stages"].values()]})
+        d1, d2 = st.columns(2)
+        d1.download_button("⬇️ Métricas JSON", metrics.to_json(), f"{metrics.job}_metrics.json", key=f"dl_mjson_{metrics.job}")
+        d2.download_button("⬇️ Métricas Prometheus", metrics.to_prometheus(), f"{metrics.job}_metrics.prom", key=f"dl_mprom_{metrics.job}")
+        st.caption(f"Guardado en {base}.json / .prom")
+
+JOB_LABELS = {"audit": "Auditoría", "rewrite": "Reescritura", "adapt": "Adaptación"}
+
+def submit_job(kind, uploaded, options):
+    # El trabajo sigue en los procesos trabajadores aunque se cierre la pestaña
+    get_worker_pool(api_key)
+    job_id = job_queue.submit(user_name, kind, uploaded.name, uploaded.getvalue(),
+                              dict(options, model_name=MODEL_NAME, use_cache=use_cache))
+    st.success(f"📥 {JOB_LABELS[kind]} en cola (trabajo #{job_id}). Sigue su estado y descárgala desde "
+               "«Mis trabajos» en la barra lateral; puedes cerrar la pestaña.")
+
+@st.fragment(run_every=5)
+def my_jobs_panel():
+    # Se refresca solo cada 5 s sin volver a ejecutar el resto de la página
+    counts = job_queue.counts()
+    st.caption(f"Cola global: {sum(counts.get(QUEUED, {}).values())} en espera · "
+               f"{sum(counts.get(RUNNING, {}).values())} en curso · {len(set().union(*counts.values()))} usuarios")
+    jobs = job_queue.jobs(user_name, limit=20)
+    if not jobs: st.caption(f"Sin trabajos de «{user_name}».")
+    for job in jobs:
+        st.markdown(f"**#{job['id']} {JOB_LABELS.get(job['kind'], job['kind'])}** · {job['filename']}  \n{job['status']}")
+        if job["status"] == RUNNING and job["total"]:
+            st.progress(min(1.0, job["done"] / job["total"]), text=f"{job['phase']} {job['done']}/{job['total']}")
+        if job["error"]: st.caption(f"❌ {job['error']}")
+        for err in job["stats"].get("api_errors", []): st.caption(f"🛑 {err}")
+        c1, c2 = st.columns(2)
+        if job["status"] in (QUEUED, RUNNING):
+            c1.button("⏹️ Cancelar", key=f"q_cancel_{job['id']}", on_click=job_queue.cancel, args=(job["id"], user_name))
+        elif job["status"] in FINISHED:
+            # Los bytes se leen al pulsar: el panel se redibuja cada 5 s
+            if job["output_name"]:
+                c1.download_button("⬇️ Descargar", lambda job_id=job["id"]: job_queue.output_data(job_id) or b"",
+                                   job["output_name"], key=f"q_dl_{job['id']}")
+            c2.button("🗑️ Quitar", key=f"q_forget_{job['id']}", on_click=job_queue.forget, args=(job["id"], user_name))
+
+with st.sidebar:
+    with st.expander("📋 Mis trabajos (cola)", expanded=False):
+        my_jobs_panel()
 
 # ==============================================================================
 # MÓDULO 1: AUDITOR & CORRECTOR (V9.1 - PERSISTENCIA FIX)
 # ==============================================================================
 if "1." in selected_module:
+    with STARTUP.imports("módulo 1"):
+        from nativeflow.audit import DEFAULT_BATCH_CHARS, audit_manuscript
+        from nativeflow.fingerprints import FingerprintStore
+        from nativeflow.prescreen import Cascade, HeuristicScreen
+        from nativeflow.rewrite import parse_overrides, rewrite_manuscript
     st.header("💎 Auditoría & Corrección IA (Persistente)")
     
     # 1. INICIALIZACIÓN DE MEMORIA (STATE)
     if 'audit_file_data' not in st.session_state: st.session_state.audit_file_data = None
     if 'rewrite_file_data' not in st.session_state: st.session_state.rewrite_file_data = None
-    if 'current_file_name' not in st.session_state: st.session_state.current_file_name = ""
+    if 'current_file_hash' not in st.session_state: st.session_state.current_file_hash = ""
 
     # 2. PROMPTS DE INGENIERO
     default_audit = """Actúa como un editor experto en literatura. Tu objetivo es detectar "Espanglish" y problemas de tono.
@@ -190,46 +338,100 @@ if "1." in selected_module:
     with st.expander("⚙️ Configuración de Cerebro IA (Prompts)", expanded=False):
         audit_prompt = st.text_area("Prompt Auditoría:", default_audit, height=100)
         rewrite_prompt = st.text_area("Prompt Corrección:", default_rewrite, height=100)
+        batch_audit = st.checkbox("📦 Auditoría por lotes (varios párrafos por petición)", value=True)
+        batch_chars = st.number_input("Caracteres máximos por lote:", 1000, 50000, DEFAULT_BATCH_CHARS, step=500)
+        diff_audit = st.checkbox("🧬 Re-auditar solo párrafos nuevos o modificados (reutiliza veredictos ya auditados con este prompt)", value=True)
+        cascade_mode = st.selectbox("🪜 Pre-filtro en cascada (solo lo dudoso llega al modelo pro):",
+                                    ["Desactivado", "Modelo rápido", "Heurística + modelo rápido"],
+                                    help="La heurística solo aprueba fragmentos y líneas de relleno y manda directo al "
+                                         "pro lo que tiene señales claras; por sí sola no ahorra llamadas. Mide la "
+                                         "precisión y el recall frente a la auditoría completa con "
+                                         "`python -m benchmarks.bench_cascade` antes de activarlo.")
+        screen_model_name = st.text_input("Modelo rápido del pre-filtro:", "models/gemini-2.5-flash")
+        dedup = st.checkbox("♊ Agrupar párrafos repetidos (una petición por texto único)", value=True)
+    # Los veredictos de la cascada no valen para una auditoría sin ella (ni al revés)
+    audit_settings = audit_prompt if cascade_mode == "Desactivado" else f"{audit_prompt}\n[{cascade_mode}|{screen_model_name}]"
 
     uploaded_file = st.file_uploader("Sube tu manuscrito (.docx)", type=["docx"], key="mod1")
     
-    # Limpieza de memoria si cambia el archivo
-    if uploaded_file and uploaded_file.name != st.session_state.current_file_name:
+    # Limpieza de memoria si cambia el archivo (por contenido, no por nombre)
+    file_hash = content_hash(uploaded_file.getvalue()) if uploaded_file else ""
+    if uploaded_file and file_hash != st.session_state.current_file_hash:
         st.session_state.audit_file_data = None
         st.session_state.rewrite_file_data = None
-        st.session_state.current_file_name = uploaded_file.name
+        st.session_state.current_file_hash = file_hash
 
     if uploaded_file:
-        doc = Document(uploaded_file)
+        # Diarios en disco: sobreviven a reinicios y a volver a subir el mismo archivo
+        audit_journal = JobJournal("audit", file_hash, audit_settings)
+        rewrite_journal = JobJournal("rewrite", file_hash, rewrite_prompt)
+        # Veredictos por texto y ajustes; el nombre del archivo solo sirve para resumir qué cambió
+        fingerprints = FingerprintStore(audit_settings, uploaded_file.name) if diff_audit else None
         tab1, tab2 = st.tabs(["📊 Auditoría de Calidad", "🚀 Corrección de Estilo"])
         
         # --- PESTAÑA 1: AUDITORÍA ---
         with tab1:
-            st.info("⚠️ IMPORTANTE: No cambies de pestaña en el navegador mientras procesa. Si la pestaña se duerme, el proceso se corta.")
+            st.info("💾 El progreso se guarda párrafo a párrafo. Si la pestaña se duerme o se corta, vuelve a pulsar el botón y se reanudará donde quedó.")
+            if len(audit_journal):
+                st.caption(f"♻️ {len(audit_journal)} párrafos ya auditados en una ejecución anterior.")
+                if st.button("🗑️ Descartar progreso guardado", key="btn_reset_audit"):
+                    audit_journal.discard()
             
-            if st.button("🔍 Iniciar Auditoría", key="btn_audit"):
-                audit_doc = Document()
-                audit_doc.add_heading("Reporte de Auditoría Editorial", 0)
+            start_audit = st.button("🔍 Iniciar Auditoría", key="btn_audit")
+            if st.button("📥 Enviar a la cola (segundo plano)", key="btn_queue_audit"):
+                submit_job("audit", uploaded_file, {
+                    "prompt": audit_prompt, "settings": audit_settings, "batch": batch_audit,
+                    "max_chars": int(batch_chars), "diff_audit": diff_audit, "dedup": dedup,
+                    "heuristic": "Heurística" in cascade_mode,
+                    "screen_model": screen_model_name if "rápido" in cascade_mode else None})
+            stopped = was_cancelled("audit")
+            if start_audit or stopped:
                 progress_text = "Analizando párrafos..."
                 my_bar = st.progress(0, text=progress_text)
+                job_executor, live = job_controls("audit", stopped)
                 
-                total_p = len(doc.paragraphs)
-                for i, p in enumerate(doc.paragraphs):
-                    if len(p.text) > 20:
-                        prompt_final = f"{audit_prompt}\n\nTEXTO: '{p.text[:800]}'"
-                        res = call_api(prompt_final)
-                        if "CLEAN" not in res:
-                            audit_doc.add_paragraph(f"📌 Párrafo {i+1}:")
-                            audit_doc.add_paragraph(res)
-                            audit_doc.add_paragraph("-" * 20)
-                    my_bar.progress((i + 1) / total_p, text=f"Analizando {i+1}/{total_p}")
+                def on_audit(done, total, phase):
+                    my_bar.progress(done / total, text=f"Analizando {phase} {done}/{total}")
+                
+                metrics = Metrics("audit")
+                cascade = None
+                if cascade_mode != "Desactivado":
+                    screen_call = None
+                    if "rápido" in cascade_mode:
+                        screen_call = partial(call_api, metrics=metrics, target=get_model(screen_model_name, api_key))
+                    cascade = Cascade(HeuristicScreen() if "Heurística" in cascade_mode else None, screen_call)
+                report, b_stats = audit_manuscript(uploaded_file.getvalue(), audit_prompt,
+                                                   partial(call_api, metrics=metrics, live=live), job_executor,
+                                                   batch=batch_audit, max_chars=int(batch_chars),
+                                                   journal=audit_journal, on_progress=on_audit, metrics=metrics,
+                                                   fingerprints=fingerprints, doc_cache=doc_cache, cascade=cascade,
+                                                   dedup=dedup)
+                if batch_audit:
+                    st.caption(f"📦 {b_stats['batches']} lotes · {b_stats['fallbacks']} párrafos repetidos de uno en uno")
+                if b_stats['resumed']: st.caption(f"♻️ {b_stats['resumed']} párrafos recuperados del progreso guardado.")
+                if b_stats['duplicates']:
+                    st.caption(f"♊ {b_stats['duplicates']} párrafos repetidos auditados una sola vez · "
+                               f"{b_stats['dedup_calls_saved']} llamadas evitadas")
+                if cascade is not None:
+                    projected, actual = b_stats['pro_calls_projected'], b_stats['pro_calls']
+                    saved = projected - actual
+                    st.caption(f"🪜 Cascada: llamadas pro previstas {projected} · reales {actual} · "
+                               f"ahorradas {saved} ({saved / max(projected, 1):.0%}) · "
+                               f"filtro rápido {b_stats['screen_calls']} llamadas")
+                    st.caption("Decisiones: " + " · ".join(f"{tier} {n}" for tier, n in sorted(b_stats['tiers'].items())))
+                if b_stats['changes']:
+                    ch = b_stats['changes']
+                    st.caption(f"🧬 Versión anterior: {ch['unchanged']} sin cambios · {ch['changed']} modificados · "
+                               f"{ch['added']} nuevos · {ch['removed']} eliminados · "
+                               f"{b_stats['carried']} veredictos reutilizados")
+                show_api_errors()
                 
                 my_bar.empty()
                 # GUARDAR EN SESSION STATE
-                bio = BytesIO()
-                audit_doc.save(bio)
-                st.session_state.audit_file_data = bio.getvalue()
-                st.success("✅ ¡Auditoría terminada!")
+                st.session_state.audit_file_data = report
+                if job_executor.cancelled: show_cancelled(job_executor, "párrafos")
+                else: st.success("✅ ¡Auditoría terminada!")
+                show_metrics(metrics)
 
             # BOTÓN DE DESCARGA (PERSISTENTE)
             if st.session_state.audit_file_data:
@@ -244,28 +446,46 @@ if "1." in selected_module:
 
         # --- PESTAÑA 2: CORRECCIÓN ---
         with tab2:
-            if st.button("🚀 Re-escribir Libro", key="btn_rewrite"):
-                uploaded_file.seek(0)
-                new_doc = Document(uploaded_file)
+            if len(rewrite_journal):
+                st.caption(f"♻️ {len(rewrite_journal)} párrafos ya reescritos en una ejecución anterior.")
+                if st.button("🗑️ Descartar progreso guardado", key="btn_reset_rewrite"):
+                    rewrite_journal.discard()
+            
+            overrides_text = st.text_area("✏️ Ajustes por aparición (una línea \"número de párrafo: texto\"):", "",
+                                          help="Fija el texto de una aparición concreta de un párrafo repetido; "
+                                               "esa aparición no se envía al modelo.")
+            start_rewrite = st.button("🚀 Re-escribir Libro", key="btn_rewrite")
+            if st.button("📥 Enviar a la cola (segundo plano)", key="btn_queue_rewrite"):
+                submit_job("rewrite", uploaded_file, {"prompt": rewrite_prompt, "dedup": dedup,
+                                                      "overrides": parse_overrides(overrides_text)})
+            stopped = was_cancelled("rewrite")
+            if start_rewrite or stopped:
                 progress_text = "Re-escribiendo con estilo nativo..."
                 my_bar = st.progress(0, text=progress_text)
+                job_executor, live = job_controls("rewrite", stopped)
+                
+                def on_rewrite(done, total, idx, res):
+                    my_bar.progress(done / total, text=f"Procesando {done}/{total}")
                 
-                total_p = len(doc.paragraphs)
-                for i, (p_orig, p_dest) in enumerate(zip(doc.paragraphs, new_doc.paragraphs)):
-                    if len(p_orig.text) > 10:
-                        prompt_final = f"{rewrite_prompt}\n\nTEXTO ORIGINAL: '{p_orig.text}'"
-                        res = call_api(prompt_final)
-                        clean = clean_markdown(res)
-                        if "[ERROR" not in clean:
-                            p_dest.text = clean
-                    my_bar.progress((i + 1) / total_p, text=f"Procesando {i+1}/{total_p}")
+                metrics = Metrics("rewrite")
+                rewritten, r_stats = rewrite_manuscript(uploaded_file.getvalue(), rewrite_prompt,
+                                                        partial(call_api, metrics=metrics, live=live), job_executor,
+                                                        journal=rewrite_journal, on_progress=on_rewrite, metrics=metrics,
+                                                        doc_cache=doc_cache, dedup=dedup,
+                                                        overrides=parse_overrides(overrides_text))
+                show_api_errors()
+                if r_stats['resumed']: st.caption(f"♻️ {r_stats['resumed']} párrafos recuperados del progreso guardado.")
+                if r_stats['duplicates']:
+                    st.caption(f"♊ {r_stats['duplicates']} párrafos repetidos reescritos una sola vez "
+                               f"({r_stats['duplicates']} llamadas evitadas)")
+                if r_stats['overrides']: st.caption(f"✏️ {r_stats['overrides']} apariciones con texto fijado a mano.")
                 
                 my_bar.empty()
                 # GUARDAR EN SESSION STATE
-                bio = BytesIO()
-                new_doc.save(bio)
-                st.session_state.rewrite_file_data = bio.getvalue()
-                st.success("✅ ¡Reescritura terminada!")
+                st.session_state.rewrite_file_data = rewritten
+                if job_executor.cancelled: show_cancelled(job_executor, "párrafos")
+                else: st.success("✅ ¡Reescritura terminada!")
+                show_metrics(metrics)
 
             # BOTÓN DE DESCARGA (PERSISTENTE)
             if st.session_state.rewrite_file_data:
@@ -282,10 +502,12 @@ if "1." in selected_module:
 # MÓDULO 2: MAQUETADOR KDP PRO
 # ==============================================================================
 elif "2." in selected_module:
+    with STARTUP.imports("módulo 2"):
+        from nativeflow.layout import PAGE_SIZES, THEMES, kdp_layout
     st.header("📏 Maquetador KDP PRO (Papel)")
     col1, col2 = st.columns(2)
     with col1:
-        size = st.selectbox("Tamaño de impresión:", ["6 x 9 pulgadas", "5 x 8 pulgadas", "8.5 x 11 pulgadas"])
+        size = st.selectbox("Tamaño de impresión:", list(PAGE_SIZES.keys()))
         theme_choice = st.selectbox("🎨 Tema Visual:", list(THEMES.keys())) 
     with col2:
         margins = st.radio("Configuración de Márgenes:", ["Espejo (Doble Cara)", "Normales"])
@@ -300,80 +522,37 @@ elif "2." in selected_module:
         justify_text = st.checkbox("📄 Justificar + Silabeo", value=True)
         add_numbers = st.checkbox("🔢 Agregar Números de Página", value=True)
         fix_runts = st.checkbox("🛡️ Evitar palabras sueltas (Runts)", value=True)
-
-    uploaded_file = st.file_uploader("Sube manuscrito (.docx)", type=["docx"], key="mod2")
+        soft_hyphens = st.checkbox("➖ Guiones suaves (pyphen)", value=False,
+                                   help="Marca dónde se puede partir cada palabra; Word y KDP los respetan al justificar.")
+    hyphen_lang = None
+    if soft_hyphens:
+        hyphen_lang = st.selectbox("Idioma de los guiones", ["Auto (idioma del manuscrito)", "es", "en", "fr", "it", "pt"])
+        if hyphen_lang.startswith("Auto"): hyphen_lang = None
+
+    kdp_options = dict(size=size, theme_name=theme_choice, mirror="Espejo" in margins, fix_titles=fix_titles,
+                       pro_start=pro_start, reconstruct=reconstruct, justify_text=justify_text,
+                       add_numbers=add_numbers, fix_runts=fix_runts, soft_hyphens=soft_hyphens, lang=hyphen_lang)
+    if st.toggle("📦 Modo lote (varios archivos o ZIP)", key="batch_mode_mod2"):
+        batch_panel("kdp", kdp_options, "mod2")
+        uploaded_file = None
+    else:
+        uploaded_file = st.file_uploader("Sube manuscrito (.docx)", type=["docx"], key="mod2")
     if uploaded_file and st.button("🛠️ Procesar Libro"):
-        doc = Document(uploaded_file)
-        theme = THEMES[theme_choice]
-        
-        if reconstruct: stitch_paragraphs(doc)
-        if justify_text: 
-            try: enable_native_hyphenation(doc) 
-            except: pass
-
-        if "6 x 9" in size: w, h = Inches(6), Inches(9)
-        elif "5 x 8" in size: w, h = Inches(5), Inches(8)
-        else: w, h = Inches(8.5), Inches(11)
-        
-        for section in doc.sections:
-            section.page_width = w; section.page_height = h
-            section.top_margin = Inches(0.75); section.bottom_margin = Inches(0.75)
-            section.left_margin = Inches(0.8); section.right_margin = Inches(0.6)
-            if "Espejo" in margins: section.mirror_margins = True; section.gutter = Inches(0.15)
-            if add_numbers:
-                p_foot = section.footer.paragraphs[0]; p_foot.text = ""
-                add_page_number(p_foot)
-                p_foot.style.font.name = theme['font']; p_foot.style.font.size = Pt(10)
-
-        style = doc.styles['Normal']
-        style.font.name = theme['font']; style.font.size = Pt(theme['size'])
-        style.paragraph_format.line_spacing = 1.25; style.paragraph_format.space_after = Pt(0)
-        style.paragraph_format.widow_control = True
-        if justify_text: style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-        for h in ['Heading 1', 'Heading 2']:
-            try:
-                h_style = doc.styles[h]
-                h_style.font.name = theme['header']; h_style.font.color.rgb = RGBColor(0,0,0)
-                h_style.paragraph_format.space_before = Pt(0); h_style.paragraph_format.space_after = Pt(30)
-                h_style.alignment = WD_ALIGN_PARAGRAPH.CENTER; h_style.paragraph_format.page_break_before = True
-            except: pass
-
-        total_p = len(doc.paragraphs)
         p_bar = st.progress(0)
-        previous_was_heading = False 
-        
-        for i, p in enumerate(doc.paragraphs):
-            text_clean = p.text.strip()
-            if len(text_clean) < 2: continue 
-            is_h = p.style.name.startswith('Heading') or (len(text_clean) < 60 and (re.match(r'^(chapter|cap[íi]tulo)\b', text_clean, re.I) or text_clean.isupper()))
-            
-            if is_h:
-                previous_was_heading = True
-                p.style = doc.styles['Heading 1']
-                p.text = "\n" + text_clean.upper() 
-                if fix_titles: p.paragraph_format.keep_with_next = True
-            else:
-                if fix_runts and len(text_clean) > 50: prevent_runts_in_paragraph(p)
-                if justify_text: p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                if pro_start and previous_was_heading:
-                    if len(text_clean) > 1:
-                        char = text_clean[0]; rest = text_clean[1:]
-                        p.text = ""; run = p.add_run(char)
-                        run.font.name = theme['header']; run.font.size = Pt(theme['size']+5); run.bold = True
-                        p.add_run(rest).font.name = theme['font']
-                    previous_was_heading = False
-                else: previous_was_heading = False
-            if i % 10 == 0: p_bar.progress((i+1)/total_p)
-        
-        bio = BytesIO(); doc.save(bio)
+        metrics = Metrics("kdp_layout")
+        result = kdp_layout(uploaded_file.getvalue(), **kdp_options, on_progress=p_bar.progress, metrics=metrics,
+                            doc_cache=doc_cache)
         st.success("✅ Maquetación de papel terminada.")
-        st.download_button("⬇️ Descargar DOCX", bio.getvalue(), "Maquetado_Papel.docx")
+        st.download_button("⬇️ Descargar DOCX", result, "Maquetado_Papel.docx")
+        show_metrics(metrics)
 
 # ==============================================================================
 # MÓDULO 3: WORKBOOK CLEANER
 # ==============================================================================
 elif "3." in selected_module:
+    with STARTUP.imports("módulo 3"):
+        from nativeflow.text import clean_markdown
+        from nativeflow.workbook import DEFAULT_CTA, adapt_workbook, classic_clean
     st.header("📲 Adaptador Kindle & Workbook Cleaner")
     st.markdown("Prepara tu manuscrito para formato eBook eliminando interacciones físicas y adaptando la narrativa.")
     
@@ -383,19 +562,17 @@ elif "3." in selected_module:
     # --- PESTAÑA 1: TU CÓDIGO ORIGINAL INTACTO ---
     with tab_fast:
         st.info("Utiliza expresiones regulares para reemplazar líneas de ejercicios por un CTA estático.")
-        cta_text = st.text_area("Texto CTA:", "🛑 (Ejercicio): Completa esto en tu Cuaderno.", height=80)
+        cta_text = st.text_area("Texto CTA:", DEFAULT_CTA, height=80)
         uploaded_file = st.file_uploader("Sube manuscrito", key="mod3_orig")
         if uploaded_file and st.button("Limpiar (Clásico)"):
-            doc = Document(uploaded_file)
-            for p in doc.paragraphs:
-                if re.search(r"([_.\-]){4,}", p.text): p.text = cta_text 
-            bio = BytesIO(); doc.save(bio)
-            st.download_button("⬇️ Descargar", bio.getvalue(), "Ebook_Limpio.docx")
+            metrics = Metrics("workbook_classic")
+            st.download_button("⬇️ Descargar", classic_clean(uploaded_file.getvalue(), cta_text, metrics=metrics, doc_cache=doc_cache), "Ebook_Limpio.docx")
+            show_metrics(metrics)
 
     
 ## --- PESTAÑA 2: EL NUEVO MOTOR DE ADAPTACIÓN TRANMEDIA ---
     with tab_ai:
-        st.info("La IA agrupará cuestionarios enteros en bloques. Procesamiento seguro en reversa activo.")
+        st.info("La IA agrupará cuestionarios enteros en bloques. Las ediciones se aplican de una sola vez al final. El progreso se guarda bloque a bloque.")
         
         default_kindle_prompt = """Actúa como un editor experto en adaptación digital (eBooks) de libros de psicología infantil.
         Tu objetivo es transformar este bloque de ejercicios interactivos (cuestionarios, listas, cartas para rellenar o espacios en blanco) en prosa narrativa fluida y reflexiva.
@@ -411,112 +588,72 @@ elif "3." in selected_module:
         
         with st.expander("⚙️ Configurar Prompt de Adaptación", expanded=False):
             kindle_prompt = st.text_area("Instrucciones al Motor IA:", default_kindle_prompt, height=250)
+            dedup_blocks = st.checkbox("♊ Adaptar una sola vez los bloques repetidos", value=True)
             
         uploaded_file_ai = st.file_uploader("Sube manuscrito (.docx)", type=["docx"], key="mod3_ai")
         
-        if uploaded_file_ai and st.button("🚀 Iniciar Adaptación Profunda"):
-            doc = Document(uploaded_file_ai)
+        start_adapt = uploaded_file_ai and st.button("🚀 Iniciar Adaptación Profunda")
+        if uploaded_file_ai and st.button("📥 Enviar a la cola (segundo plano)", key="btn_queue_adapt"):
+            submit_job("adapt", uploaded_file_ai, {"prompt": kindle_prompt, "dedup": dedup_blocks})
+        stopped = uploaded_file_ai and was_cancelled("adapt")
+        if start_adapt or stopped:
             my_bar = st.progress(0, text="Escaneando y limpiando la estructura del documento...")
+            job_executor, live = job_controls("adapt", stopped)
             
-            # PASO 0: Limpieza Nuclear Segura (Borramos esto primero para no romper los números luego)
-            for p in list(doc.paragraphs):
-                if any(k in p.text.lower() for k in ["espacio para dibujar", "recorta esta página", "pega aquí"]):
-                    delete_paragraph(p)
-            
-            # Refrescamos la lista de párrafos exactos después de la limpieza
-            doc_paras = doc.paragraphs
-            
-            # PASO 1: Identificar todos los párrafos que pertenecen a un ejercicio
-            exercise_indices = []
-            for i, p in enumerate(doc_paras):
-                text = p.text.strip()
-                text_lower = text.lower()
-                if len(text) < 2: continue
-                
-                # Protegemos Amazon y QR
-                if "qr" in text_lower or "amazon" in text_lower:
-                    continue
-                    
-                is_ex = False
-                if re.search(r"([_.\-]){3,}", text): is_ex = True
-                elif (text.startswith("¿") or text.startswith("•") or text.startswith("-")) and "?" in text: is_ex = True
-                elif any(k in text_lower for k in ["ejercicio:", "dibuja", "escribe tu", "completa", "querido", "prometo", "mi monstruo suena", "mi monstruo se ve"]): is_ex = True
-                elif ":" in text and len(text) < 100:
-                    for j in range(1, 4):
-                        if i + j < len(doc_paras) and re.search(r"([_.\-]){3,}", doc_paras[i+j].text):
-                            is_ex = True; break
-                
-                if is_ex:
-                    exercise_indices.append(i)
-                    
-            # PASO 2: Agrupar índices consecutivos en "Bloques de Ejercicio"
-            blocks = []
-            if exercise_indices:
-                current_block = [exercise_indices[0]]
-                for idx in exercise_indices[1:]:
-                    if idx - current_block[-1] <= 2: 
-                        current_block.append(idx)
-                    else:
-                        blocks.append(current_block)
-                        current_block = [idx]
-                blocks.append(current_block)
+            def on_block(done, total, idx, res):
+                if "[ERROR" not in res:
+                    st.info(f"✅ Bloque {idx+1} transformado:\n{clean_markdown(res)[:100]}...")
+                else:
+                    st.error(f"❌ Error de API en el bloque {idx+1}")
+                my_bar.progress(done / total, text=f"Procesando bloques {done}/{total}")
             
-            # PASO 3: Procesar bloques EN REVERSA (La cura definitiva para el IndexError)
-            total_blocks = len(blocks)
-            if total_blocks == 0:
+            # Diario en disco: si se corta, al repetir no se vuelven a pedir los bloques ya adaptados
+            adapt_journal = JobJournal("adapt", content_hash(uploaded_file_ai.getvalue()), kindle_prompt)
+            metrics = Metrics("workbook_adapt")
+            adapted, a_stats = adapt_workbook(uploaded_file_ai.getvalue(), kindle_prompt,
+                                              partial(call_api, metrics=metrics, live=live), job_executor,
+                                              journal=adapt_journal, on_block=on_block, metrics=metrics,
+                                              doc_cache=doc_cache, dedup=dedup_blocks)
+            show_api_errors()
+            if adapted is None:
                 st.warning("No se detectaron ejercicios para adaptar.")
             else:
-                # Procesamos usando reversed(blocks) para ir de abajo hacia arriba
-                for b_idx, block in enumerate(reversed(blocks)):
-                    # Calculamos el número real del bloque para mostrarlo bien en pantalla
-                    actual_num = total_blocks - b_idx
-                    
-                    block_text = "\n".join([doc_paras[i].text.strip() for i in block if doc_paras[i].text.strip()])
-                    st.toast(f"🔍 Adaptando bloque {actual_num}/{total_blocks}...")
-                    
-                    prompt_final = f"{kindle_prompt}\n\nBLOQUE COMPLETO A ADAPTAR:\n{block_text}"
-                    res = call_api(prompt_final)
-                    
-                    if "[ERROR" not in res:
-                        clean = clean_markdown(res)
-                        # Pegar la narrativa final en el primer párrafo del bloque
-                        doc_paras[block[0]].text = clean
-                        
-                        # Borrar el resto del bloque también de abajo hacia arriba
-                        for i in reversed(block[1:]):
-                            delete_paragraph(doc_paras[i])
-                            
-                        st.info(f"✅ Bloque {actual_num} transformado:\n{clean[:100]}...")
-                    else:
-                        st.error(f"❌ Error de API en el bloque {actual_num}")
-                        
-                    my_bar.progress((b_idx + 1) / total_blocks, text=f"Procesando bloques {b_idx+1}/{total_blocks}")
-                    
+                if a_stats['resumed']: st.caption(f"♻️ {a_stats['resumed']} bloques recuperados del progreso guardado.")
+                if a_stats['duplicates']:
+                    st.caption(f"♊ {a_stats['duplicates']} bloques repetidos adaptados una sola vez "
+                               f"({a_stats['duplicates']} llamadas evitadas)")
                 my_bar.empty()
-                bio = BytesIO()
-                doc.save(bio)
-                st.success(f"✅ ¡{total_blocks} bloques adaptados a narrativa!")
-                st.download_button("⬇️ Descargar eBook Narrativo", bio.getvalue(), "Mindful_Monsters_eBook_Adaptado.docx", key="dl_narrative")
+                if job_executor.cancelled: show_cancelled(job_executor, "bloques")
+                else: st.success(f"✅ ¡{a_stats['blocks']} bloques adaptados a narrativa!")
+                st.download_button("⬇️ Descargar eBook Narrativo", adapted, "Mindful_Monsters_eBook_Adaptado.docx", key="dl_narrative")
+            show_metrics(metrics)
 
 # ==============================================================================
 # MÓDULO 4: LIMPIADOR
 # ==============================================================================
 elif "4." in selected_module:
+    with STARTUP.imports("módulo 4"):
+        from nativeflow.cleaner import nuclear_clean_docx
     st.header("☢️ Limpiador 'Nuclear'")
-    uploaded_file = st.file_uploader("Sube docx", key="mod4")
+    if st.toggle("📦 Modo lote (varios archivos o ZIP)", key="batch_mode_mod4"):
+        batch_panel("clean", {}, "mod4")
+        uploaded_file = None
+    else:
+        uploaded_file = st.file_uploader("Sube docx", key="mod4")
     if uploaded_file and st.button("Limpiar"):
-        doc = Document(uploaded_file)
-        for p in doc.paragraphs:
-            if p.text: p.text = nuclear_clean(p.text)
-        bio = BytesIO(); doc.save(bio)
-        st.download_button("⬇️ Descargar", bio.getvalue(), "Limpio.docx")
+        metrics = Metrics("nuclear_clean")
+        st.download_button("⬇️ Descargar", nuclear_clean_docx(uploaded_file.getvalue(), metrics=metrics, doc_cache=doc_cache), "Limpio.docx")
+        show_metrics(metrics)
 
 # ==============================================================================
 # MÓDULO 5: GENERADOR EPUB (V8.0 - INLINE + SLIDER)
 # ==============================================================================
 elif "5." in selected_module:
+    with STARTUP.imports("módulo 5"):
+        from nativeflow.epub_builder import EpubBuildCache, docx_to_epub
     st.header("⚡ Generador EPUB 8.0 (Precision)")
-    uploaded_file = st.file_uploader("Sube Manuscrito (DOCX procesado)", key="mod5")
+    batch_mode = st.toggle("📦 Modo lote (varios archivos o ZIP; el título sale del nombre de cada archivo)", key="batch_mode_mod5")
+    uploaded_file = None if batch_mode else st.file_uploader("Sube Manuscrito (DOCX procesado)", key="mod5")
     
     col1, col2, col3 = st.columns(3)
     with col1: title = st.text_input("Título", "Mi Libro")
@@ -527,92 +664,35 @@ elif "5." in selected_module:
     st.write("🎛️ **Calibración de Letra Capital:**")
     # SLIDER CONECTADO (Por defecto 1.6)
     dropcap_size = st.slider("Tamaño (Default 1.6 para 2 líneas):", 1.0, 4.0, 1.6, 0.1)
+    # Las imágenes van como archivos del EPUB (sin base64); opcionalmente reducidas
+    image_max_width = st.number_input("🖼️ Ancho máximo de imágenes (px, 0 = tamaño original)", 0, 4000, 0, 100) or None
+    soft_hyphens = st.checkbox("➖ Guiones suaves en el idioma elegido (evita huecos al justificar en el lector)", value=True)
     
-    if uploaded_file and st.button("Convertir"):
-        # 1. LIMPIEZA PREVIA
-        doc_temp = Document(uploaded_file)
-        for p in doc_temp.paragraphs:
-            if p.style.name.startswith('Heading'):
-                p.text = p.text.replace('\n', '').strip()
-
-        paragraphs_to_delete = []
-        for i in range(len(doc_temp.paragraphs) - 1):
-            curr = doc_temp.paragraphs[i]
-            next_p = doc_temp.paragraphs[i+1]
-            if curr.style.name.startswith('Heading') and not next_p.text.strip():
-                paragraphs_to_delete.append(next_p)
-        for p in paragraphs_to_delete:
-            p._element.getparent().remove(p._element)
-
-        buf = BytesIO(); doc_temp.save(buf); buf.seek(0)
-        
-        # 2. CONFIGURACIÓN EPUB
-        book = epub.EpubBook()
-        book.set_identifier(str(uuid.uuid4()))
-        book.set_title(title); book.set_language(lang); book.add_author(author)
-        
-        # 3. MAPA ESTILOS
-        style_map = "p[style-name^='Heading'] => h1:fresh\np[style-name^='Título'] => h1:fresh"
-        result = mammoth.convert_to_html(buf, style_map=style_map)
-        
-        # 4. INYECCIÓN CON ESTILO EN LÍNEA
-        soup = BeautifulSoup(result.value, 'html.parser')
-        
-        inline_style = f"float: left; font-size: {dropcap_size}em; font-weight: bold; line-height: 0.8; margin-right: 0.12em; margin-top: 0.05em; color: black;"
+    # Caché de etapas por archivo: cambiar letra capital o metadatos no repite la conversión
+    if 'epub_cache' not in st.session_state: st.session_state.epub_cache = EpubBuildCache()
 
-        for h1 in soup.find_all('h1'):
-            next_p = h1.find_next_sibling()
-            while next_p and (next_p.name != 'p' or not next_p.get_text().strip()):
-                next_p = next_p.find_next_sibling()
-            
-            if next_p and next_p.name == 'p':
-                text = next_p.get_text()
-                if len(text) > 1:
-                    first_char = text[0]
-                    rest = text[1:]
-                    new_html = f'<span style="{inline_style}">{first_char}</span>{rest}'
-                    new_tag = BeautifulSoup(new_html, 'html.parser')
-                    next_p.clear()
-                    next_p.append(new_tag)
-
-        # 5. CSS BASE
-        css = """<style>
-            h1 { margin-top: 2em; text-align: center; color: black; margin-bottom: 1em; }
-            p { text-align: justify; text-indent: 1em; line-height: 1.5em; margin-top: 0; }
-        </style>"""
-
-        content = soup.body if soup.body else soup
-        chapters = []
-        headers = soup.find_all('h1')
-        
-        if not headers:
-            c = epub.EpubHtml(title="Inicio", file_name="chap_1.xhtml", lang=lang)
-            c.content = css + str(content)
-            book.add_item(c); chapters.append(c)
-        else:
-            curr_h, curr_t, count = "", "Inicio", 0
-            for elem in content.children:
-                if elem.name == 'h1':
-                    if curr_h.strip():
-                        count += 1
-                        c = epub.EpubHtml(title=curr_t, file_name=f"c_{count}.xhtml", lang=lang)
-                        page_break = '<div style="page-break-before:always;"></div>' if count > 1 else ""
-                        c.content = css + page_break + f"<h1>{curr_t}</h1>{curr_h}"
-                        book.add_item(c); chapters.append(c)
-                    curr_t, curr_h = elem.get_text(), ""
-                else: curr_h += str(elem)
-            
-            if curr_h.strip():
-                count += 1
-                c = epub.EpubHtml(title=curr_t, file_name=f"c_{count}.xhtml", lang=lang)
-                page_break = '<div style="page-break-before:always;"></div>' if count > 1 else ""
-                c.content = css + page_break + f"<h1>{curr_t}</h1>{curr_h}"
-                book.add_item(c); chapters.append(c)
-
-        book.toc = tuple(chapters)
-        book.add_item(epub.EpubNcx()); book.add_item(epub.EpubNav())
-        book.spine = ['nav'] + chapters
-        
-        bio_ep = BytesIO(); epub.write_epub(bio_ep, book, {})
+    if batch_mode:
+        batch_panel("epub", {"author": author, "lang": lang, "dropcap_size": dropcap_size,
+                             "image_max_width": image_max_width, "soft_hyphens": soft_hyphens}, "mod5")
+
+    if uploaded_file and st.button("Convertir"):
+        metrics = Metrics("epub")
+        epub_bytes = docx_to_epub(uploaded_file.getvalue(), title=title, author=author, lang=lang,
+                                  dropcap_size=dropcap_size, metrics=metrics, cache=st.session_state.epub_cache, doc_cache=doc_cache,
+                                  image_max_width=image_max_width, soft_hyphens=soft_hyphens)
         st.success(f"✅ EPUB generado: Tamaño {dropcap_size}x (Inyectado).")
-        st.download_button("⬇️ Descargar EPUB", bio_ep.getvalue(), f"{title}.epub")
+        if metrics.counters.get("images"):
+            st.caption(f"🖼️ {metrics.counters['images']} imágenes ({metrics.counters.get('image_duplicates', 0)} repetidas "
+                       f"enlazadas una sola vez): {metrics.counters['image_bytes_in'] / 1024:,.0f} KB -> "
+                       f"{metrics.counters['image_bytes_out'] / 1024:,.0f} KB.")
+        if metrics.counters.get("reused_chapters"):
+            st.caption("♻️ Reconstrucción incremental: se reutilizó la conversión previa de este archivo.")
+        st.download_button("⬇️ Descargar EPUB", epub_bytes, f"{title}.epub")
+        show_metrics(metrics)
+
+# ==============================================================================
+# INFORME DE ARRANQUE (al final, para incluir las cargas de este rerun)
+# ==============================================================================
+STARTUP.finish_run(time.perf_counter() - RUN_STARTED)
+with st.sidebar:
+    show_startup()
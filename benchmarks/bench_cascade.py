@@ -0,0 +1,169 @@
+"""Precisión y recall de la cascada de auditoría frente a la auditoría completa.
+
+Para cada muestra audita todos los párrafos con el modelo pro (la referencia) y pasa los
+mismos párrafos por la cascada. Informa de:
+- precisión de los aprobados: de los párrafos que la cascada da por limpios sin llegar al
+  pro, cuántos son CLEAN también en la referencia;
+- recall de problemas: de los párrafos con ISSUE en la referencia, cuántos llegan al pro;
+- llamadas pro con y sin cascada.
+
+Sin `--model-factory` la referencia es un oráculo que responde con las etiquetas fijadas al
+generar cada muestra, sin usar las reglas que se miden: ISSUE en los párrafos donde se
+insertó una frase en Espanglish y en uno de cada ocho al azar (tono, pronombres: lo que
+una regla no ve). Solo se mide la heurística. Con una fábrica real (p. ej.
+`nativeflow.llm:gemini_model` y GOOGLE_API_KEY) se miden también el modelo rápido y los
+manuscritos de `--sample`.
+
+Uso: python -m benchmarks.bench_cascade [--paragraphs 600] [--sample libro.docx]
+         [--model-factory nativeflow.llm:gemini_model --pro models/gemini-2.5-pro --screen models/gemini-2.5-flash]
+"""
+import argparse
+import json
+import os
+import random
+import re
+from functools import partial
+from io import BytesIO
+
+from docx import Document
+
+from benchmarks.bench_prefix import app_prompts
+from benchmarks.stub_model import StubModel, StubResponse
+from benchmarks.synthetic import build_manuscript
+from nativeflow.audit import DEFAULT_BATCH_CHARS, build_batches, run_batched_audit
+from nativeflow.llm import InstructedModels, LLMError, LLMExecutor, call_model
+from nativeflow.prescreen import TIER_HEURISTIC, Cascade, HeuristicScreen
+from nativeflow.worker import load_factory
+
+ENGLISH = ("the little monster breathes slowly when the night comes and counts to ten while the rain falls "
+           "on the garden because calm arrives when we listen to our heart with kindness").split()
+SPANGLISH = [" The breathing of the balloon es muy importante.", " Realizar la respiración basado en el globo.",
+             " Luego she dijo que the calma llega."]
+
+
+class OracleModel(StubModel):
+    """Referencia sintética: responde con las etiquetas {texto: veredicto} de la muestra."""
+
+    def __init__(self, model_name="models/oracle", labels=None, **kwargs):
+        super().__init__(model_name, latency=0, **kwargs)
+        self.labels = labels or {}
+
+    def verdict(self, text):
+        return self.labels[text]     # Un texto sin etiqueta es un error del benchmark
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        lines = re.findall(r"^\[(\d+)\] (.*)$", prompt, re.M)
+        if lines:
+            verdicts = [(int(pid), self.verdict(text)) for pid, text in lines]
+            return StubResponse(json.dumps([{"id": pid, "verdict": "CLEAN" if v == "CLEAN" else "ISSUE",
+                                             "explanation": "" if v == "CLEAN" else v} for pid, v in verdicts]))
+        match = re.search(r"TEXTO: '(.*)'", prompt, re.S)
+        return StubResponse(self.verdict(match.group(1) if match else prompt))
+
+
+def make_call(factory, model_name):
+    models = InstructedModels(lambda system: factory(model_name, api_key=os.environ.get("GOOGLE_API_KEY"),
+                                                     system_instruction=system))
+
+    def call(prompt, system=None):
+        try:
+            return call_model(models.get(system), prompt, system=system)
+        except LLMError:
+            return "[ERROR API]"
+    return call
+
+
+def label(labels, text, rng, issue=None):
+    # Lo que no se sembró como problema recibe, una vez por texto distinto, uno de cada ocho
+    # "problemas de tono" al azar
+    if issue: labels[text] = issue
+    elif text not in labels: labels[text] = "Tono robótico" if rng.random() < 1 / 8 else "CLEAN"
+
+
+def spanish_sample(paragraphs, seed=3):
+    """Manuscrito sintético en español con frases en Espanglish en uno de cada nueve párrafos.
+
+    Devuelve (documento, etiquetas {texto: veredicto}).
+    """
+    doc = Document(BytesIO(build_manuscript(paragraphs, image_every=0, seed=seed)))
+    rng, labels = random.Random(seed), {}
+    for i, p in enumerate(doc.paragraphs):
+        issue = None
+        if i % 9 == 4 and len(p.text) > 20:
+            p.add_run(rng.choice(SPANGLISH))
+            issue = "Espanglish"
+        label(labels, p.text, rng, issue)
+    return doc, labels
+
+
+def english_sample(paragraphs, seed=4):
+    """Libro entero en inglés: no es Espanglish, solo tiene los problemas de tono al azar."""
+    rng, labels = random.Random(seed), {}
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 60 == 0: p = doc.add_heading(f"Chapter {i // 60 + 1}", 1)
+        elif i % 25 == 0: p = doc.add_paragraph("Dear ____________________")
+        else: p = doc.add_paragraph(" ".join(rng.choice(ENGLISH) for _ in range(rng.randint(8, 30))).capitalize() + ".")
+        label(labels, p.text, rng)
+    return doc, labels
+
+
+def items_of(doc):
+    # Mismo criterio que audit_manuscript
+    return [(i + 1, p.text) for i, p in enumerate(doc.paragraphs) if len(p.text) > 20]
+
+
+def measure(items, prompt, pro_call, cascade, executor):
+    reference, _ = run_batched_audit(items, prompt, pro_call, executor, max_chars=DEFAULT_BATCH_CHARS)
+    issues = {pid for pid, verdict in reference.items() if verdict != "CLEAN"}
+    decided, escalate, screen_calls = cascade.run(items, prompt, executor)
+    cleared = set(decided)
+    sent = {pid for pid, _ in escalate}
+    precision = sum(pid not in issues for pid in cleared) / len(cleared) if cleared else 1.0
+    recall = len(issues & sent) / len(issues) if issues else 1.0
+    return {"paragraphs": len(items), "issues": len(issues), "cleared": len(cleared),
+            "heuristic": sum(tier == TIER_HEURISTIC for tier in decided.values()), "precision": precision,
+            "recall": recall, "pro_full": len(build_batches(items)), "pro_cascade": len(build_batches(escalate)),
+            "screen_calls": screen_calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=600)
+    parser.add_argument("--sample", nargs="*", default=[], help="Manuscritos .docx reales (con --model-factory)")
+    parser.add_argument("--model-factory", help='"módulo:función" (por defecto, el oráculo sintético)')
+    parser.add_argument("--pro", default="models/gemini-2.5-pro")
+    parser.add_argument("--screen", default="models/gemini-2.5-flash")
+    args = parser.parse_args()
+
+    prompt = app_prompts()["default_audit"]
+    executor = LLMExecutor(8)
+    factory = load_factory(args.model_factory) if args.model_factory else None
+    screen_call = make_call(factory, args.screen) if factory is not None else None
+
+    samples = [("español sintético", *spanish_sample(args.paragraphs)),
+               ("inglés sintético", *english_sample(args.paragraphs))]
+    samples += [(os.path.basename(path), Document(path), None) for path in args.sample if factory is not None]
+    tiers = [("heurística", Cascade(HeuristicScreen()))]
+    if screen_call is not None:
+        tiers += [("modelo rápido", Cascade(None, screen_call)),
+                  ("heurística + rápido", Cascade(HeuristicScreen(), screen_call))]
+
+    print(f"{'muestra':<20}{'cascada':<22}{'párrafos':>9}{'ISSUE':>7}{'aprobados':>10}{'precisión':>11}"
+          f"{'recall':>8}{'pro sin/con':>13}{'rápido':>8}")
+    for name, doc, labels in samples:
+        items = items_of(doc)
+        # Con un modelo real la referencia es el pro; sin él, las etiquetas de la muestra
+        pro_call = make_call(factory, args.pro) if factory is not None else make_call(partial(OracleModel, labels=labels), "")
+        for tier_name, cascade in tiers:
+            r = measure(items, prompt, pro_call, cascade, executor)
+            print(f"{name:<20}{tier_name:<22}{r['paragraphs']:>9}{r['issues']:>7}{r['cleared']:>10}"
+                  f"{r['precision']:>11.1%}{r['recall']:>8.1%}{r['pro_full']:>7}/{r['pro_cascade']:<5}"
+                  f"{r['screen_calls']:>8}")
+    if screen_call is None:
+        print("(el modelo rápido solo se mide con --model-factory: un doble no dice nada de su precisión)")
+
+
+if __name__ == "__main__":
+    main()
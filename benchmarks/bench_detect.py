@@ -0,0 +1,103 @@
+"""Detección de ejercicios (Módulo 3): motor de reglas compilado frente a las búsquedas por párrafo.
+
+Compara tiempos en cuadernos grandes y verifica que los resultados coinciden con la
+implementación anterior, también sobre textos aleatorios con los casos límite.
+
+Uso: python -m benchmarks.bench_detect [--sizes 10000 100000] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import time
+
+from nativeflow.workbook import BOILERPLATE, EXERCISE_ENGINE, EXERCISE_KEYWORDS, find_exercise_indices
+
+SAMPLES = [
+    "Había una vez un monstruo que vivía debajo de la cama y no quería dormir.",
+    "Nombre:", "Fecha: ", "__________________", "..........", "--- --", "Respuesta: ___",
+    "¿Cómo se llama tu monstruo?", "• ¿Qué come?", "- ¿Dónde vive?", "¿Sin interrogación final",
+    "Ejercicio: une los puntos", "Dibuja a tu monstruo favorito.", "Escribe tu nombre aquí",
+    "Querido monstruo, te escribo...", "Prometo cuidarte.", "Mi monstruo suena como un trueno.",
+    "Escanea el código QR ____", "Cómpralo en Amazon: ....", "Espacio para dibujar", "Pega aquí tu foto",
+    "Recorta esta página", "", " ", "a", "Completa la frase: ...", "Hora: 10:30", "Mi MONSTRUO SE VE raro",
+]
+
+
+def legacy_find_exercise_indices(texts):
+    # Implementación anterior: varias búsquedas por párrafo y re.search repetido en el lookahead
+    exercise_indices = []
+    for i, raw in enumerate(texts):
+        text = raw.strip()
+        text_lower = text.lower()
+        if len(text) < 2: continue
+        if "qr" in text_lower or "amazon" in text_lower: continue
+        is_ex = False
+        if re.search(r"([_.\-]){3,}", text): is_ex = True
+        elif (text.startswith("¿") or text.startswith("•") or text.startswith("-")) and "?" in text: is_ex = True
+        elif any(k in text_lower for k in EXERCISE_KEYWORDS): is_ex = True
+        elif ":" in text and len(text) < 100:
+            for j in range(1, 4):
+                if i + j < len(texts) and re.search(r"([_.\-]){3,}", texts[i+j]):
+                    is_ex = True; break
+        if is_ex: exercise_indices.append(i)
+    return exercise_indices
+
+
+def legacy_classic(texts):
+    return [i for i, t in enumerate(texts) if re.search(r"([_.\-]){4,}", t)]
+
+
+def legacy_boilerplate(texts):
+    return [i for i, t in enumerate(texts) if any(k in t.lower() for k in BOILERPLATE)]
+
+
+def build_texts(n, seed=7):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLES) if rng.random() < 0.3 else SAMPLES[0] + f" {i}" for i in range(n)]
+
+
+def fuzz_texts(n, seed=11):
+    rng = random.Random(seed)
+    alphabet = list("abcqrzQR _.-¿?•:") + ["amazon", "dibuja", "pega aquí", "ejercicio:"]
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(n)]
+
+
+def best(fn, texts, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(texts)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def engine_all(texts):
+    # Una pasada sirve a las tres preguntas (relleno, CTA clásico y ejercicios)
+    flags = EXERCISE_ENGINE.classify(texts)
+    return ([i for i, f in enumerate(flags) if "boilerplate" in f],
+            [i for i, f in enumerate(flags) if "cta" in f],
+            EXERCISE_ENGINE.find_exercises(texts, flags))
+
+
+def legacy_all(texts):
+    return legacy_boilerplate(texts), legacy_classic(texts), legacy_find_exercise_indices(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fuzz = fuzz_texts(20000)
+    print(f"resultados idénticos (aleatorios): {legacy_all(fuzz) == engine_all(fuzz)}")
+    for n in args.sizes:
+        texts = build_texts(n)
+        same = legacy_all(texts) == engine_all(texts)
+        same = same and legacy_find_exercise_indices(texts) == find_exercise_indices(texts)
+        old_t, new_t = best(legacy_all, texts, args.repeat), best(engine_all, texts, args.repeat)
+        print(f"{n:>7} párrafos  antes {old_t:.3f}s  ahora {new_t:.3f}s  (x{old_t / new_t:.1f})  idénticos: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Conversión EPUB: construcción de capítulos en streaming frente a la concatenación anterior.
+
+Mide tiempo y pico de memoria (tracemalloc) del paso de capítulos y de la conversión
+completa sobre un libro largo con pocos capítulos muy extensos, y el coste de las
+reconstrucciones con `EpubBuildCache` al cambiar la letra capital o los metadatos.
+
+Con un libro ilustrado (fotos JPEG grandes que se repiten) compara pico de memoria y
+tamaño del EPUB con imágenes en base64 dentro del HTML (versión anterior), como archivos
+aparte y además reducidas a `--image-max-width`. Comprueba también que, al reducir, un PNG
+sigue siendo PNG y los GIF (fijos y animados) llegan intactos. Necesita Pillow para generar
+las imágenes.
+
+Uso: python -m benchmarks.bench_epub [--paragraphs 5000] [--chapter-every 500] [--image-max-width 1200]
+"""
+import argparse
+import hashlib
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from io import BytesIO
+
+import mammoth
+from bs4 import BeautifulSoup
+from ebooklib import epub
+
+from benchmarks.synthetic import build_manuscript
+from nativeflow.epub_builder import (CSS, STYLE_MAP, EpubBuildCache, docx_to_epub, dropcap_style,
+                                     inject_dropcaps, preclean_docx, split_chapters)
+
+
+def legacy_build_chapters(book, soup, lang):
+    # Versión anterior: concatenación `curr_h += str(elem)` y bloque de capítulo duplicado
+    content = soup.body if soup.body else soup
+    chapters = []
+    headers = soup.find_all('h1')
+    if not headers:
+        c = epub.EpubHtml(title="Inicio", file_name="chap_1.xhtml", lang=lang)
+        c.content = CSS + str(content)
+        book.add_item(c); chapters.append(c)
+    else:
+        curr_h, curr_t, count = "", "Inicio", 0
+        for elem in content.children:
+            if elem.name == 'h1':
+                if curr_h.strip():
+                    count += 1
+                    c = epub.EpubHtml(title=curr_t, file_name=f"c_{count}.xhtml", lang=lang)
+                    page_break = '<div style="page-break-before:always;"></div>' if count > 1 else ""
+                    c.content = CSS + page_break + f"<h1>{curr_t}</h1>{curr_h}"
+                    book.add_item(c); chapters.append(c)
+                curr_t, curr_h = elem.get_text(), ""
+            else: curr_h += str(elem)
+        if curr_h.strip():
+            count += 1
+            c = epub.EpubHtml(title=curr_t, file_name=f"c_{count}.xhtml", lang=lang)
+            page_break = '<div style="page-break-before:always;"></div>' if count > 1 else ""
+            c.content = CSS + page_break + f"<h1>{curr_t}</h1>{curr_h}"
+            book.add_item(c); chapters.append(c)
+    return chapters
+
+
+def legacy_docx_to_epub(data, title="Bench", author="Autor", lang="es", dropcap_size=1.6):
+    # Versión anterior: bytes, HTML, árbol y capítulos vivos a la vez hasta el final
+    buf = preclean_docx(data)
+    book = epub.EpubBook()
+    book.set_identifier(str(uuid.uuid4()))
+    book.set_title(title); book.set_language(lang); book.add_author(author)
+    result = mammoth.convert_to_html(buf, style_map=STYLE_MAP)
+    soup = BeautifulSoup(result.value, 'html.parser')
+    inject_dropcaps(soup, dropcap_style(dropcap_size))
+    chapters = legacy_build_chapters(book, soup, lang)
+    book.toc = tuple(chapters)
+    book.add_item(epub.EpubNcx()); book.add_item(epub.EpubNav())
+    book.spine = ['nav'] + chapters
+    bio_ep = BytesIO(); epub.write_epub(bio_ep, book, {})
+    return bio_ep.getvalue()
+
+
+def profile(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, seconds, peak / 1e6
+
+
+def chapters_only(builder, html):
+    soup = BeautifulSoup(html, 'html.parser')
+    book = epub.EpubBook()
+    t0 = time.perf_counter()
+    chapters = builder(book, soup, "es")
+    return [c.content for c in chapters], time.perf_counter() - t0
+
+
+def split_only(book, soup, lang):
+    return [epub.EpubHtml(content=c["content"]) for c in split_chapters(soup)]
+
+
+def make_photo(width, height, seed=0):
+    """JPEG con degradado y ruido: se comprime como una ilustración escaneada, no como un color liso."""
+    from PIL import Image
+    rng = random.Random(seed)
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    tint = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise((width, height), 60).convert("RGB")
+    photo = Image.blend(Image.blend(base, tint, 0.5), noise, 0.3)
+    out = BytesIO(); photo.save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+def illustrated(paragraphs, image_max_width):
+    photos = [make_photo(2400, 1800, seed=i) for i in range(6)]
+    data = build_manuscript(paragraphs, chapter_every=100, image_every=40, images=photos)
+    print(f"\nlibro ilustrado: {paragraphs // 40} imágenes ({len(photos)} distintas, 2400x1800), "
+          f"docx {len(data) / 1e6:.1f} MB")
+    rows = [("base64 en el HTML", legacy_docx_to_epub, ()),
+            ("archivos aparte", docx_to_epub, ("Bench",)),
+            (f"aparte + {image_max_width}px", lambda d: docx_to_epub(d, "Bench", image_max_width=image_max_width), ())]
+    for name, fn, extra in rows:
+        out, seconds, peak = profile(fn, data, *extra)
+        print(f"{name:<24} {seconds:.2f}s  pico {peak:7.1f} MB  EPUB {len(out) / 1e6:6.1f} MB")
+
+
+def make_drawing(fmt, width, height, frames=1):
+    """Ilustración plana (PNG o GIF); con `frames` > 1, un GIF animado."""
+    from PIL import Image, ImageDraw
+    images = []
+    for k in range(frames):
+        im = Image.new("RGB", (width, height), (250, 240, 220))
+        ImageDraw.Draw(im).ellipse((k * 40, height // 4, k * 40 + width // 2, height * 3 // 4), fill=(40, 90, 200))
+        images.append(im if fmt == "PNG" else im.convert("P"))
+    out = BytesIO()
+    images[0].save(out, fmt, **({"save_all": True, "append_images": images[1:], "duration": 100, "loop": 0}
+                                if frames > 1 else {}))
+    return out.getvalue()
+
+
+def image_formats(image_max_width):
+    from PIL import Image
+    originals = {"PNG 2400x1800": make_drawing("PNG", 2400, 1800), "GIF 2400x1800": make_drawing("GIF", 2400, 1800),
+                 "GIF animado (8)": make_drawing("GIF", 2400, 1800, frames=8)}
+    data = build_manuscript(200, chapter_every=100, image_every=50, images=list(originals.values()))
+    book = epub.read_epub(BytesIO(docx_to_epub(data, "Bench", image_max_width=image_max_width)))
+    # ImageStore nombra cada archivo por el hash del original
+    stored = {os.path.basename(item.file_name)[4:20]: item for item in book.get_items()
+              if item.media_type.startswith("image/")}
+
+    def describe(content, media_type):
+        with Image.open(BytesIO(content)) as im:
+            return f"{media_type} {im.width}px, {getattr(im, 'n_frames', 1)} fotogramas, {len(content) / 1e3:.0f} KB"
+
+    print(f"\nformatos al reducir a {image_max_width}px:")
+    for name, original in originals.items():
+        item = stored[hashlib.sha256(original).hexdigest()[:16]]
+        with Image.open(BytesIO(original)) as im: media_type = Image.MIME[im.format]
+        result = "intacta" if item.get_content() == original else describe(item.get_content(), item.media_type)
+        print(f"{name:<18} {describe(original, media_type)} -> {result}")
+
+
+def timed_call(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=5000, help="~500 páginas con el valor por defecto")
+    parser.add_argument("--chapter-every", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image-max-width", type=int, default=1200)
+    parser.add_argument("--illustrated-paragraphs", type=int, default=2000)
+    args = parser.parse_args()
+
+    data = build_manuscript(args.paragraphs, chapter_every=args.chapter_every, image_every=0)
+    html = mammoth.convert_to_html(preclean_docx(data), style_map=STYLE_MAP).value
+
+    old_chapters, new_chapters = [], []
+    old_t = min(chapters_only(legacy_build_chapters, html)[1] for _ in range(args.repeat))
+    new_t = min(chapters_only(split_only, html)[1] for _ in range(args.repeat))
+    old_chapters, _ = chapters_only(legacy_build_chapters, html)
+    new_chapters, _ = chapters_only(split_only, html)
+    print(f"capítulos: {len(new_chapters)} · idénticos a la versión anterior: {old_chapters == new_chapters}")
+    print(f"paso de capítulos      antes {old_t:.3f}s  ahora {new_t:.3f}s")
+
+    _, old_s, old_peak = profile(legacy_docx_to_epub, data)
+    _, new_s, new_peak = profile(docx_to_epub, data, "Bench")
+    print(f"conversión completa    antes {old_s:.2f}s / pico {old_peak:.1f} MB   "
+          f"ahora {new_s:.2f}s / pico {new_peak:.1f} MB")
+
+    cache = EpubBuildCache()
+    cold = timed_call(docx_to_epub, data, "Bench", cache=cache)
+    dropcap = timed_call(docx_to_epub, data, "Bench", dropcap_size=2.4, cache=cache)
+    meta = timed_call(docx_to_epub, data, "Otro título", "Otra autora", "en", dropcap_size=2.4, cache=cache)
+    print(f"con caché              primera {cold:.2f}s  letra capital {dropcap:.2f}s  metadatos {meta:.2f}s")
+
+    illustrated(args.illustrated_paragraphs, args.image_max_width)
+    image_formats(args.image_max_width)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compara el bucle secuencial con pausa fija contra LLMExecutor usando un modelo falso.
+
+Uso: python benchmarks/bench_executor.py --calls 60 --latency 0.2 --pause 0.25 --workers 8
+(`--pause` escala la antigua pausa de 2.5 s para que la prueba sea corta)
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stub_model import StubModel
+from nativeflow.llm import LLMExecutor, RateLimiter, call_model
+
+
+def run_sequential(model, prompts, pause):
+    results = []
+    for prompt in prompts:
+        results.append(call_model(model, prompt))
+        time.sleep(pause)
+    return results
+
+
+def run_concurrent(model, prompts, workers, rpm, tpm):
+    limiter = RateLimiter(rpm=rpm, tpm=tpm)
+    executor = LLMExecutor(max_workers=workers)
+    return executor.map(lambda p: call_model(model, p, limiter=limiter), prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--pause", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=6000)
+    parser.add_argument("--tpm", type=int, default=0)
+    args = parser.parse_args()
+
+    model = StubModel(latency=args.latency)
+    prompts = [f"TEXTO: 'párrafo {i}'" for i in range(args.calls)]
+
+    t0 = time.perf_counter()
+    run_sequential(model, prompts, args.pause)
+    seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    run_concurrent(model, prompts, args.workers, args.rpm, args.tpm)
+    conc = time.perf_counter() - t0
+
+    print(f"llamadas={args.calls} latencia={args.latency}s")
+    print(f"secuencial + pausa {args.pause}s: {seq:.2f}s")
+    print(f"executor ({args.workers} hilos, {args.rpm} RPM): {conc:.2f}s")
+    print(f"aceleración: x{seq / conc:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Guiones suaves (pyphen): rendimiento y aciertos de la caché por palabra en una novela completa.
+
+Genera una novela sintética con vocabulario de distribución Zipf (como el de un libro
+real: pocas palabras muy frecuentes y una cola larga) y mide la pasada sobre los runs del
+.docx y sobre los nodos de texto del HTML del EPUB, sin caché y con el LRU por palabra.
+
+Uso: python -m benchmarks.bench_hyphen [--words 100000] [--vocabulary 12000]
+"""
+import argparse
+import itertools
+import random
+import time
+from io import BytesIO
+
+import mammoth
+from bs4 import BeautifulSoup
+from docx import Document
+
+from nativeflow.docx_tools import insert_soft_hyphens, text_nodes
+from nativeflow.epub_builder import STYLE_MAP, hyphenate_soup
+from nativeflow.hyphenate import Hyphenator
+
+SYLLABLES = ("ca me ri to sa lu na pe dro mon tru ven ta cie lo co ra zon es cu cha mos bra zo "
+             "llu via jar din mi ra ba des pa cio cal ma tris te za ale gri a").split()
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.choice((1, 2, 2, 3, 3, 4, 5)))))
+    return sorted(words, key=lambda w: (len(w), w))    # Las cortas, las más frecuentes (como en un texto real)
+
+
+def build_novel(n_words, vocabulary, seed=11):
+    rng = random.Random(seed)
+    words = make_vocabulary(vocabulary, rng)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    doc = Document()
+    written = 0
+    while written < n_words:
+        if written % 4000 == 0: doc.add_heading(f"Capítulo {written // 4000 + 1}", 1)
+        n = rng.randint(40, 120)
+        text = " ".join(rng.choices(words, cum_weights=weights, k=n)).capitalize() + "."
+        p = doc.add_paragraph(text[:len(text) // 2])
+        p.add_run(text[len(text) // 2:]).italic = rng.random() < 0.1
+        written += n
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue(), written
+
+
+def docx_pass(data, hyphenator):
+    doc = Document(BytesIO(data))
+    t0 = time.perf_counter()
+    inserted = sum(insert_soft_hyphens(text_nodes(p), hyphenator.text) for p in doc.element.body.p_lst)
+    return time.perf_counter() - t0, inserted
+
+
+def epub_pass(html, hyphenator):
+    soup = BeautifulSoup(html, "html.parser")
+    t0 = time.perf_counter()
+    hyphenate_soup(soup, hyphenator)
+    return time.perf_counter() - t0
+
+
+def hit_rate(stats):
+    total = stats["hits"] + stats["misses"]
+    return stats["hits"] / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=100000, help="~350 páginas con el valor por defecto")
+    parser.add_argument("--vocabulary", type=int, default=12000)
+    parser.add_argument("--lang", default="es")
+    args = parser.parse_args()
+
+    data, n_words = build_novel(args.words, args.vocabulary)
+    html = mammoth.convert_to_html(BytesIO(data), style_map=STYLE_MAP).value
+    print(f"novela: {n_words:,} palabras, vocabulario {args.vocabulary:,}")
+
+    for name, max_words in (("sin caché", 0), ("LRU por palabra", 50000), ("LRU pequeño (2000)", 2000)):
+        hyphenator = Hyphenator(args.lang, max_words=max_words)
+        docx_t, inserted = docx_pass(data, hyphenator)
+        after_docx = hyphenator.stats()
+        epub_t = epub_pass(html, hyphenator)
+        after_epub = hyphenator.stats()
+        epub_only = {k: after_epub[k] - after_docx[k] for k in ("hits", "misses")}
+        print(f"{name:<20} docx {docx_t:.2f}s ({n_words / docx_t:>9,.0f} palabras/s, aciertos {hit_rate(after_docx):5.1%})"
+              f"   epub {epub_t:.2f}s ({n_words / epub_t:>9,.0f} palabras/s, aciertos {hit_rate(epub_only):5.1%})"
+              f"   guiones {inserted:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Maquetador KDP (Módulo 2): motor de una pasada frente a la versión por etapas anterior.
+
+Mide párrafos por segundo en libros grandes, comprueba que el texto resultante coincide
+con la implementación anterior y que el formato en línea (cursivas, negritas) sobrevive.
+
+Uso: python -m benchmarks.bench_layout [--sizes 10000 50000] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import time
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt
+
+from nativeflow.docx_tools import enable_native_hyphenation, stitch_paragraphs
+from nativeflow.layout import THEMES, LayoutPlan, setup_pages
+
+WORDS = "el monstruo azul respira despacio cuando la noche llega y cuenta hasta diez".split()
+
+
+def legacy_prevent_runts(paragraph):
+    text = paragraph.text.strip()
+    if not text or len(text) < 20: return
+    last_space = text.rfind(' ')
+    if last_space != -1:
+        paragraph.text = text[:last_space] + "\u00A0" + text[last_space+1:]
+
+
+def legacy_layout(doc, theme_name="Neutro (Estándar)", size="6 x 9 pulgadas"):
+    # Implementación anterior: varias pasadas y `p.text = ...` en títulos, runts y letra capital
+    theme = THEMES[theme_name]
+    stitch_paragraphs(doc)
+    enable_native_hyphenation(doc)
+    setup_pages(doc, theme, size, True, True, True)
+    previous_was_heading = False
+    for p in doc.paragraphs:
+        text_clean = p.text.strip()
+        if len(text_clean) < 2: continue
+        is_h = p.style.name.startswith('Heading') or (len(text_clean) < 60 and (re.match(r'^(chapter|cap[íi]tulo)\b', text_clean, re.I) or text_clean.isupper()))
+        if is_h:
+            previous_was_heading = True
+            p.style = doc.styles['Heading 1']
+            p.text = "\n" + text_clean.upper()
+            p.paragraph_format.keep_with_next = True
+        else:
+            if len(text_clean) > 50: legacy_prevent_runts(p)
+            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            if previous_was_heading:
+                char = text_clean[0]; rest = text_clean[1:]
+                p.text = ""; run = p.add_run(char)
+                run.font.name = theme['header']; run.font.size = Pt(theme['size']+5); run.bold = True
+                p.add_run(rest).font.name = theme['font']
+            previous_was_heading = False
+
+
+def fused_layout(doc):
+    LayoutPlan().apply(doc)
+
+
+def build_book(n, seed=5):
+    rng = random.Random(seed)
+    sentence = lambda k: " ".join(rng.choice(WORDS) for _ in range(k))
+    doc = Document()
+    for i in range(n):
+        kind = i % 40
+        if kind == 0: doc.add_heading(f"Capítulo {i // 40}", 1)
+        elif kind == 1: doc.add_paragraph(f"capítulo especial {i}")
+        elif kind == 2: doc.add_paragraph("UNA PAUSA PARA RESPIRAR")
+        elif kind % 7 == 0: doc.add_paragraph(sentence(rng.randint(4, 9)))    # Línea rota
+        elif kind % 11 == 0: doc.add_paragraph("")
+        else:
+            p = doc.add_paragraph(sentence(rng.randint(6, 14)) + " ")
+            p.add_run(sentence(2)).italic = True
+            p.add_run(" " + sentence(rng.randint(3, 8)) + ".")
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue()
+
+
+def texts(doc):
+    # La versión anterior perdía el espacio duro del primer párrafo tras un título (letra capital)
+    return [p.text.replace("\u00A0", " ") for p in doc.paragraphs]
+
+
+def italic_runs(doc):
+    return sum(1 for p in doc.paragraphs for r in p.runs if r.italic)
+
+
+def best(fn, data, repeat):
+    times = []
+    for _ in range(repeat):
+        doc = Document(BytesIO(data))
+        t0 = time.perf_counter()
+        fn(doc)
+        times.append(time.perf_counter() - t0)
+    return min(times), doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        data = build_book(n)
+        before = italic_runs(Document(BytesIO(data)))
+        old_t, old_doc = best(legacy_layout, data, args.repeat)
+        new_t, new_doc = best(fused_layout, data, args.repeat)
+        print(f"{n:>7} párrafos  antes {old_t:.2f}s ({n / old_t:,.0f} p/s)  ahora {new_t:.2f}s ({n / new_t:,.0f} p/s)"
+              f"  (x{old_t / new_t:.1f})  texto idéntico: {texts(old_doc) == texts(new_doc)}"
+              f"  cursivas {before} -> antes {italic_runs(old_doc)} / ahora {italic_runs(new_doc)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Instrucciones fijas como system_instruction frente a repetirlas delante de cada párrafo.
+
+Ejecuta auditoría (por lotes e individual), reescritura y adaptación con un modelo falso
+que registra lo que recibe: las instrucciones al crearse y el texto en cada llamada.
+Informa de los tokens de entrada por llamada antes y después, y comprueba que cada bloque
+de instrucciones se crea una sola vez y nunca va dentro del texto de una llamada. Usa los
+prompts por defecto de la interfaz.
+
+Gemini factura las system_instruction en cada petición, salvo lo que sirva una caché de
+contexto (explícita si el bloque es lo bastante largo, o la implícita por prefijo común),
+que este doble no puede medir. Por eso "facturado después" suma las instrucciones en cada
+llamada: es lo que se paga sin caché de contexto.
+
+Uso: python -m benchmarks.bench_prefix [--paragraphs 2000]
+"""
+import argparse
+import ast
+import os
+import sys
+import threading
+
+from benchmarks.stub_model import StubModel
+from benchmarks.synthetic import build_manuscript
+from nativeflow.audit import audit_manuscript
+from nativeflow.llm import InstructedModels, LLMExecutor, call_model, estimate_tokens, inline_instructions
+from nativeflow.rewrite import rewrite_manuscript
+from nativeflow.workbook import adapt_workbook
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def app_prompts():
+    """Prompts por defecto de app.py (default_audit, default_rewrite, default_kindle_prompt)."""
+    with open(APP, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    return {node.targets[0].id: node.value.value for node in ast.walk(tree)
+            if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+            and node.targets[0].id.startswith("default_") and isinstance(node.value, ast.Constant)}
+
+
+class Recorder:
+    """Lo que llega al modelo: instrucciones al crear cada modelo y el texto de cada llamada."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.lock = threading.Lock()
+        self.instructions, self.prompts, self.billed = [], [], []
+
+    def factory(self, system=None):
+        with self.lock:
+            if system: self.instructions.append(system)
+        recorder = self
+
+        class Model(StubModel):
+            def generate_content(self, prompt, stream=False, **kwargs):
+                with recorder.lock:
+                    recorder.prompts.append(prompt)
+                    recorder.billed.append(estimate_tokens(prompt) + estimate_tokens(self.system_instruction or ""))
+                return super().generate_content(prompt, stream=stream, **kwargs)
+
+        return Model(latency=0, reply=self.reply, system_instruction=system)
+
+
+def before_call(recorder):
+    # Comportamiento anterior: un solo modelo y las instrucciones delante de cada texto
+    model = recorder.factory()
+    return inline_instructions(lambda prompt: call_model(model, prompt))
+
+
+def after_call(recorder):
+    models = InstructedModels(recorder.factory)
+    return lambda prompt, system=None: call_model(models.get(system), prompt, system=system)
+
+
+def run_job(name, data, prompts, call):
+    executor = LLMExecutor(8)
+    if name == "auditoría (lotes)": audit_manuscript(data, prompts["default_audit"], call, executor)
+    elif name == "auditoría (individual)": audit_manuscript(data, prompts["default_audit"], call, executor, batch=False)
+    elif name == "reescritura": rewrite_manuscript(data, prompts["default_rewrite"], call, executor)
+    else: adapt_workbook(data, prompts["default_kindle_prompt"], call, executor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    args = parser.parse_args()
+
+    prompts = app_prompts()
+    data = build_manuscript(args.paragraphs)
+    failures = []
+    print(f"{'trabajo':<24}{'llamadas':>9}{'tokens/llamada antes':>22}{'después (texto)':>17}"
+          f"{'instrucciones':>15}{'facturado antes':>17}{'después':>9}")
+    for name, reply in (("auditoría (lotes)", "CLEAN"), ("auditoría (individual)", "CLEAN"),
+                        ("reescritura", "Texto reescrito."), ("adaptación", "Narrativa adaptada.")):
+        old, new = Recorder(reply), Recorder(reply)
+        run_job(name, data, prompts, before_call(old))
+        run_job(name, data, prompts, after_call(new))
+        old_tokens = [estimate_tokens(p) for p in old.prompts]
+        new_tokens = [estimate_tokens(p) for p in new.prompts]
+        prefix_tokens = sum(estimate_tokens(s) for s in new.instructions)
+        calls = len(new.prompts)
+        print(f"{name:<24}{calls:>9}{sum(old_tokens) / calls:>22.0f}{sum(new_tokens) / calls:>17.0f}"
+              f"{prefix_tokens:>15}{sum(old_tokens):>17,}{sum(new.billed):>9,}")
+
+        if len(new.instructions) != len(set(new.instructions)):
+            failures.append(f"{name}: un bloque de instrucciones se creó más de una vez")
+        if not new.instructions or any(s in p for s in new.instructions for p in new.prompts):
+            failures.append(f"{name}: las instrucciones viajan dentro de las llamadas")
+        if len(old.prompts) != calls:
+            failures.append(f"{name}: distinto número de llamadas ({len(old.prompts)} antes, {calls} después)")
+
+    for failure in failures: print(f"❌ {failure}")
+    if failures: sys.exit(1)
+    print("✅ Cada bloque de instrucciones se crea una sola vez, con el modelo; el texto de las llamadas ya no lo repite.")
+    print("ℹ️ Las instrucciones se siguen facturando en cada llamada (columna \"facturado\"): el ahorro de tokens solo "
+          "llega si la caché de contexto de Gemini las sirve, y eso no se mide aquí.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Escalado de stitch_paragraphs (1k, 10k, 50k párrafos) frente a la versión cuadrática anterior.
+
+Uso: python benchmarks/bench_stitch.py [--sizes 1000 10000 50000] [--legacy-max 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from docx import Document
+
+from nativeflow.docx_tools import stitch_paragraphs
+
+
+def legacy_stitch_paragraphs(doc):
+    # Implementación original: reconstruye doc.paragraphs en cada iteración
+    for i in range(len(doc.paragraphs) - 2, -1, -1):
+        p_curr = doc.paragraphs[i]
+        p_next = doc.paragraphs[i+1]
+        text_curr = p_curr.text.strip()
+        text_next = p_next.text.strip()
+        if not text_curr or not text_next: continue
+        if p_curr.style.name.startswith('Heading') or p_next.style.name.startswith('Heading'): continue
+        if text_curr[-1] not in ['.', '!', '?', '"', '”', ':']:
+            p_curr.text = text_curr + " " + text_next
+            p_next._element.getparent().remove(p_next._element)
+
+
+def build_doc(n):
+    doc = Document()
+    for i in range(n):
+        kind = i % 10
+        if kind == 0: doc.add_heading(f"Capítulo {i // 10}", 1)
+        elif kind in (1, 2, 3): doc.add_paragraph(f"Una línea rota número {i} que sigue")
+        elif kind == 4: doc.add_paragraph("")
+        else: doc.add_paragraph(f"Una frase completa número {i}.")
+    return doc
+
+
+def timed(fn, doc):
+    t0 = time.perf_counter()
+    fn(doc)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--legacy-max", type=int, default=5000,
+                        help="No ejecutar la versión antigua por encima de este tamaño")
+    args = parser.parse_args()
+
+    print(f"{'párrafos':>10} {'nuevo (s)':>10} {'antiguo (s)':>12} {'iguales':>8}")
+    for n in args.sizes:
+        new_doc = build_doc(n)
+        t_new = timed(stitch_paragraphs, new_doc)
+        t_old, same = "-", "-"
+        if n <= args.legacy_max:
+            old_doc = build_doc(n)
+            t_old = f"{timed(legacy_stitch_paragraphs, old_doc):.2f}"
+            same = [p.text for p in old_doc.paragraphs] == [p.text for p in new_doc.paragraphs]
+        print(f"{n:>10} {t_new:>10.3f} {t_old:>12} {str(same):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Suite de rendimiento: mide cada módulo sobre manuscritos sintéticos y guarda un JSON.
+
+Uso:
+    python -m benchmarks.run --sizes 1000 5000 --output bench.json
+    python -m benchmarks.run --sizes 1000 --compare bench.json      # compara con una ejecución previa
+    python -m benchmarks.run --stages layout epub --latency 0.05     # solo algunas etapas
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.stub_model import StubModel
+from benchmarks.synthetic import build_manuscript
+from nativeflow.audit import audit_manuscript
+from nativeflow.cleaner import nuclear_clean_docx
+from nativeflow.docx_tools import load_docx, stitch_paragraphs
+from nativeflow.epub_builder import docx_to_epub
+from nativeflow.layout import kdp_layout
+from nativeflow.llm import LLMError, LLMExecutor, call_model
+from nativeflow.prescreen import Cascade, HeuristicScreen
+from nativeflow.rewrite import rewrite_manuscript
+from nativeflow.workbook import adapt_workbook, find_exercise_indices, group_blocks
+
+AUDIT_PROMPT = "Detecta Espanglish. Si es perfecto, responde \"CLEAN\"."
+
+
+def stub_call(model):
+    def call(prompt, system=None):
+        try:
+            return call_model(model, prompt, system=system)
+        except LLMError:
+            return "[ERROR API]"
+    return call
+
+
+# Cada etapa recibe (bytes del manuscrito, args) y devuelve un dict opcional de métricas extra.
+def stage_stitch(data, args):
+    doc = load_docx(data)
+    before = len(doc.paragraphs)
+    t0 = time.perf_counter()
+    stitch_paragraphs(doc)
+    return {"seconds": time.perf_counter() - t0, "merged": before - len(doc.paragraphs)}
+
+
+def stage_layout(data, args):
+    kdp_layout(data)
+
+
+def stage_detect(data, args):
+    texts = [p.text for p in load_docx(data).paragraphs]
+    t0 = time.perf_counter()
+    blocks = group_blocks(find_exercise_indices(texts))
+    return {"seconds": time.perf_counter() - t0, "blocks": len(blocks)}
+
+
+def stage_nuclear_clean(data, args):
+    nuclear_clean_docx(data)
+
+
+def stage_epub(data, args):
+    return {"output_bytes": len(docx_to_epub(data, title="Bench"))}
+
+
+def stage_ai_audit(data, args):
+    model = StubModel(latency=args.latency)
+    audit_manuscript(data, AUDIT_PROMPT, stub_call(model), LLMExecutor(args.workers))
+    return {"model_calls": model.calls}
+
+
+def stage_ai_audit_cascade(data, args):
+    # Heurística + modelo rápido stub (responde CLEAN a todo) delante del modelo pro stub
+    pro, screen = StubModel(latency=args.latency), StubModel(latency=args.latency / 4)
+    cascade = Cascade(HeuristicScreen(), stub_call(screen))
+    _, stats = audit_manuscript(data, AUDIT_PROMPT, stub_call(pro), LLMExecutor(args.workers), cascade=cascade)
+    return {"model_calls": pro.calls, "screen_calls": screen.calls,
+            "pro_calls_projected": stats["pro_calls_projected"]}
+
+
+def stage_ai_audit_dedup(data, args):
+    model = StubModel(latency=args.latency)
+    _, stats = audit_manuscript(data, AUDIT_PROMPT, stub_call(model), LLMExecutor(args.workers), dedup=True)
+    return {"model_calls": model.calls, "calls_avoided": stats["dedup_calls_saved"]}
+
+
+def stage_ai_rewrite(data, args, dedup=False):
+    model = StubModel(latency=args.latency, reply="Texto reescrito.")
+    _, stats = rewrite_manuscript(data, "Reescribe.", stub_call(model), LLMExecutor(args.workers), dedup=dedup)
+    return {"model_calls": model.calls, "calls_avoided": stats["duplicates"]}
+
+
+def stage_ai_adapt(data, args, dedup=False):
+    model = StubModel(latency=args.latency, reply="Narrativa adaptada.")
+    _, stats = adapt_workbook(data, "Adapta.", stub_call(model), LLMExecutor(args.workers), dedup=dedup)
+    return {"model_calls": model.calls, "calls_avoided": stats["duplicates"]}
+
+
+STAGES = {
+    "stitch": stage_stitch,
+    "layout": stage_layout,
+    "detect": stage_detect,
+    "nuclear_clean": stage_nuclear_clean,
+    "epub": stage_epub,
+    "ai_audit": stage_ai_audit,
+    "ai_audit_cascade": stage_ai_audit_cascade,
+    "ai_audit_dedup": stage_ai_audit_dedup,
+    "ai_rewrite": stage_ai_rewrite,
+    "ai_rewrite_dedup": lambda data, args: stage_ai_rewrite(data, args, dedup=True),
+    "ai_adapt": stage_ai_adapt,
+    "ai_adapt_dedup": lambda data, args: stage_ai_adapt(data, args, dedup=True),
+}
+
+
+def measure(fn, data, args):
+    times, extra = [], {}
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        extra = fn(data, args) or {}
+        times.append(extra.pop("seconds", time.perf_counter() - t0))
+    return {"min": min(times), "median": statistics.median(times), **extra}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = {(r["stage"], r["paragraphs"]): r for r in json.load(fh)["results"]}
+    print(f"\n{'etapa':<17} {'párrafos':>9} {'antes (s)':>10} {'ahora (s)':>10} {'cambio':>8}")
+    for r in results:
+        old = baseline.get((r["stage"], r["paragraphs"]))
+        if not old: continue
+        ratio = r["min"] / old["min"] if old["min"] else float("inf")
+        print(f"{r['stage']:<17} {r['paragraphs']:>9} {old['min']:>10.3f} {r['min']:>10.3f} {ratio:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.01, help="Latencia del modelo falso (s)")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos del executor de IA")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'etapa':<17} {'párrafos':>9} {'mín (s)':>9} {'mediana (s)':>12}  extra")
+    for size in args.sizes:
+        data = build_manuscript(size)
+        for name in args.stages:
+            r = {"stage": name, "paragraphs": size, **measure(STAGES[name], data, args)}
+            results.append(r)
+            extra = {k: v for k, v in r.items() if k not in ("stage", "paragraphs", "min", "median")}
+            print(f"{name:<17} {size:>9} {r['min']:>9.3f} {r['median']:>12.3f}  {extra or ''}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+    if args.compare: compare(results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
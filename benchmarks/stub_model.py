@@ -0,0 +1,50 @@
+"""Modelo falso con la interfaz de `genai.GenerativeModel` para medir sin red."""
+import json
+import re
+import time
+
+
+class StubResponse:
+    def __init__(self, text): self.text = text
+
+
+class StubStream(StubResponse):
+    """Respuesta en streaming: se itera por fragmentos y `.text` da el texto completo."""
+
+    def __init__(self, text, latency, chunks=4):
+        super().__init__(text)
+        self.latency = latency
+        size = max(1, -(-len(text) // chunks))
+        self.pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+    def __iter__(self):
+        for piece in self.pieces:
+            time.sleep(self.latency / len(self.pieces))
+            yield StubResponse(piece)
+
+
+class StubModel:
+    """Imita `generate_content` con una latencia fija.
+
+    Responde un array JSON de veredictos a los prompts de auditoría por lotes y un texto
+    fijo al resto, así que sirve para todos los caminos de IA de la suite. Guarda la
+    `system_instruction` con la que se creó, como `genai.GenerativeModel`.
+    """
+
+    def __init__(self, model_name="models/stub", latency=0.2, reply="CLEAN", system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+        self.reply = reply
+        self.system_instruction = system_instruction
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        ids = re.findall(r"^\[(\d+)\] ", prompt, re.M) if isinstance(prompt, str) else []
+        if ids:
+            text = json.dumps([{"id": int(i), "verdict": "CLEAN", "explanation": ""} for i in ids])
+        else:
+            text = self.reply
+        if stream: return StubStream(text, self.latency)
+        time.sleep(self.latency)
+        return StubResponse(text)
@@ -0,0 +1,89 @@
+"""Generador de manuscritos .docx sintéticos para las pruebas de rendimiento.
+
+Incluye títulos, líneas rotas, bloques de ejercicios con "____", listas de preguntas
+"¿...?", párrafos de relleno y cierre, e imágenes incrustadas.
+"""
+import random
+import struct
+import zlib
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Inches
+
+WORDS = ("el niño miraba la ventana mientras la lluvia caía sobre el jardín y su monstruo "
+         "respiraba despacio porque la calma llega cuando escuchamos el corazón con cariño").split()
+
+
+def make_png(width=64, height=48, seed=0):
+    """PNG RGB mínimo generado sin dependencias externas."""
+    rng = random.Random(seed)
+    color = bytes(rng.randrange(256) for _ in range(3))
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def build_manuscript(paragraphs=1000, chapter_every=60, exercise_every=25, image_every=150,
+                     image_size=(64, 48), distinct_images=4, seed=42, images=None):
+    """Devuelve los bytes de un .docx con aproximadamente `paragraphs` párrafos.
+
+    `images` (lista de bytes) sustituye a los PNG lisos de `image_size` que se insertan por defecto.
+    """
+    rng = random.Random(seed)
+    images = images or [make_png(*image_size, seed=i) for i in range(max(1, distinct_images))]
+    doc = Document()
+    count, chapter, n_images = 0, 0, 0
+    next_chapter, next_image, next_exercise = 0, image_every or paragraphs, exercise_every or paragraphs
+    while count < paragraphs:
+        if count >= next_chapter:
+            chapter += 1
+            next_chapter += chapter_every
+            doc.add_heading(f"Capítulo {chapter}", 1)
+            doc.add_paragraph("")
+            count += 2
+            continue
+        if image_every and count >= next_image:
+            next_image += image_every
+            doc.add_picture(BytesIO(images[n_images % len(images)]), width=Inches(2))
+            n_images += 1
+            count += 1
+            continue
+        if exercise_every and count >= next_exercise:
+            next_exercise += exercise_every
+            doc.add_paragraph("Ejercicio: escribe tu respuesta")
+            doc.add_paragraph("Querido ____________________")
+            doc.add_paragraph("¿Cómo se siente tu monstruo hoy?")
+            doc.add_paragraph("¿Qué color tiene tu calma?")
+            doc.add_paragraph("Nombre: ")
+            doc.add_paragraph("__________________________")
+            count += 6
+            continue
+        if rng.random() < 0.3:
+            # Línea rota: termina sin puntuación y continúa en el párrafo siguiente
+            doc.add_paragraph(sentence(rng, rng.randint(6, 12)))
+            doc.add_paragraph(sentence(rng, rng.randint(6, 12)) + ".")
+            count += 2
+        else:
+            doc.add_paragraph(" ".join(sentence(rng, rng.randint(8, 16)) + "." for _ in range(rng.randint(2, 5))))
+            count += 1
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output")
+    parser.add_argument("--paragraphs", type=int, default=1000)
+    args = parser.parse_args()
+    with open(args.output, "wb") as fh:
+        fh.write(build_manuscript(args.paragraphs))
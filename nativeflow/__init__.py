@@ -0,0 +1 @@
+"""Lógica reutilizable de la Suite Autores 360 (sin dependencia de Streamlit)."""
@@ -0,0 +1,246 @@
+"""Auditoría por lotes: varios párrafos numerados por petición con veredicto JSON."""
+import json
+import re
+from collections import Counter
+
+from docx import Document
+
+from .dedup import fan_out, group_duplicates, representatives
+from .docx_tools import load_docx, save_docx
+from .fingerprints import diff_versions, paragraph_hash
+from .journal import map_with_journal
+from .metrics import timed
+
+SINGLE_MAX_CHARS = 800
+DEFAULT_BATCH_CHARS = 6000
+
+# Quién decidió cada veredicto (los niveles baratos de la cascada están en prescreen.py)
+TIER_PRO = "modelo pro"
+TIER_CARRIED = "versión anterior"
+TIER_RESUMED = "progreso guardado"
+TIER_DUPLICATE = "texto repetido"
+
+BATCH_INSTRUCTIONS = """Vas a recibir varios párrafos numerados con la forma [ID] texto.
+Analiza CADA párrafo por separado con los criterios anteriores.
+Responde ÚNICAMENTE con un array JSON, un objeto por párrafo y sin texto extra:
+[{"id": <ID>, "verdict": "CLEAN" o "ISSUE", "explanation": "<explicación si hay problemas, vacía si es CLEAN>"}]"""
+
+
+# Las instrucciones (prompt del usuario + formato) van como `system`; el prompt solo lleva el texto
+def single_prompt(text):
+    return f"TEXTO: '{text[:SINGLE_MAX_CHARS]}'"
+
+
+def build_batches(items, max_chars=DEFAULT_BATCH_CHARS):
+    """Agrupa [(id, texto)] en lotes cuyo texto total no supera `max_chars` (mínimo un párrafo)."""
+    batches, current, used = [], [], 0
+    for pid, text in items:
+        text = text[:SINGLE_MAX_CHARS]
+        if current and used + len(text) > max_chars:
+            batches.append(current)
+            current, used = [], 0
+        current.append((pid, text))
+        used += len(text)
+    if current: batches.append(current)
+    return batches
+
+
+def batch_system(audit_prompt):
+    return f"{audit_prompt}\n\n{BATCH_INSTRUCTIONS}"
+
+
+def batch_prompt(batch):
+    body = "\n\n".join(f"[{pid}] {text}" for pid, text in batch)
+    return f"PÁRRAFOS:\n{body}"
+
+
+def parse_batch_reply(reply, ids):
+    """Devuelve {id: "CLEAN" | explicación} solo para los ids válidos de la respuesta."""
+    match = re.search(r"\[.*\]", reply or "", re.S)
+    if not match: return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    wanted, verdicts = set(ids), {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict): continue
+        try:
+            pid = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        verdict = str(entry.get("verdict", "")).strip().upper()
+        explanation = str(entry.get("explanation") or "").strip()
+        if pid not in wanted: continue
+        if verdict == "CLEAN": verdicts[pid] = "CLEAN"
+        elif verdict == "ISSUE" and explanation: verdicts[pid] = explanation
+    return verdicts
+
+
+def run_batched_audit(items, audit_prompt, call, executor, max_chars=DEFAULT_BATCH_CHARS,
+                      on_progress=None, journal=None):
+    """Audita [(id, texto)] por lotes; los párrafos sin veredicto válido se repiten de uno en uno.
+
+    `on_progress(done, total, fase)` recibe "lotes" o "individual" como fase. Con `journal`
+    (JobJournal) se saltan los párrafos ya auditados y cada veredicto se guarda al llegar.
+    """
+    verdicts = {}
+    if journal is not None:
+        verdicts = {pid: journal.get(pid) for pid, _ in items if pid in journal}
+    pending = [(pid, text) for pid, text in items if pid not in verdicts]
+    texts = dict(pending)
+    batches = build_batches(pending, max_chars)
+    prompts = [batch_prompt(batch) for batch in batches]
+
+    def keep(pid, verdict):
+        verdicts[pid] = verdict
+        if journal is not None and "[ERROR" not in verdict: journal.record(pid, verdict)
+
+    def on_batch(done, total, idx, reply):
+        for pid, verdict in parse_batch_reply(reply, [pid for pid, _ in batches[idx]]).items():
+            keep(pid, verdict)
+        if on_progress: on_progress(done, total, "lotes")
+
+    system = batch_system(audit_prompt)
+    executor.map(lambda prompt: call(prompt, system=system), prompts, on_progress=on_batch)
+
+    missing = [pid for pid, _ in pending if pid not in verdicts]
+
+    def on_single(done, total, idx, reply):
+        keep(missing[idx], reply)
+        if on_progress: on_progress(done, total, "individual")
+
+    executor.map(lambda pid: call(single_prompt(texts[pid]), system=audit_prompt), missing, on_progress=on_single)
+    return verdicts, {"batches": len(batches), "fallbacks": len(missing),
+                      "resumed": len(items) - len(pending)}
+
+
+def pid_ranges(pids):
+    """[1, 2, 3, 7, 9, 10] -> "1-3, 7, 9-10"."""
+    runs = []
+    for pid in sorted(pids):
+        if runs and pid == runs[-1][1] + 1: runs[-1][1] = pid
+        else: runs.append([pid, pid])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in runs)
+
+
+def audit_manuscript(data, audit_prompt, call, executor, batch=True, max_chars=DEFAULT_BATCH_CHARS,
+                     journal=None, on_progress=None, metrics=None, fingerprints=None, doc_cache=None,
+                     cascade=None, dedup=False):
+    """Audita un .docx (bytes) y devuelve (reporte .docx en bytes, estadísticas).
+
+    `on_progress(done, total, fase)`; la fase es "lotes", "individual", "párrafos" o "filtro".
+    Con `fingerprints` (FingerprintStore) solo van al modelo los párrafos nuevos o
+    modificados; el resto hereda el veredicto de la versión anterior y el reporte
+    incluye un resumen de cambios. Con `cascade` (prescreen.Cascade) los niveles baratos
+    deciden primero y solo los párrafos dudosos llegan a `call`; el reporte indica qué
+    nivel decidió cada párrafo. Con `dedup` los párrafos repetidos (mismo texto salvo
+    espacios y mayúsculas) se auditan una vez y heredan el veredicto de la primera aparición.
+    """
+    doc = load_docx(data, metrics, doc_cache)
+    # Identificamos cada párrafo por su número real en el manuscrito
+    items = [(i + 1, p.text) for i, p in enumerate(doc.paragraphs) if len(p.text) > 20]
+
+    carried, changes, previous = {}, None, {}
+    if fingerprints is not None:
+        with timed(metrics, "fingerprint"):
+            hashes = {pid: paragraph_hash(text) for pid, text in items}
+            carried = {pid: fingerprints.get(h) for pid, h in hashes.items() if h in fingerprints}
+            if fingerprints.paragraphs:
+                changes, previous = diff_versions(fingerprints.paragraphs, list(hashes.items()))
+    pending = [(pid, text) for pid, text in items if pid not in carried]
+    calls_for = lambda todo: len(build_batches(todo, max_chars)) if batch else len(todo)
+    unique, copies = group_duplicates(pending) if dedup else (pending, {})
+    resumed_ids = {pid for pid, _ in unique if journal is not None and pid in journal}
+    fresh = [(pid, text) for pid, text in unique if pid not in resumed_ids]
+    # Llamadas pro que haría el trabajo sin cascada (sin contar repeticiones individuales)
+    projected = calls_for(fresh)
+    duplicate_of = representatives(copies)
+    dedup_saved = calls_for([item for item in pending if item[0] not in resumed_ids]) - projected
+
+    decided, screen_calls, pending_pro = {}, 0, unique
+    if cascade is not None:
+        with timed(metrics, "prescreen"):
+            decided, pending_pro, screen_calls = cascade.run(unique, audit_prompt, executor, max_chars=max_chars,
+                                                             journal=journal, on_progress=on_progress)
+
+    with timed(metrics, "dispatch"):
+        if batch:
+            verdicts, stats = run_batched_audit(pending_pro, audit_prompt, call, executor, max_chars=max_chars,
+                                                on_progress=on_progress, journal=journal)
+        else:
+            progress = on_progress and (lambda d, t, i, r: on_progress(d, t, "párrafos"))
+            fn = lambda item: call(single_prompt(item[1]), system=audit_prompt)
+            if journal is not None:
+                results, resumed = map_with_journal(executor, fn, pending_pro, [pid for pid, _ in pending_pro], journal,
+                                                    on_progress=progress)
+            else:
+                results, resumed = executor.map(fn, pending_pro, on_progress=progress), 0
+            verdicts = {pid: res for (pid, _), res in zip(pending_pro, results) if res is not None}
+            stats = {"batches": 0, "fallbacks": 0, "resumed": resumed}
+    tiers = {pid: TIER_RESUMED if pid in resumed_ids else TIER_PRO for pid in verdicts}
+    tiers.update(decided)
+    tiers.update({pid: TIER_CARRIED for pid in carried})
+    verdicts.update({pid: "CLEAN" for pid in decided})
+    verdicts = fan_out(verdicts, copies)
+    tiers.update({pid: TIER_DUPLICATE for pid, rep in duplicate_of.items() if rep in tiers})
+    stats["tiers"] = dict(Counter(tiers.values()))
+    stats["screen_calls"] = screen_calls
+    stats["pro_calls_projected"] = projected
+    stats["pro_calls"] = (stats["batches"] + stats["fallbacks"]) if batch else len(pending_pro) - stats["resumed"]
+    stats["carried"] = len(carried)
+    stats["duplicates"] = len(duplicate_of)
+    stats["dedup_calls_saved"] = dedup_saved
+    stats["changes"] = changes
+    # Párrafos sin veredicto porque el trabajo se canceló antes de llegar a ellos
+    stats["unaudited"] = len(pending) - len(verdicts)
+    if fingerprints is not None:
+        fingerprints.update(hashes.items(), {hashes[pid]: v for pid, v in verdicts.items()})
+        verdicts.update(carried)
+    if metrics is not None:
+        metrics.incr("batches", stats["batches"])
+        metrics.incr("batch_fallbacks", stats["fallbacks"])
+        metrics.incr("resumed_items", stats["resumed"])
+        metrics.incr("carried_verdicts", stats["carried"])
+        if dedup:
+            metrics.incr("duplicate_items", stats["duplicates"])
+            metrics.incr("dedup_calls_saved", dedup_saved)
+        if cascade is not None:
+            metrics.incr("screen_calls", screen_calls)
+            metrics.incr("pro_calls_projected", projected)
+            metrics.incr("pro_calls_saved", projected - stats["pro_calls"])
+
+    with timed(metrics, "report"):
+        audit_doc = Document()
+        audit_doc.add_heading("Reporte de Auditoría Editorial", 0)
+        if changes is not None:
+            audit_doc.add_heading("Cambios respecto a la versión anterior", 1)
+            audit_doc.add_paragraph(f"Sin cambios: {changes['unchanged']} · Modificados: {changes['changed']} · "
+                                    f"Nuevos: {changes['added']} · Eliminados: {changes['removed']}")
+            audit_doc.add_paragraph(f"Veredictos reutilizados sin llamar al modelo: {len(carried)}")
+        if stats["duplicates"]:
+            audit_doc.add_paragraph(f"♊ Párrafos repetidos auditados una sola vez: {stats['duplicates']} "
+                                    f"({dedup_saved} llamadas evitadas)")
+        if stats["unaudited"]:
+            audit_doc.add_paragraph(f"⏹️ Auditoría cancelada: {stats['unaudited']} párrafos quedaron sin auditar.")
+        for pid, _ in items:
+            res = verdicts.get(pid)
+            if res is not None and "CLEAN" not in res:
+                if pid in carried:
+                    before = f", antes {previous[pid]}" if pid in previous else ""
+                    audit_doc.add_paragraph(f"📌 Párrafo {pid} (sin cambios{before}):")
+                elif pid in duplicate_of:
+                    audit_doc.add_paragraph(f"📌 Párrafo {pid} (igual que el párrafo {duplicate_of[pid]}):")
+                else:
+                    audit_doc.add_paragraph(f"📌 Párrafo {pid}:")
+                audit_doc.add_paragraph(res)
+                audit_doc.add_paragraph("-" * 20)
+        if cascade is not None:
+            audit_doc.add_heading("Decisiones por nivel", 1)
+            audit_doc.add_paragraph(f"Llamadas al modelo pro: {stats['pro_calls']} de {projected} previstas "
+                                    f"sin cascada · llamadas al modelo rápido: {screen_calls}")
+            by_tier = {}
+            for pid, tier in tiers.items(): by_tier.setdefault(tier, []).append(pid)
+            for tier, pids in sorted(by_tier.items()):
+                audit_doc.add_paragraph(f"{tier} ({len(pids)}): párrafos {pid_ranges(pids)}")
+    return save_docx(audit_doc, metrics), stats
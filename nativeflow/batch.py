@@ -0,0 +1,80 @@
+"""Lotes desde la interfaz: varios .docx (o un ZIP) repartidos en un pool de procesos."""
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from .pipelines import process_bytes
+
+REPORT_NAME = "informe_lote.txt"
+
+
+def collect_inputs(files):
+    """Expande [(nombre, bytes)] de la subida en [(nombre, bytes)] de .docx.
+
+    Los .zip se abren y aportan sus .docx (sin carpetas de sistema ni temporales de Word).
+    Los nombres repetidos se numeran para que no se pisen en el ZIP de salida.
+    Devuelve (entradas, errores) donde errores es [(nombre, mensaje)].
+    """
+    inputs, errors, seen = [], [], {}
+
+    def add(name, data):
+        base = os.path.basename(name)
+        if base.startswith("~$") or not base.lower().endswith(".docx"): return
+        stem, ext = os.path.splitext(base)
+        count = seen.get(base.lower(), 0)
+        seen[base.lower()] = count + 1
+        inputs.append((f"{stem} ({count + 1}){ext}" if count else base, data))
+
+    for name, data in files:
+        if name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(BytesIO(data)) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or info.filename.startswith("__MACOSX/"): continue
+                        add(info.filename, zf.read(info))
+            except (zipfile.BadZipFile, OSError) as e:
+                errors.append((name, f"ZIP ilegible: {e}"))
+        else:
+            add(name, data)
+    return inputs, errors
+
+
+def run_batch(name, inputs, options, workers=None, on_file=None, metrics=None):
+    """Procesa [(nombre, bytes)] con el pipeline `name` en paralelo y devuelve (zip, resultados).
+
+    `on_file(done, total, resultado)` se invoca en el hilo que llama al terminar cada
+    archivo; `resultado` es la tupla de `process_bytes`. Un fallo solo afecta a su archivo:
+    queda anotado en `informe_lote.txt` dentro del ZIP. Se usa "spawn" porque el proceso
+    de Streamlit tiene hilos vivos y hacer fork con ellos no es seguro.
+    """
+    total = len(inputs)
+    results = []
+    archive = BytesIO()
+    workers = max(1, min(workers or os.cpu_count() or 1, total or 1))
+    ctx = multiprocessing.get_context("spawn")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        if inputs:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = {pool.submit(process_bytes, name, filename, data, options): filename
+                           for filename, data in inputs}
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # El proceso hijo murió (memoria, señal...): se anota y se sigue
+                        result = (futures[future], None, None, f"{type(e).__name__}: {e}", 0.0)
+                    filename, out_name, data, error, seconds = result
+                    # Solo los metadatos quedan en memoria; los bytes van directos al ZIP
+                    results.append((filename, out_name, error, seconds))
+                    if data is not None: zf.writestr(out_name, data)
+                    if metrics is not None:
+                        metrics.add_time("files", seconds)
+                        metrics.incr("files_failed" if error else "files_ok")
+                    if on_file: on_file(done, total, result)
+        results.sort()
+        zf.writestr(REPORT_NAME, "\n".join(
+            f"{'ERROR' if error else 'OK'}\t{filename}\t{out_name or error}\t{seconds:.1f}s"
+            for filename, out_name, error, seconds in results) + "\n")
+    return archive.getvalue(), results
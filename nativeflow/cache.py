@@ -0,0 +1,104 @@
+"""Caché persistente (SQLite) de respuestas del modelo, direccionada por contenido."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("NATIVEFLOW_CACHE_DIR", ".nativeflow_cache")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# Cada cuántas escrituras se caducan entradas y se recalcula el tamaño total (otros procesos
+# comparten el archivo); entre medias el total se lleva a mano
+MAINTENANCE_EVERY = 256
+
+
+def cache_key(model_name, temp, safety_settings, prompt):
+    payload = json.dumps([model_name, temp, safety_settings, prompt], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Caché LRU en disco con expiración por edad y límite de tamaño total.
+
+    Cada `put` es O(log n): el tamaño total se lleva en memoria y solo se recorre la tabla
+    (por índice) para borrar lo que sobra.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path or os.path.join(CACHE_DIR, "responses.sqlite")
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_created ON responses(created)")
+        self.conn.commit()
+        self.puts = 0
+        self.total = self._sum()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (not self.max_age or now - row[1] <= self.max_age):
+                self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self.total += size - (old[0] if old else 0)
+            self.puts += 1
+            if self.puts % MAINTENANCE_EVERY == 0:
+                if self.max_age:
+                    self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+                self.total = self._sum()
+            self._evict()
+            self.conn.commit()
+
+    def _sum(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        # Borramos las menos usadas recientemente (por índice, de pocas en pocas) hasta volver al límite
+        while self.max_bytes and self.total > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                self.total = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total -= size
+                if self.total <= self.max_bytes: return
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.hits = self.misses = self.total = 0
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
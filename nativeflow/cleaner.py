@@ -0,0 +1,12 @@
+"""Módulo 4: limpiador 'nuclear' de saltos y espacios."""
+from .docx_tools import load_docx, save_docx
+from .metrics import timed
+from .text import nuclear_clean
+
+
+def nuclear_clean_docx(data, metrics=None, doc_cache=None):
+    doc = load_docx(data, metrics, doc_cache)
+    with timed(metrics, "clean"):
+        for p in doc.paragraphs:
+            if p.text: p.text = nuclear_clean(p.text)
+    return save_docx(doc, metrics)
@@ -0,0 +1,98 @@
+"""Línea de comandos: aplica un pipeline a todos los .docx de un directorio.
+
+Ejemplo:
+    python -m nativeflow kdp manuscritos/ salida/ --size "5 x 8 pulgadas" --workers 8
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .layout import PAGE_SIZES, THEMES
+from .pipelines import PIPELINES, process_file
+from .workbook import DEFAULT_CTA
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="nativeflow", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pipeline", choices=sorted(PIPELINES))
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Procesos en paralelo (por defecto, núcleos disponibles)")
+    parser.add_argument("--metrics-dir", help="Exporta métricas por archivo (JSON + Prometheus)")
+
+    kdp = parser.add_argument_group("kdp")
+    kdp.add_argument("--size", choices=list(PAGE_SIZES), default="6 x 9 pulgadas")
+    kdp.add_argument("--theme", choices=list(THEMES), default="Neutro (Estándar)")
+    for flag, help_text in [("mirror", "márgenes espejo"), ("fix-titles", "títulos en hoja nueva"),
+                            ("pro-start", "letra capital"), ("reconstruct", "unir párrafos rotos"),
+                            ("justify-text", "justificar + silabeo"), ("add-numbers", "números de página"),
+                            ("fix-runts", "evitar palabras sueltas")]:
+        kdp.add_argument(f"--no-{flag}", dest=flag.replace("-", "_"), action="store_false",
+                         help=f"Desactiva {help_text}")
+
+    kdp.add_argument("--soft-hyphens", action="store_true",
+                     help="Guiones suaves de pyphen en el cuerpo (kdp y epub), en el idioma de --lang")
+
+    wb = parser.add_argument_group("workbook")
+    wb.add_argument("--cta", default=DEFAULT_CTA)
+
+    ep = parser.add_argument_group("epub")
+    ep.add_argument("--title", help="Por defecto, el nombre del archivo")
+    ep.add_argument("--author", default="Autor")
+    ep.add_argument("--lang", help="Por defecto, es (epub) o el idioma del manuscrito (guiones suaves de kdp)")
+    ep.add_argument("--dropcap-size", type=float, default=1.6)
+    ep.add_argument("--image-max-width", type=int, help="Reduce las imágenes más anchas (píxeles)")
+    return parser
+
+
+def pipeline_options(args):
+    if args.pipeline == "kdp":
+        return {"size": args.size, "theme_name": args.theme, "mirror": args.mirror,
+                "fix_titles": args.fix_titles, "pro_start": args.pro_start,
+                "reconstruct": args.reconstruct, "justify_text": args.justify_text,
+                "add_numbers": args.add_numbers, "fix_runts": args.fix_runts,
+                "soft_hyphens": args.soft_hyphens, "lang": args.lang}
+    if args.pipeline == "workbook":
+        return {"cta_text": args.cta}
+    if args.pipeline == "epub":
+        return {"title": args.title, "author": args.author, "lang": args.lang or "es",
+                "dropcap_size": args.dropcap_size, "image_max_width": args.image_max_width,
+                "soft_hyphens": args.soft_hyphens}
+    return {}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    files = sorted(f for f in glob.glob(os.path.join(args.input_dir, "*.docx"))
+                   if not os.path.basename(f).startswith("~$"))
+    if not files:
+        print(f"No hay archivos .docx en {args.input_dir}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = pipeline_options(args)
+
+    t0 = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(process_file, args.pipeline, f, args.output_dir, options,
+                               args.metrics_dir) for f in files]
+        for done, future in enumerate(as_completed(futures), 1):
+            src, dst, error, seconds = future.result()
+            name = os.path.basename(src)
+            if error:
+                failures += 1
+                print(f"[{done}/{len(files)}] ❌ {name}: {error}")
+            else:
+                print(f"[{done}/{len(files)}] ✅ {name} -> {dst} ({seconds:.1f}s)")
+
+    print(f"{len(files) - failures}/{len(files)} archivos en {time.perf_counter() - t0:.1f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
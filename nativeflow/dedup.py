@@ -0,0 +1,44 @@
+"""Textos repetidos (cartas "Querido ___", instrucciones, estribillos, CTA): una sola petición
+al modelo por texto único y el resultado se reparte a cada aparición."""
+from .fingerprints import normalize_paragraph
+
+
+def dedup_key(text):
+    """Clave de agrupación: NFC, espacios colapsados y sin distinguir mayúsculas."""
+    return normalize_paragraph(text).casefold()
+
+
+def group_duplicates(items, key=dedup_key):
+    """Agrupa [(id, texto)] por `key(texto)`.
+
+    Devuelve (únicos [(id, texto)], copias {id representante: [ids]}). El representante es
+    la primera aparición, así los ids enviados son estables entre ejecuciones (diario).
+    """
+    unique, copies, first = [], {}, {}
+    for pid, text in items:
+        k = key(text)
+        if k in first:
+            copies.setdefault(first[k], []).append(pid)
+        else:
+            first[k] = pid
+            unique.append((pid, text))
+    return unique, copies
+
+
+def fan_out(results, copies):
+    """Extiende {id representante: resultado} a todas sus apariciones (sin inventar las que faltan)."""
+    out = dict(results)
+    for rep, pids in copies.items():
+        if rep in results:
+            for pid in pids: out[pid] = results[rep]
+    return out
+
+
+def representatives(copies):
+    """{id copia: id representante}, para que los reportes indiquen de dónde viene cada resultado."""
+    return {pid: rep for rep, pids in copies.items() for pid in pids}
+
+
+def match_case(source, text):
+    """Una aparición entera en mayúsculas recibe el texto reescrito también en mayúsculas."""
+    return text.upper() if source.isupper() and not text.isupper() else text
@@ -0,0 +1,306 @@
+"""Utilidades de python-docx que trabajan directamente sobre el XML del cuerpo."""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement, ns
+from docx.text.paragraph import Paragraph
+
+from .metrics import timed
+
+# Signos que cierran un párrafo: si la línea termina en otro carácter, está "rota"
+SENTENCE_END = ('.', '!', '?', '"', '”', ':')
+
+
+class DocumentCache:
+    """LRU acotado de documentos ya parseados, por hash del contenido subido.
+
+    Cada `load` devuelve una copia profunda (el árbol XML y los objetos de python-docx,
+    compartiendo los blobs inmutables de las imágenes), más barata que volver a abrir el
+    zip y parsear; el original en caché nunca se modifica.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # hash -> (documento, segundos que costó parsearlo)
+        self.lock = threading.Lock()
+        self.parses = 0
+        self.hits = 0
+        self.seconds_saved = 0.0
+
+    def load(self, data, metrics=None):
+        key = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None: self.entries.move_to_end(key)
+        hit = entry is not None
+        if not hit:
+            t0 = time.perf_counter()
+            entry = (Document(BytesIO(data)), time.perf_counter() - t0)
+            with self.lock:
+                self.parses += 1
+                self.entries[key] = entry
+                while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+        doc, parse_seconds = entry
+        t0 = time.perf_counter()
+        clone = copy.deepcopy(doc)
+        saved = parse_seconds - (time.perf_counter() - t0) if hit else 0.0
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.seconds_saved += saved
+        if metrics is not None:
+            metrics.incr("doc_cache_hits" if hit else "doc_parses")
+            if hit: metrics.incr("parse_seconds_saved", round(saved, 4))
+        return clone
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "parses": self.parses, "hits": self.hits,
+                    "seconds_saved": self.seconds_saved}
+
+
+def load_docx(data, metrics=None, cache=None):
+    """Parsea un .docx (bytes); con `cache` (DocumentCache) reutiliza el parseo previo."""
+    with timed(metrics, "parse_docx"):
+        if cache is not None: return cache.load(data, metrics)
+        if metrics is not None: metrics.incr("doc_parses")
+        return Document(BytesIO(data))
+
+
+def save_docx(doc, metrics=None):
+    with timed(metrics, "save_docx"):
+        bio = BytesIO(); doc.save(bio)
+        return bio.getvalue()
+
+
+def create_element(name): return OxmlElement(name)
+def create_attribute(element, name, value): element.set(ns.qn(name), value)
+
+
+def add_page_number(paragraph):
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    page_run = paragraph.add_run()
+    t1 = create_element('w:fldChar'); create_attribute(t1, 'w:fldCharType', 'begin'); page_run._r.append(t1)
+    t2 = create_element('w:instrText'); create_attribute(t2, 'xml:space', 'preserve'); t2.text = "PAGE"; page_run._r.append(t2)
+    t3 = create_element('w:fldChar'); create_attribute(t3, 'w:fldCharType', 'end'); page_run._r.append(t3)
+
+
+def enable_native_hyphenation(doc):
+    settings = doc.settings.element
+    hyphenation_zone = OxmlElement('w:autoHyphenation')
+    create_attribute(hyphenation_zone, 'w:val', 'true')
+    settings.append(hyphenation_zone)
+
+
+# --- Ediciones a nivel de run: tocan solo los w:t afectados y conservan el formato en línea ---
+
+_T = ns.qn('w:t')
+_R = ns.qn('w:r')
+_PPR = ns.qn('w:pPr')
+
+
+def text_nodes(p_elm):
+    """Nodos w:t del párrafo en orden de lectura (también los de hipervínculos)."""
+    return list(p_elm.iter(_T))
+
+
+def _set_text(t, text):
+    t.text = text
+    if text != text.strip(): create_attribute(t, 'xml:space', 'preserve')
+
+
+def strip_text_nodes(nodes, left=True, right=True):
+    """Quita los espacios de los extremos del texto editando solo los w:t de los bordes."""
+    if left:
+        for t in nodes:
+            _set_text(t, (t.text or "").lstrip())
+            if t.text: break
+    if right:
+        for t in reversed(nodes):
+            _set_text(t, (t.text or "").rstrip())
+            if t.text: break
+
+
+def replace_last_space(nodes, char="\u00A0"):
+    """Cambia el último espacio del texto por `char` (por defecto, espacio duro). Devuelve si lo hizo."""
+    texts = [t.text or "" for t in nodes]
+    joined = "".join(texts)
+    pos = joined.rstrip().rfind(' ')
+    if pos < len(joined) - len(joined.lstrip()): return False  # Sin espacios interiores
+    for t, text in zip(nodes, texts):
+        if pos < len(text):
+            _set_text(t, text[:pos] + char + text[pos + 1:])
+            return True
+        pos -= len(text)
+    return False
+
+
+def merge_paragraph_runs(head, others):
+    """Une los párrafos `others` al final de `head` separados por un espacio, moviendo sus runs.
+
+    El texto resultante es el mismo que `" ".join(textos sin espacios en los extremos)`,
+    pero cursivas, negritas e hipervínculos de cada fragmento se conservan.
+    """
+    nodes = text_nodes(head)
+    strip_text_nodes(nodes)
+    for other in others:
+        other_nodes = text_nodes(other)
+        strip_text_nodes(other_nodes)
+        if not nodes:
+            run = create_element('w:r'); run.append(create_element('w:t')); head.append(run)
+            nodes = text_nodes(head)
+        _set_text(nodes[-1], (nodes[-1].text or "") + " ")
+        for child in list(other):
+            if child.tag != _PPR: head.append(child)
+        other.getparent().remove(other)
+        nodes += other_nodes
+
+
+def prepend_break(p_elm):
+    """Inserta un salto de línea (w:br) al principio del párrafo en un run propio."""
+    run = create_element('w:r'); run.append(create_element('w:br'))
+    p_elm.insert(1 if p_elm.find(_PPR) is not None else 0, run)
+
+
+def split_first_char(nodes):
+    """Separa el primer carácter del texto en un run nuevo (copia del formato del suyo) y lo devuelve."""
+    for t in nodes:
+        if not t.text: continue
+        run = t.getparent()
+        if run.tag != _R: return None
+        first = copy.deepcopy(run)
+        for child in list(first):
+            if child.tag != ns.qn('w:rPr'): first.remove(child)
+        t_first = create_element('w:t'); t_first.text = t.text[0]; first.append(t_first)
+        _set_text(t, t.text[1:])
+        run.addprevious(first)
+        return first
+    return None
+
+
+def insert_soft_hyphens(nodes, hyphenate):
+    """Pasa cada w:t por `hyphenate(texto)` y convierte los guiones suaves en w:softHyphen.
+
+    Los trozos quedan dentro del mismo run, así que el formato no cambia. Devuelve
+    cuántos guiones se insertaron.
+    """
+    inserted = 0
+    for t in nodes:
+        parts = hyphenate(t.text or "").split("\u00AD")
+        if len(parts) == 1: continue
+        _set_text(t, parts[0])
+        anchor = t
+        for part in parts[1:]:
+            hyphen = create_element('w:softHyphen')
+            anchor.addnext(hyphen)
+            anchor = create_element('w:t'); _set_text(anchor, part)
+            hyphen.addnext(anchor)
+        inserted += len(parts) - 1
+    return inserted
+
+
+def document_language(doc):
+    """Idioma del manuscrito (p. ej. "es-ES"): el del estilo Normal o el predeterminado; None si no consta."""
+    lang = ns.qn('w:lang')
+    styles = doc.styles.element
+    for rpr in (styles.find(f"{ns.qn('w:style')}[@{ns.qn('w:styleId')}='Normal']/{ns.qn('w:rPr')}"),
+                styles.find(f"{ns.qn('w:docDefaults')}/{ns.qn('w:rPrDefault')}/{ns.qn('w:rPr')}")):
+        node = rpr.find(lang) if rpr is not None else None
+        if node is not None and node.get(ns.qn('w:val')): return node.get(ns.qn('w:val'))
+    return None
+
+
+def _element(paragraph):
+    return getattr(paragraph, "_p", paragraph)
+
+
+class EditBuffer:
+    """Cola de ediciones (borrados, reemplazos de texto, fusiones) aplicada de una sola vez.
+
+    Las ediciones se registran contra los elementos w:p, no contra índices, así que se
+    pueden encolar en cualquier orden sin volver a leer `doc.paragraphs` entre medias.
+    Acepta tanto objetos Paragraph como elementos w:p.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.deletions = {}
+        self.replacements = {}
+
+    def delete(self, paragraph):
+        p = _element(paragraph)
+        self.deletions[p] = None
+
+    def replace_text(self, paragraph, text):
+        self.replacements[_element(paragraph)] = text
+
+    def merge(self, paragraphs, text):
+        """Deja `text` en el primer párrafo y elimina el resto."""
+        paragraphs = list(paragraphs)
+        if not paragraphs: return
+        self.replace_text(paragraphs[0], text)
+        for p in paragraphs[1:]: self.delete(p)
+
+    def __len__(self):
+        return len(self.deletions) + len(self.replacements)
+
+    def apply(self):
+        """Aplica todas las ediciones pendientes; un borrado gana a un reemplazo."""
+        body = self.doc._body
+        for p, text in self.replacements.items():
+            if p not in self.deletions: Paragraph(p, body).text = text
+        for p in self.deletions:
+            parent = p.getparent()
+            if parent is not None: parent.remove(p)
+        applied = len(self)
+        self.deletions, self.replacements = {}, {}
+        return applied
+
+
+def style_name_resolver(doc):
+    """Devuelve una función w:p -> nombre de estilo con caché por styleId."""
+    names = {}
+    body = doc._body
+
+    def style_name(p_elm):
+        sid = p_elm.style
+        if sid not in names:
+            names[sid] = Paragraph(p_elm, body).style.name
+        return names[sid]
+
+    return style_name
+
+
+def stitch_paragraphs(doc):
+    """Une las líneas rotas del manuscrito en una sola pasada sobre los w:p del cuerpo.
+
+    Mismo resultado que recorrer hacia atrás uniendo cada párrafo con el siguiente cuando
+    ambos tienen texto, ninguno es un título y el actual no termina en SENTENCE_END.
+    """
+    style_name = style_name_resolver(doc)
+    edits = EditBuffer(doc)
+    p_elms = list(doc.element.body.p_lst)
+    texts = [p.text.strip() for p in p_elms]
+    is_heading = [style_name(p).startswith('Heading') for p in p_elms]
+
+    def joins_next(i):
+        return (texts[i] and texts[i + 1] and not is_heading[i] and not is_heading[i + 1]
+                and texts[i][-1] not in SENTENCE_END)
+
+    i, n = 0, len(p_elms)
+    while i < n - 1:
+        if not joins_next(i):
+            i += 1
+            continue
+        # Cadena i..j de párrafos que acaban fusionados en el primero
+        j = i + 1
+        while j < n - 1 and joins_next(j): j += 1
+        edits.merge(p_elms[i:j + 1], " ".join(texts[i:j + 1]))
+        i = j + 1
+    edits.apply()
@@ -0,0 +1,348 @@
+"""Módulo 5: conversión de .docx a EPUB con letra capital en línea.
+
+La conversión va por etapas (docx limpio -> HTML de mammoth -> capítulos XHTML ->
+contenedor EPUB) para que `EpubBuildCache` pueda reutilizar cada producto intermedio
+cuando solo cambia un ajuste posterior. Las imágenes van como archivos aparte del EPUB
+(`ImageStore`), no como data URIs en base64 dentro del HTML.
+"""
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from io import BytesIO
+
+import mammoth
+from bs4 import BeautifulSoup
+from ebooklib import epub
+
+from .docx_tools import EditBuffer, load_docx
+from .hyphenate import hyphenator_for
+from .metrics import timed
+
+STYLE_MAP = "p[style-name^='Heading'] => h1:fresh\np[style-name^='Título'] => h1:fresh"
+
+CSS = """<style>
+            h1 { margin-top: 2em; text-align: center; color: black; margin-bottom: 1em; }
+            p { text-align: justify; text-indent: 1em; line-height: 1.5em; margin-top: 0; }
+        </style>"""
+
+PAGE_BREAK = '<div style="page-break-before:always;"></div>'
+
+DROPCAP_STYLE = "float: left; font-size: {size}em; font-weight: bold; line-height: 0.8; margin-right: 0.12em; margin-top: 0.05em; color: black;"
+# Marcador que ocupa el estilo de la letra capital en los capítulos cacheados
+DROPCAP_SLOT = "@@NATIVEFLOW_DROPCAP@@"
+
+
+IMAGE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/bmp": ".bmp",
+                    "image/tiff": ".tif", "image/svg+xml": ".svg", "image/x-emf": ".emf", "image/x-wmf": ".wmf"}
+# Formatos que Pillow puede reducir; el resto se copia tal cual
+# Tipo -> formato de salida. Los GIF se copian tal cual (se perdería la animación); BMP y TIFF,
+# que no son tipos básicos de EPUB, pasan a PNG
+RESIZABLE = {"image/jpeg": "JPEG", "image/png": "PNG", "image/bmp": "PNG", "image/tiff": "PNG"}
+
+
+def dropcap_style(size):
+    return DROPCAP_STYLE.format(size=size)
+
+
+def preclean_docx(data, metrics=None, doc_cache=None):
+    """Quita saltos de línea de los títulos y los párrafos vacíos que los siguen."""
+    doc_temp = load_docx(data, metrics, doc_cache)
+    edits = EditBuffer(doc_temp)
+    paras = doc_temp.paragraphs
+    is_heading = [p.style.name.startswith('Heading') for p in paras]
+    texts = []
+    for p, heading in zip(paras, is_heading):
+        text = p.text
+        if heading:
+            text = text.replace('\n', '').strip()
+            edits.replace_text(p, text)
+        texts.append(text)
+
+    # Párrafos vacíos justo después de un título
+    for i in range(len(paras) - 1):
+        if is_heading[i] and not texts[i+1].strip():
+            edits.delete(paras[i+1])
+    edits.apply()
+
+    with timed(metrics, "save_docx"):
+        buf = BytesIO(); doc_temp.save(buf); buf.seek(0)
+    return buf
+
+
+def inject_dropcaps(soup, inline_style):
+    for h1 in soup.find_all('h1'):
+        next_p = h1.find_next_sibling()
+        while next_p and (next_p.name != 'p' or not next_p.get_text().strip()):
+            next_p = next_p.find_next_sibling()
+
+        if next_p and next_p.name == 'p':
+            text = next_p.get_text()
+            if len(text) > 1:
+                first_char = text[0]
+                rest = text[1:]
+                new_html = f'<span style="{inline_style}">{first_char}</span>{rest}'
+                new_tag = BeautifulSoup(new_html, 'html.parser')
+                next_p.clear()
+                next_p.append(new_tag)
+
+
+SKIP_HYPHENATION = {"h1", "h2", "h3", "h4", "h5", "h6", "style", "script", "title"}
+
+
+def hyphenate_soup(soup, hyphenator):
+    """Guiones suaves en los nodos de texto del cuerpo (no en títulos); devuelve cuántos cambió."""
+    changed = 0
+    for node in soup.find_all(string=True):
+        if node.parent is None or node.parent.name in SKIP_HYPHENATION: continue
+        text = hyphenator.text(str(node))
+        if text != node:
+            node.replace_with(text)
+            changed += 1
+    return changed
+
+
+def split_chapters(soup):
+    """Parte el HTML en capítulos por cada h1 en una sola pasada.
+
+    Devuelve una lista de dicts {title, file_name, content, hash}. Cada capítulo se
+    acumula en una lista de fragmentos y se cierra en cuanto aparece el siguiente h1.
+    Los capítulos sin contenido (h1 seguidos) se omiten.
+    """
+    content = soup.body if soup.body else soup
+    chapters = []
+
+    def emit(title, file_name, parts):
+        xhtml = "".join(parts)
+        chapters.append({"title": title, "file_name": file_name, "content": xhtml,
+                         "hash": hashlib.sha256(xhtml.encode("utf-8")).hexdigest()})
+
+    if content.find('h1') is None:
+        emit("Inicio", "chap_1.xhtml", [CSS, str(content)])
+        return chapters
+
+    def close(title, parts):
+        count = len(chapters) + 1
+        page_break = PAGE_BREAK if count > 1 else ""
+        emit(title, f"c_{count}.xhtml", [CSS, page_break, f"<h1>{title}</h1>", *parts])
+
+    title, parts, has_text = "Inicio", [], False
+    for elem in content.children:
+        if elem.name == 'h1':
+            if has_text: close(title, parts)
+            title, parts, has_text = elem.get_text(), [], False
+        else:
+            html = str(elem)
+            parts.append(html)
+            has_text = has_text or bool(html.strip())
+    if has_text: close(title, parts)
+    return chapters
+
+
+def shrink_image(data, media_type, max_width, quality=85):
+    """Reduce la imagen a `max_width` píxeles de ancho y la recomprime.
+
+    Devuelve (bytes, tipo). Si Pillow no está instalado, el formato no se puede reducir, la
+    imagen está animada o no se puede abrir, devuelve el original. Si no hace falta
+    reducirla, la recompresión solo se queda cuando ocupa menos.
+    """
+    fmt = RESIZABLE.get(media_type)
+    if fmt is None: return data, media_type
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, media_type
+    try:
+        with Image.open(BytesIO(data)) as im:
+            if getattr(im, "n_frames", 1) > 1: return data, media_type    # PNG animado (APNG)
+            resized = im.width > max_width
+            if resized: im = im.resize((max_width, max(1, round(im.height * max_width / im.width))), Image.LANCZOS)
+            if fmt == "JPEG" and im.mode not in ("RGB", "L"): im = im.convert("RGB")
+            out = BytesIO()
+            im.save(out, fmt, **({"quality": quality, "optimize": True} if fmt == "JPEG" else {"optimize": True}))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return data, media_type
+    new_type = "image/jpeg" if fmt == "JPEG" else "image/png"
+    if not resized and out.tell() >= len(data): return data, media_type
+    return out.getvalue(), new_type
+
+
+class ImageStore:
+    """Imágenes del libro como archivos del EPUB, una por contenido (hash del original).
+
+    Se pasa a mammoth como `convert_image`: el HTML solo lleva la ruta `images/...` y las
+    repetidas apuntan al mismo archivo. Con `max_width` cada imagen única se reduce y
+    recomprime una vez.
+    """
+
+    def __init__(self, max_width=None, quality=85):
+        self.max_width = max_width
+        self.quality = quality
+        self.files = OrderedDict()  # hash -> (ruta, tipo, bytes)
+        self.duplicates = 0
+        self.bytes_in = self.bytes_out = 0
+        self.seconds = 0.0
+
+    def convert(self, image):
+        with image.open() as fh:
+            data = fh.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.files:
+            self.duplicates += 1
+        else:
+            t0 = time.perf_counter()
+            content, media_type = data, image.content_type
+            if self.max_width: content, media_type = shrink_image(data, media_type, self.max_width, self.quality)
+            name = f"images/img_{digest[:16]}{IMAGE_EXTENSIONS.get(media_type, '.bin')}"
+            self.files[digest] = (name, media_type, content)
+            self.bytes_in += len(data); self.bytes_out += len(content)
+            self.seconds += time.perf_counter() - t0
+        return {"src": self.files[digest][0]}
+
+    def record(self, metrics):
+        if metrics is None: return
+        metrics.incr("images", len(self.files))
+        metrics.incr("image_duplicates", self.duplicates)
+        metrics.incr("image_bytes_in", self.bytes_in)
+        metrics.incr("image_bytes_out", self.bytes_out)
+        metrics.add_time("images", self.seconds)
+
+
+def docx_to_html(data, metrics=None, doc_cache=None, images=None):
+    """Limpieza previa + mammoth: devuelve el HTML.
+
+    Con `images` (ImageStore) las imágenes se guardan aparte; sin él, mammoth las
+    incrusta como data URIs.
+    """
+    with timed(metrics, "preclean"):
+        buf = preclean_docx(data, metrics, doc_cache)
+    options = {"convert_image": mammoth.images.img_element(images.convert)} if images is not None else {}
+    with timed(metrics, "mammoth"):
+        html = mammoth.convert_to_html(buf, style_map=STYLE_MAP, **options).value
+    buf.close()
+    if images is not None: images.record(metrics)
+    return html
+
+
+def html_to_chapters(html, metrics=None, hyphenator=None):
+    """Capítulos con el marcador DROPCAP_SLOT en lugar del estilo de la letra capital.
+
+    Con `hyphenator` (hyphenate.Hyphenator) el texto lleva guiones suaves para justificar.
+    """
+    with timed(metrics, "html_parse"):
+        soup = BeautifulSoup(html, 'html.parser')
+    with timed(metrics, "dropcaps"):
+        inject_dropcaps(soup, DROPCAP_SLOT)
+    if hyphenator is not None:
+        before = hyphenator.stats()
+        with timed(metrics, "soft_hyphens"):
+            nodes = hyphenate_soup(soup, hyphenator)
+        if metrics is not None: metrics.incr("hyphenated_text_nodes", nodes)
+        hyphenator.record(metrics, before)
+    with timed(metrics, "chapters"):
+        chapters = split_chapters(soup)
+    soup.decompose()
+    return chapters
+
+
+def render_chapter(chapter, dropcap_size):
+    return chapter["content"].replace(DROPCAP_SLOT, dropcap_style(dropcap_size))
+
+
+def package_epub(chapters, title, author, lang, dropcap_size, metrics=None, rendered=None, images=None):
+    """Empaqueta los capítulos (y las imágenes de `images`, un ImageStore) en un EPUB (bytes).
+
+    `rendered` es un dict opcional (hash, tamaño) -> XHTML para reutilizar capítulos ya
+    resueltos con esa letra capital.
+    """
+    book = epub.EpubBook()
+    book.set_identifier(str(uuid.uuid4()))
+    book.set_title(title); book.set_language(lang); book.add_author(author)
+
+    items = []
+    with timed(metrics, "render_chapters"):
+        for chapter in chapters:
+            key = (chapter["hash"], dropcap_size)
+            if rendered is not None and key in rendered:
+                xhtml = rendered[key]
+            else:
+                xhtml = render_chapter(chapter, dropcap_size)
+                if rendered is not None: rendered[key] = xhtml
+            c = epub.EpubHtml(title=chapter["title"], file_name=chapter["file_name"], lang=lang)
+            c.content = xhtml
+            book.add_item(c); items.append(c)
+
+    for i, (name, media_type, content) in enumerate(images.files.values() if images is not None else ()):
+        book.add_item(epub.EpubImage(uid=f"img_{i + 1}", file_name=name, media_type=media_type, content=content))
+
+    book.toc = tuple(items)
+    book.add_item(epub.EpubNcx()); book.add_item(epub.EpubNav())
+    book.spine = ['nav'] + items
+
+    with timed(metrics, "epub_write"):
+        bio_ep = BytesIO(); epub.write_epub(bio_ep, book, {})
+    return bio_ep.getvalue()
+
+
+class EpubBuildCache:
+    """Productos intermedios por hash de subida (LRU acotado) para reconstrucciones parciales.
+
+    - HTML de mammoth (del docx ya limpio) e imágenes: solo dependen del archivo.
+    - capítulos XHTML: dependen del HTML y del idioma de los guiones suaves; la letra
+      capital va como marcador.
+    - XHTML resuelto por (hash de capítulo, tamaño de letra capital).
+    Cambiar la letra capital solo reescribe los estilos de los capítulos; cambiar título,
+    autor o idioma solo vuelve a empaquetar.
+    """
+
+    def __init__(self, max_files=4, max_rendered=256):
+        self.max_files = max_files
+        self.max_rendered = max_rendered
+        self.files = OrderedDict()
+        self.rendered = OrderedDict()
+
+    def entry(self, file_hash):
+        if file_hash in self.files:
+            self.files.move_to_end(file_hash)
+        else:
+            self.files[file_hash] = {}
+            while len(self.files) > self.max_files: self.files.popitem(last=False)
+        return self.files[file_hash]
+
+    def trim(self):
+        while len(self.rendered) > self.max_rendered: self.rendered.popitem(last=False)
+
+
+def docx_to_epub(data, title="Mi Libro", author="Autor", lang="es", dropcap_size=1.6,
+                 metrics=None, cache=None, doc_cache=None, image_max_width=None, image_quality=85,
+                 soft_hyphens=False):
+    """Convierte un .docx (bytes) en un EPUB (bytes); con `cache` reutiliza etapas previas.
+
+    Con `image_max_width` (píxeles) las imágenes más anchas se reducen y todas se recomprimen.
+    Con `soft_hyphens` el texto lleva guiones suaves de pyphen en el idioma `lang`.
+    """
+    hyphenator = hyphenator_for(lang) if soft_hyphens else None
+    if cache is None:
+        images = ImageStore(image_max_width, image_quality)
+        html = docx_to_html(data, metrics, doc_cache, images)
+        chapters = html_to_chapters(html, metrics, hyphenator)
+        del html
+        return package_epub(chapters, title, author, lang, dropcap_size, metrics, images=images)
+
+    # Las imágenes reducidas dependen del ancho y la calidad: cuentan como otra conversión
+    entry = cache.entry(f"{hashlib.sha256(data).hexdigest()}:{image_max_width}:{image_quality}")
+    if "html" not in entry:
+        entry["images"] = ImageStore(image_max_width, image_quality)
+        entry["html"] = docx_to_html(data, metrics, doc_cache, entry["images"])
+    elif metrics is not None: metrics.incr("reused_html")
+    key = ("chapters", hyphenator.lang if hyphenator is not None else None)
+    if key not in entry:
+        entry[key] = html_to_chapters(entry["html"], metrics, hyphenator)
+    elif metrics is not None: metrics.incr("reused_chapters")
+    chapters = entry[key]
+    if metrics is not None:
+        hits = sum((c["hash"], dropcap_size) in cache.rendered for c in chapters)
+        metrics.incr("reused_rendered_chapters", hits)
+    result = package_epub(chapters, title, author, lang, dropcap_size, metrics, cache.rendered, entry["images"])
+    cache.trim()
+    return result
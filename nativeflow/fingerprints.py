@@ -0,0 +1,111 @@
+"""Huellas de párrafo para re-auditar solo lo que cambió entre versiones de un manuscrito."""
+import json
+import os
+import re
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+
+from .cache import CACHE_DIR
+from .journal import content_hash
+
+FINGERPRINT_DIR = os.path.join(CACHE_DIR, "fingerprints")
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_paragraph(text):
+    """Forma canónica: Unicode NFC y espacios colapsados (el resto del texto cuenta como cambio)."""
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def paragraph_hash(text):
+    return content_hash(normalize_paragraph(text))[:32]
+
+
+def diff_versions(old, new):
+    """Compara dos listas [(número, hash)] en orden.
+
+    Devuelve (resumen, previos) donde `previos` es {número nuevo: número anterior} de los
+    párrafos que no cambiaron y el resumen cuenta unchanged/changed/added/removed.
+    """
+    matcher = SequenceMatcher(None, [h for _, h in old], [h for _, h in new], autojunk=False)
+    summary = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0}
+    previous = {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            summary["unchanged"] += i2 - i1
+            for k in range(i2 - i1): previous[new[j1 + k][0]] = old[i1 + k][0]
+        elif tag == "replace":
+            paired = min(i2 - i1, j2 - j1)
+            summary["changed"] += paired
+            summary["added"] += (j2 - j1) - paired
+            summary["removed"] += (i2 - i1) - paired
+        elif tag == "insert":
+            summary["added"] += j2 - j1
+        else:
+            summary["removed"] += i2 - i1
+    return summary, previous
+
+
+class FingerprintStore:
+    """Veredictos de auditoría por hash de párrafo normalizado, persistidos en JSON.
+
+    Los veredictos dependen solo del texto y de los ajustes (prompt): cambiar el prompt los
+    invalida, y cualquier manuscrito auditado con los mismos ajustes los reutiliza. Con
+    `manuscript` (p. ej. el nombre del archivo, estable entre versiones) guarda además la
+    lista [(número, hash)] de la última versión auditada, solo para resumir qué cambió en la
+    siguiente.
+    """
+
+    def __init__(self, settings="", manuscript=None, directory=None):
+        directory = directory or FINGERPRINT_DIR
+        os.makedirs(directory, exist_ok=True)
+        tag = content_hash(settings)[:8]
+        self.path = os.path.join(directory, f"verdicts_{tag}.json")
+        self.versions_path = (os.path.join(directory, f"{content_hash(manuscript)[:16]}_{tag}.json")
+                              if manuscript is not None else None)
+        self.lock = threading.Lock()
+        self.verdicts = _load(self.path).get("verdicts", {})
+        self.paragraphs = [tuple(p) for p in _load(self.versions_path).get("paragraphs", [])]
+
+    def __contains__(self, digest):
+        return digest in self.verdicts
+
+    def get(self, digest):
+        return self.verdicts.get(digest)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    def update(self, paragraphs, verdicts):
+        """Guarda la nueva versión [(número, hash)] y sus veredictos {hash: veredicto}."""
+        with self.lock:
+            # Otros trabajos pueden haber guardado veredictos con los mismos ajustes entretanto
+            self.verdicts = {**_load(self.path).get("verdicts", {}), **self.verdicts}
+            self.verdicts.update({h: v for h, v in verdicts.items() if "[ERROR" not in v})
+            _save(self.path, {"verdicts": self.verdicts})
+            self.paragraphs = list(paragraphs)
+            if self.versions_path is not None: _save(self.versions_path, {"paragraphs": self.paragraphs})
+
+    def discard(self):
+        with self.lock:
+            for path in (self.path, self.versions_path):
+                if path is not None and os.path.exists(path): os.remove(path)
+            self.verdicts, self.paragraphs = {}, []
+
+
+def _load(path):
+    if path is None or not os.path.exists(path): return {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (ValueError, OSError):
+        return {}  # Archivo dañado: se empieza de cero
+
+
+def _save(path, state):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, ensure_ascii=False)
+    os.replace(tmp, path)
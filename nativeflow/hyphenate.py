@@ -0,0 +1,66 @@
+"""Guiones suaves por idioma (pyphen) para el texto justificado en papel y en EPUB.
+
+El vocabulario de un libro se repite mucho: cada palabra se divide una vez y el resultado
+queda en un LRU acotado por palabra. `hyphenator_for` comparte un divisor por idioma
+en todo el proceso, así las pasadas siguientes llegan con la caché caliente.
+"""
+import functools
+import re
+
+import pyphen
+
+SOFT_HYPHEN = "\u00AD"
+MIN_WORD = 6            # Palabras más cortas no se dividen
+MAX_WORDS = 50000       # Palabras distintas en caché por idioma
+
+# Solo letras: números, siglas con dígitos y palabras ya compuestas con guion se tratan por partes
+WORD_PATTERN = re.compile(r"[^\W\d_]{%d,}" % MIN_WORD)
+
+
+def resolve_language(lang):
+    """Código de idioma ("es", "es-ES", "en_US"...) -> diccionario de pyphen disponible, o None."""
+    return pyphen.language_fallback((lang or "").replace("-", "_")) if lang else None
+
+
+class Hyphenator:
+    """Inserta guiones suaves en las palabras de un texto, memorizando cada palabra."""
+
+    def __init__(self, lang, max_words=MAX_WORDS):
+        self.lang = resolve_language(lang)
+        if self.lang is None: raise ValueError(f"pyphen no tiene diccionario para '{lang}'")
+        # Diccionario propio (cache=False): el compartido de pyphen memoriza cada palabra sin límite
+        self.dic = pyphen.Pyphen(lang=self.lang, cache=False)
+        self.max_words = max_words
+        self.word = functools.lru_cache(maxsize=max_words)(self._split_word)
+
+    def _split_word(self, word):
+        points = getattr(self.dic.hd, "cache", None)
+        if points is not None and len(points) > self.max_words: points.clear()
+        return self.dic.inserted(word, hyphen=SOFT_HYPHEN)
+
+    def text(self, text):
+        """Devuelve `text` con guiones suaves; el texto que ya los tiene se deja igual."""
+        if SOFT_HYPHEN in text: return text
+        return WORD_PATTERN.sub(lambda m: self.word(m.group()), text)
+
+    def stats(self):
+        info = self.word.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "words": info.currsize}
+
+    def record(self, metrics, before):
+        """Anota en `metrics` los aciertos y fallos de caché desde `before` (un `stats()` previo)."""
+        if metrics is None: return
+        after = self.stats()
+        metrics.incr("hyphen_cache_hits", after["hits"] - before["hits"])
+        metrics.incr("hyphen_cache_misses", after["misses"] - before["misses"])
+
+
+def hyphenator_for(lang):
+    """Divisor compartido por idioma ("es" y "es-ES" comparten); None si pyphen no tiene ese idioma."""
+    resolved = resolve_language(lang)
+    return _shared(resolved) if resolved else None
+
+
+@functools.lru_cache(maxsize=None)
+def _shared(lang):
+    return Hyphenator(lang)
@@ -0,0 +1,236 @@
+"""Cola de trabajos de IA compartida por todas las sesiones (SQLite + archivos en disco).
+
+Los trabajos (auditoría, reescritura, adaptación) se encolan desde la interfaz y los
+ejecutan procesos trabajadores (worker.py) fuera del hilo de Streamlit: cerrar la
+pestaña no los detiene. El reparto es justo entre usuarios y la cuota RPM/TPM es global
+para todos los procesos.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from .cache import CACHE_DIR
+from .llm import DEFAULT_RPM, DEFAULT_TPM
+
+QUEUE_DIR = os.path.join(CACHE_DIR, "queue")
+
+UPLOADING, QUEUED, RUNNING = "subiendo", "en cola", "en curso"
+DONE, FAILED, CANCELLED = "terminado", "fallido", "cancelado"
+FINISHED = (DONE, FAILED, CANCELLED)
+STALE_SECONDS = 120     # Sin latido durante este tiempo, el trabajo vuelve a la cola (el diario conserva lo hecho)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT NOT NULL, kind TEXT NOT NULL, filename TEXT NOT NULL,
+    options TEXT NOT NULL, status TEXT NOT NULL, done INTEGER DEFAULT 0, total INTEGER DEFAULT 0,
+    phase TEXT DEFAULT '', created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL,
+    worker TEXT, cancel INTEGER DEFAULT 0, error TEXT, stats TEXT, output_name TEXT);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, user);
+CREATE TABLE IF NOT EXISTS budget (
+    name TEXT PRIMARY KEY, rate REAL NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL);
+"""
+
+
+def _connect(path):
+    # Autocommit: las transacciones se abren a mano con BEGIN IMMEDIATE (seguro entre procesos)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class JobQueue:
+    """Trabajos en SQLite; la entrada y la salida de cada uno viven en `directory/<id>/`."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or QUEUE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, "queue.sqlite")
+        self.lock = threading.Lock()
+        self.conn = _connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.directory, str(job_id))
+
+    def _update(self, sql, args):
+        with self.lock:
+            return self.conn.execute(sql, args).rowcount
+
+    def submit(self, user, kind, filename, data, options):
+        """Encola un trabajo y devuelve su id; `options` debe ser serializable a JSON."""
+        with self.lock:
+            job_id = self.conn.execute(
+                "INSERT INTO jobs (user, kind, filename, options, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (user, kind, filename, json.dumps(options, ensure_ascii=False), UPLOADING, time.time())).lastrowid
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        with open(os.path.join(self._job_dir(job_id), "input.docx"), "wb") as fh:
+            fh.write(data)
+        # Solo se publica cuando la entrada ya está en disco
+        self._update("UPDATE jobs SET status = ? WHERE id = ?", (QUEUED, job_id))
+        return job_id
+
+    def claim(self, worker):
+        """Toma el siguiente trabajo con reparto justo entre usuarios, o None si no hay.
+
+        Primero el usuario con menos trabajos en curso; a igualdad, el que lleva más tiempo
+        sin que se le asigne uno (turno rotatorio). Dentro de cada usuario, por orden de llegada.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT j.id FROM jobs j WHERE j.status = ? ORDER BY "
+                    "(SELECT COUNT(*) FROM jobs r WHERE r.user = j.user AND r.status = ?), "
+                    "(SELECT COALESCE(MAX(s.started), 0) FROM jobs s WHERE s.user = j.user), j.id LIMIT 1",
+                    (QUEUED, RUNNING)).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self.conn.execute("UPDATE jobs SET status = ?, started = ?, heartbeat = ?, worker = ? WHERE id = ?",
+                                  (RUNNING, now, now, worker, row["id"]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def _as_dict(self, row):
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["stats"] = json.loads(job["stats"]) if job["stats"] else {}
+        return job
+
+    def input_data(self, job_id):
+        with open(os.path.join(self._job_dir(job_id), "input.docx"), "rb") as fh:
+            return fh.read()
+
+    def output_data(self, job_id):
+        job = self.get(job_id)
+        if not job or not job["output_name"]: return None
+        path = os.path.join(self._job_dir(job_id), job["output_name"])
+        if not os.path.exists(path): return None
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def progress(self, job_id, done, total, phase=""):
+        """Anota el avance y renueva el latido; devuelve True si se pidió cancelar."""
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET done = ?, total = ?, phase = ?, heartbeat = ? WHERE id = ?",
+                              (done, total, phase, time.time(), job_id))
+            row = self.conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel"])
+
+    def finish(self, job_id, output_name=None, data=None, error=None, stats=None, cancelled=False):
+        if data is not None:
+            with open(os.path.join(self._job_dir(job_id), output_name), "wb") as fh:
+                fh.write(data)
+        status = FAILED if error else CANCELLED if cancelled else DONE
+        self._update("UPDATE jobs SET status = ?, finished = ?, error = ?, stats = ?, output_name = ? WHERE id = ?",
+                     (status, time.time(), error, json.dumps(stats or {}, ensure_ascii=False),
+                      output_name if data is not None else None, job_id))
+
+    def cancel(self, job_id, user):
+        """Los trabajos en cola se cancelan al momento; los que están en curso, al siguiente latido."""
+        self._update("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND user = ? AND status = ?",
+                     (CANCELLED, time.time(), job_id, user, QUEUED))
+        self._update("UPDATE jobs SET cancel = 1 WHERE id = ? AND user = ? AND status = ?", (job_id, user, RUNNING))
+
+    def forget(self, job_id, user):
+        """Borra un trabajo terminado (fila y archivos) de la lista del usuario."""
+        removed = self._update(f"DELETE FROM jobs WHERE id = ? AND user = ? AND status IN ({','.join('?' * len(FINISHED))})",
+                               (job_id, user, *FINISHED))
+        if removed: shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def requeue_stale(self, max_age=STALE_SECONDS):
+        """Devuelve a la cola los trabajos cuyo trabajador dejó de latir (proceso muerto).
+
+        Los que tenían la cancelación pedida se dan por cancelados.
+        """
+        limit = time.time() - max_age
+        self._update("UPDATE jobs SET status = ?, finished = ? WHERE status = ? AND heartbeat < ? AND cancel = 1",
+                     (CANCELLED, time.time(), RUNNING, limit))
+        return self._update("UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ?",
+                            (QUEUED, RUNNING, limit))
+
+    def jobs(self, user=None, limit=50):
+        """Trabajos más recientes primero (de un usuario o de todos)."""
+        where, args = ("WHERE user = ?", (user,)) if user is not None else ("", ())
+        with self.lock:
+            rows = self.conn.execute(f"SELECT * FROM jobs {where} ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def counts(self):
+        """{estado: {usuario: trabajos}} de los trabajos no terminados."""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, user, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) "
+                                     "GROUP BY status, user", (QUEUED, RUNNING)).fetchall()
+        counts = {}
+        for row in rows: counts.setdefault(row["status"], {})[row["user"]] = row["n"]
+        return counts
+
+
+class SharedRateLimiter:
+    """Como `llm.RateLimiter`, pero los cubos viven en SQLite y los comparten todos los procesos.
+
+    La cuota (RPM/TPM) también se guarda en la base de datos: `set_rates` la cambia para
+    la interfaz y para todos los trabajadores a la vez.
+    """
+
+    def __init__(self, path=None, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.path = path or os.path.join(QUEUE_DIR, "queue.sqlite")
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = _connect(self.path)
+        self.conn.executescript(SCHEMA)
+        now = time.time()
+        # Solo el primero fija la cuota inicial; después manda lo guardado
+        for name, rate in (("rpm", rpm), ("tpm", tpm)):
+            self.conn.execute("INSERT OR IGNORE INTO budget VALUES (?, ?, ?, ?)", (name, rate, rate, now))
+
+    def rates(self):
+        with self.lock:
+            return {row["name"]: int(row["rate"]) for row in self.conn.execute("SELECT name, rate FROM budget")}
+
+    def set_rates(self, rpm, tpm):
+        with self.lock:
+            for name, rate in (("rpm", rpm), ("tpm", tpm)):
+                self.conn.execute("UPDATE budget SET rate = ?, tokens = MIN(tokens, ?) WHERE name = ?", (rate, rate, name))
+
+    def acquire(self, tokens=1):
+        self._take("rpm", 1)
+        self._take("tpm", tokens)
+
+    def _take(self, name, amount):
+        while True:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rate, stored, updated = self.conn.execute(
+                        "SELECT rate, tokens, updated FROM budget WHERE name = ?", (name,)).fetchone()
+                    if not rate:  # 0 = sin límite
+                        self.conn.execute("COMMIT")
+                        return
+                    now = time.time()
+                    per_second, need = rate / 60.0, min(amount, rate)
+                    available = min(rate, stored + max(0.0, now - updated) * per_second)
+                    if available >= need:
+                        self.conn.execute("UPDATE budget SET tokens = ?, updated = ? WHERE name = ?",
+                                          (available - need, now, name))
+                        self.conn.execute("COMMIT")
+                        return
+                    self.conn.execute("UPDATE budget SET tokens = ?, updated = ? WHERE name = ?", (available, now, name))
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            time.sleep(min(5.0, (need - available) / per_second))
@@ -0,0 +1,80 @@
+"""Diario de trabajos en disco para reanudar auditorías, reescrituras y adaptaciones."""
+import hashlib
+import json
+import os
+import threading
+
+from .cache import CACHE_DIR
+
+JOURNAL_DIR = os.path.join(CACHE_DIR, "jobs")
+
+
+def content_hash(data):
+    if isinstance(data, str): data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class JobJournal:
+    """Registro append-only (JSONL) de los resultados ya terminados de un trabajo.
+
+    El trabajo se identifica por tipo, hash del archivo subido y hash de los ajustes
+    (prompt, etc.), así que volver a subir el mismo archivo reanuda desde el último punto.
+    """
+
+    def __init__(self, kind, file_hash, settings="", directory=None):
+        directory = directory or JOURNAL_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = f"{kind}_{file_hash[:16]}_{content_hash(settings)[:8]}.jsonl"
+        self.path = os.path.join(directory, name)
+        self.lock = threading.Lock()
+        self.results = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Última línea cortada por un cierre brusco
+                    self.results[entry["id"]] = entry["result"]
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.results
+
+    def get(self, item_id):
+        return self.results.get(str(item_id))
+
+    def __len__(self):
+        return len(self.results)
+
+    def record(self, item_id, result):
+        line = json.dumps({"id": str(item_id), "result": result}, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.results[str(item_id)] = result
+
+    def discard(self):
+        with self.lock:
+            if os.path.exists(self.path): os.remove(self.path)
+            self.results = {}
+
+
+def map_with_journal(executor, fn, items, keys, journal, on_progress=None):
+    """Como `LLMExecutor.map`, pero reutiliza los resultados del diario y guarda cada nuevo.
+
+    Los resultados con "[ERROR" no se guardan para que se reintenten al reanudar.
+    Devuelve (resultados en orden, número de items recuperados del diario).
+    """
+    results = [journal.get(key) for key in keys]
+    todo = [i for i, res in enumerate(results) if res is None]
+
+    def on_done(done, total, idx, res):
+        i = todo[idx]
+        results[i] = res
+        if "[ERROR" not in res: journal.record(keys[i], res)
+        if on_progress: on_progress(done, total, i, res)
+
+    executor.map(lambda i: fn(items[i]), todo, on_progress=on_done)
+    return results, len(items) - len(todo)
@@ -0,0 +1,199 @@
+"""Módulo 2: maquetación de papel para KDP."""
+import re
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches, Pt, RGBColor
+from docx.text.run import Run
+
+from .docx_tools import (SENTENCE_END, add_page_number, document_language, enable_native_hyphenation,
+                         insert_soft_hyphens, load_docx, merge_paragraph_runs, prepend_break, replace_last_space,
+                         save_docx, split_first_char, strip_text_nodes, style_name_resolver, text_nodes)
+from .hyphenate import hyphenator_for
+from .metrics import timed
+
+THEMES = {
+    "Neutro (Estándar)": {"font": "Calibri", "header": "Calibri", "size": 11},
+    "Romance / Fantasía (Serif)": {"font": "Garamond", "header": "Garamond", "size": 12},
+    "Thriller / Crimen (Sharp)": {"font": "Georgia", "header": "Arial Black", "size": 11},
+    "No Ficción / Negocios": {"font": "Arial", "header": "Arial", "size": 10}
+}
+
+PAGE_SIZES = {
+    "6 x 9 pulgadas": (6, 9),
+    "5 x 8 pulgadas": (5, 8),
+    "8.5 x 11 pulgadas": (8.5, 11),
+}
+
+
+def setup_pages(doc, theme, size, mirror, add_numbers, justify_text):
+    """Tamaño de página, márgenes, números de página y estilos base del tema."""
+    w, h = (Inches(v) for v in PAGE_SIZES.get(size, PAGE_SIZES["8.5 x 11 pulgadas"]))
+
+    for section in doc.sections:
+        section.page_width = w; section.page_height = h
+        section.top_margin = Inches(0.75); section.bottom_margin = Inches(0.75)
+        section.left_margin = Inches(0.8); section.right_margin = Inches(0.6)
+        if mirror: section.mirror_margins = True; section.gutter = Inches(0.15)
+        if add_numbers:
+            p_foot = section.footer.paragraphs[0]; p_foot.text = ""
+            add_page_number(p_foot)
+            p_foot.style.font.name = theme['font']; p_foot.style.font.size = Pt(10)
+
+    style = doc.styles['Normal']
+    style.font.name = theme['font']; style.font.size = Pt(theme['size'])
+    style.paragraph_format.line_spacing = 1.25; style.paragraph_format.space_after = Pt(0)
+    style.paragraph_format.widow_control = True
+    if justify_text: style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+    for h_name in ['Heading 1', 'Heading 2']:
+        try:
+            h_style = doc.styles[h_name]
+            h_style.font.name = theme['header']; h_style.font.color.rgb = RGBColor(0,0,0)
+            h_style.paragraph_format.space_before = Pt(0); h_style.paragraph_format.space_after = Pt(30)
+            h_style.alignment = WD_ALIGN_PARAGRAPH.CENTER; h_style.paragraph_format.page_break_before = True
+        except Exception: pass
+
+
+HEADING_PATTERN = re.compile(r'^(chapter|cap[íi]tulo)\b', re.I)
+
+
+def _hyphenation(doc):
+    try: enable_native_hyphenation(doc)
+    except Exception: pass
+
+
+class ParagraphView:
+    """Lo que las transformaciones necesitan de un párrafo, leído una sola vez por pasada."""
+    __slots__ = ("elm", "nodes", "text", "after_heading")
+
+    def __init__(self, elm, text, after_heading):
+        self.elm, self.text, self.after_heading = elm, text, after_heading
+        self.nodes = text_nodes(elm)
+
+
+# Transformaciones por párrafo: fn(plan, view), editan runs y no reasignan el texto completo
+def _to_heading(plan, view):
+    # "Heading 1" solo se busca al convertir el primer título: sin títulos, el estilo puede faltar
+    if plan.heading_id is None: plan.heading_id = plan.styles['Heading 1'].style_id
+    view.elm.style = plan.heading_id
+    strip_text_nodes(view.nodes)
+    for t in view.nodes: t.text = (t.text or "").upper()
+    prepend_break(view.elm)
+
+
+def _keep_with_next(plan, view):
+    view.elm.get_or_add_pPr().keepNext_val = True
+
+
+def _prevent_runts(plan, view):
+    if len(view.text) > 50: replace_last_space(view.nodes)
+
+
+def _justify(plan, view):
+    view.elm.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+
+def _drop_cap(plan, view):
+    if not view.after_heading: return
+    strip_text_nodes(view.nodes)
+    first = split_first_char(view.nodes)
+    if first is None: return
+    font = Run(first, None).font
+    font.name = plan.theme['header']; font.size = Pt(plan.theme['size'] + 5); font.bold = True
+
+
+def _soft_hyphens(plan, view):
+    # La última: las anteriores buscan espacios y el primer carácter en los w:t originales
+    if plan.hyphenator is not None:
+        plan.soft_hyphens += insert_soft_hyphens(view.nodes, plan.hyphenator.text)
+
+
+class LayoutPlan:
+    """Las casillas del Módulo 2 compiladas en una lista ordenada de transformaciones.
+
+    `setup` son pasos de documento (guiones, páginas, estilos) que se ejecutan una vez;
+    `heading` y `body` se aplican a cada párrafo en una única pasada por el XML del cuerpo,
+    que también une las líneas rotas (`reconstruct`) sobre la marcha. Con `soft_hyphens`
+    el cuerpo recibe guiones suaves de pyphen en `lang` (por defecto, el del manuscrito).
+    """
+
+    def __init__(self, size="6 x 9 pulgadas", theme_name="Neutro (Estándar)", mirror=True, fix_titles=True,
+                 pro_start=True, reconstruct=True, justify_text=True, add_numbers=True, fix_runts=True,
+                 soft_hyphens=False, lang=None):
+        self.theme = THEMES[theme_name]
+        self.stitch = reconstruct
+        self.lang = lang
+        self.hyphenator, self.soft_hyphens = None, 0
+        self.setup = [("hyphenation", _hyphenation)] if justify_text else []
+        if soft_hyphens: self.setup.append(("hyphenator", self._load_hyphenator))
+        self.setup.append(("page_setup", lambda doc: setup_pages(doc, self.theme, size, mirror, add_numbers,
+                                                                 justify_text)))
+        self.heading = [_to_heading] + ([_keep_with_next] if fix_titles else [])
+        self.body = [fn for fn, on in ((_prevent_runts, fix_runts), (_justify, justify_text), (_drop_cap, pro_start),
+                                       (_soft_hyphens, soft_hyphens)) if on]
+        self.styles, self.heading_id = None, None
+
+    def _load_hyphenator(self, doc):
+        self.hyphenator = hyphenator_for(self.lang or document_language(doc) or "es")
+
+    def apply(self, doc, on_progress=None, metrics=None):
+        for name, fn in self.setup:
+            with timed(metrics, name): fn(doc)
+        before = self.hyphenator.stats() if self.hyphenator is not None else None
+        with timed(metrics, "paragraph_pass"):
+            count = self.format_body(doc, on_progress)
+        if metrics is not None:
+            metrics.incr("layout_paragraphs", count)
+            if before is not None:
+                metrics.incr("soft_hyphens", self.soft_hyphens)
+                self.hyphenator.record(metrics, before)
+
+    def format_body(self, doc, on_progress=None):
+        """Una pasada por los w:p del cuerpo; devuelve cuántos párrafos quedaron."""
+        style_name = style_name_resolver(doc)
+        self.styles, self.heading_id = doc.styles, None
+        p_elms = list(doc.element.body.p_lst)
+        n = len(p_elms)
+        texts = [None] * n
+
+        def text(i):
+            if texts[i] is None: texts[i] = p_elms[i].text.strip()
+            return texts[i]
+
+        def joins_next(i):
+            # Mismo criterio que stitch_paragraphs
+            return (text(i) and text(i + 1) and not style_name(p_elms[i]).startswith('Heading')
+                    and not style_name(p_elms[i + 1]).startswith('Heading') and text(i)[-1] not in SENTENCE_END)
+
+        i, kept, after_heading = 0, 0, False
+        while i < n:
+            p, j = p_elms[i], i
+            if self.stitch:
+                while j < n - 1 and joins_next(j): j += 1
+                if j > i: merge_paragraph_runs(p, p_elms[i + 1:j + 1])
+            kept += 1
+            text_clean = " ".join(text(k) for k in range(i, j + 1)) if j > i else text(i)
+            if len(text_clean) >= 2:
+                is_h = style_name(p).startswith('Heading') or (
+                    len(text_clean) < 60 and (HEADING_PATTERN.match(text_clean) or text_clean.isupper()))
+                view = ParagraphView(p, text_clean, after_heading)
+                for fn in self.heading if is_h else self.body: fn(self, view)
+                after_heading = is_h
+            if on_progress and i // 10 != (j + 1) // 10: on_progress((j + 1) / n)
+            i = j + 1
+        return kept
+
+
+def kdp_layout(data, size="6 x 9 pulgadas", theme_name="Neutro (Estándar)", mirror=True,
+               fix_titles=True, pro_start=True, reconstruct=True, justify_text=True,
+               add_numbers=True, fix_runts=True, on_progress=None, metrics=None, doc_cache=None,
+               soft_hyphens=False, lang=None):
+    """Maqueta un .docx (bytes) para impresión y devuelve el .docx resultante (bytes).
+
+    `on_progress(fracción)` se llama cada 10 párrafos durante la pasada por el cuerpo.
+    """
+    doc = load_docx(data, metrics, doc_cache)
+    plan = LayoutPlan(size, theme_name, mirror, fix_titles, pro_start, reconstruct, justify_text, add_numbers,
+                      fix_runts, soft_hyphens, lang)
+    plan.apply(doc, on_progress, metrics)
+    return save_docx(doc, metrics)
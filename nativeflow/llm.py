@@ -0,0 +1,288 @@
+"""Llamadas al modelo: reintentos, cuota RPM/TPM y ejecución concurrente."""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import cache_key
+
+# Apagamos los filtros de seguridad para que permita términos de psicología (ansiedad, miedo, etc.)
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
+]
+
+DEFAULT_RPM = 24          # Equivale a la antigua pausa fija de 2.5 s entre llamadas
+DEFAULT_TPM = 1_000_000
+DEFAULT_WORKERS = 4
+
+CONTEXT_CACHE_MIN_TOKENS = 4096     # Mínimo de Gemini 2.5 Pro para una caché de contexto explícita
+CONTEXT_CACHE_TTL = 3600
+INSTRUCTED_MAX_AGE = 1800           # Antes de que caduque la caché de contexto, el modelo se vuelve a crear
+
+
+class LLMError(Exception):
+    """El modelo falló en todos los reintentos."""
+
+
+def estimate_tokens(text):
+    # Aproximación barata (~4 caracteres por token) para la cuota TPM
+    return max(1, len(text) // 4)
+
+
+def gemini_model(model_name, api_key=None, system_instruction=None):
+    """Cliente de Gemini con las instrucciones fijas como system_instruction.
+
+    Si son lo bastante largas para una caché de contexto explícita, se crea una y el
+    modelo la referencia. Si no se puede crear (cuota, modelo), se usa system_instruction.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    if system_instruction and estimate_tokens(system_instruction) >= CONTEXT_CACHE_MIN_TOKENS:
+        try:
+            cached = genai.caching.CachedContent.create(model=model_name, system_instruction=system_instruction,
+                                                        ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL))
+            return genai.GenerativeModel.from_cached_content(cached)
+        except Exception:
+            pass
+    return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+class InstructedModels:
+    """Un modelo por bloque de instrucciones (prompt de auditoría, de corrección...).
+
+    `factory(system_instruction)` crea cada modelo la primera vez que se pide. Así el bloque
+    se fija una sola vez y no se repite en el texto de cada llamada, aunque la API lo sigue
+    recibiendo y facturando en cada petición (salvo caché de contexto). Los modelos se
+    renuevan tras `max_age` segundos y solo se guardan los `max_entries` más recientes.
+    """
+
+    def __init__(self, factory, max_entries=16, max_age=INSTRUCTED_MAX_AGE):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.models = OrderedDict()     # instrucciones -> (modelo, creado)
+        self.lock = threading.Lock()
+
+    def get(self, system=None):
+        with self.lock:
+            entry = self.models.get(system)
+            if entry is None or time.monotonic() - entry[1] > self.max_age:
+                entry = self.models[system] = (self.factory(system), time.monotonic())
+            self.models.move_to_end(system)
+            while len(self.models) > self.max_entries: self.models.popitem(last=False)
+            return entry[0]
+
+
+def inline_instructions(call):
+    """Adapta una `call(prompt)` que no admite `system`: antepone las instrucciones al texto."""
+    return lambda prompt, system=None: call(f"{system}\n\n{prompt}" if system else prompt)
+
+
+class TokenBucket:
+    """Cubo de fichas thread-safe: `rate_per_minute` fichas que se recargan de forma continua."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Combina un cubo de peticiones por minuto y otro de tokens por minuto (0 = sin límite)."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = TokenBucket(rpm) if rpm else None
+        self.tpm = TokenBucket(tpm) if tpm else None
+
+    def acquire(self, tokens=1):
+        if self.rpm: self.rpm.acquire(1)
+        if self.tpm: self.tpm.acquire(tokens)
+
+
+class LiveOutput:
+    """Texto parcial de las llamadas en streaming: lo escriben los hilos y lo lee la UI."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.partials = {}      # hilo -> texto acumulado de su llamada en curso
+        self.latest = None      # hilo que escribió el último fragmento
+
+    def update(self, text):
+        key = threading.get_ident()
+        with self.lock:
+            self.partials[key] = text
+            self.latest = key
+
+    def finish(self):
+        with self.lock:
+            self.partials.pop(threading.get_ident(), None)
+
+    def snapshot(self):
+        """(texto parcial más reciente, llamadas en curso)."""
+        with self.lock:
+            return self.partials.get(self.latest, ""), len(self.partials)
+
+
+def _generate(model, prompt, temp, on_chunk, metrics, t0):
+    if on_chunk is None:
+        response = model.generate_content(prompt, generation_config={"temperature": temp},
+                                          safety_settings=SAFETY_SETTINGS)
+        return response, response.text.strip()
+    response = model.generate_content(prompt, generation_config={"temperature": temp},
+                                      safety_settings=SAFETY_SETTINGS, stream=True)
+    parts = []
+    for chunk in response:
+        try:
+            piece = chunk.text
+        except ValueError:
+            piece = ""  # Fragmento sin partes (p. ej. el de cierre)
+        if not piece: continue
+        if not parts and metrics is not None: metrics.record_first_output(time.perf_counter() - t0)
+        parts.append(piece)
+        on_chunk("".join(parts))
+    # Tras consumir el stream, `.text` es el texto agregado (y falla igual que sin streaming)
+    return response, response.text.strip()
+
+
+def call_model(model, prompt, temp=0.7, limiter=None, cache=None, retries=3, retry_wait=4, metrics=None,
+               on_chunk=None, system=None):
+    """Llama al modelo respetando la cuota; reintenta y lanza LLMError con el error real.
+
+    `system` son las instrucciones que `model` ya lleva (InstructedModels). Viajan aparte de
+    `prompt` pero se facturan en cada llamada: cuentan en la clave de caché, en la estimación
+    de tokens para la cuota y en los caracteres enviados que registra `metrics`.
+
+    Si se pasa `cache` (ResponseCache), las respuestas idénticas se sirven desde disco.
+    Con `metrics` (Metrics) se registran latencia, tokens, reintentos, esperas y caché.
+    Con `on_chunk(texto_acumulado)` la respuesta se pide en streaming y se notifica cada
+    fragmento (desde el hilo que llama); se mide también el tiempo hasta el primero.
+    """
+    key = None
+    if cache is not None:
+        key = cache_key(getattr(model, "model_name", ""), temp, SAFETY_SETTINGS,
+                        prompt if system is None else [system, prompt])
+        cached = cache.get(key)
+        if metrics is not None: metrics.incr("cache_hits" if cached is not None else "cache_misses")
+        if cached is not None: return cached
+    last_error = ""
+    for intento in range(retries):
+        if limiter:
+            t0 = time.perf_counter()
+            limiter.acquire(estimate_tokens(prompt) + (estimate_tokens(system) if system else 0))
+            if metrics is not None: metrics.add_time("rate_limit_wait", time.perf_counter() - t0)
+        try:
+            t0 = time.perf_counter()
+            response, text = _generate(model, prompt, temp, on_chunk, metrics, t0)
+        except Exception as e:
+            # Guardamos el mensaje real y esperamos antes de reintentar
+            last_error = str(e)
+            if metrics is not None: metrics.incr("model_errors")
+            if intento < retries - 1:
+                if metrics is not None:
+                    metrics.incr("retries")
+                    metrics.add_time("retry_wait", retry_wait)
+                time.sleep(retry_wait)
+            continue
+        if metrics is not None:
+            latency = time.perf_counter() - t0
+            metrics.add_time("model", latency)
+            metrics.record_call(latency, len(prompt) + (len(system) if system else 0), len(text),
+                                getattr(response, "usage_metadata", None))
+        if key is not None: cache.put(key, text)
+        return text
+    raise LLMError(last_error)
+
+
+class LLMExecutor:
+    """Pool de hilos acotado que procesa trabajos y devuelve los resultados en orden.
+
+    `cancel` (threading.Event) detiene el trabajo tras los items en curso: los que no han
+    empezado quedan como None y no pasan por `on_progress`. Cualquier excepción en el hilo
+    que llama (p. ej. el rerun de Streamlit al pulsar "Cancelar") activa la cancelación
+    antes de propagarse. `on_tick()` se invoca cada `tick` segundos mientras se espera,
+    en el hilo que llama (para refrescar el texto en streaming).
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, cancel=None, on_tick=None, tick=0.25):
+        self.max_workers = max(1, int(max_workers))
+        self.cancel = cancel if cancel is not None else threading.Event()
+        self.on_tick = on_tick
+        self.tick = tick
+
+    @property
+    def cancelled(self):
+        return self.cancel.is_set()
+
+    def map(self, fn, items, on_progress=None):
+        """Aplica `fn` a cada item en paralelo.
+
+        `on_progress(done, total, index, result)` se invoca en el hilo que llama
+        (seguro para Streamlit) a medida que terminan los futures. Si el hilo que llama se
+        interrumpe, los items ya en curso terminan (y se facturan) igualmente: también se
+        notifican antes de relanzar la excepción, para que el diario no los pierda.
+        """
+        items = list(items)
+        total = len(items)
+        results = [None] * total
+        if not items: return results
+        cancel, on_tick = self.cancel, self.on_tick
+
+        def run(item):
+            return None if cancel.is_set() else fn(item)
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures, reported, done = {}, set(), 0
+        try:
+            for idx, item in enumerate(items): futures[pool.submit(run, item)] = idx
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=self.tick if on_tick else None, return_when=FIRST_COMPLETED)
+                for future in sorted(finished, key=futures.get):
+                    idx = futures[future]
+                    reported.add(future)
+                    results[idx] = future.result()
+                    if results[idx] is None: continue
+                    done += 1
+                    if on_progress: on_progress(done, total, idx, results[idx])
+                if on_tick and pending: on_tick()
+        except BaseException:
+            cancel.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._drain(futures, reported, results, on_progress, done, total)
+            raise
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return results
+
+    @staticmethod
+    def _drain(futures, reported, results, on_progress, done, total):
+        # Resultados que terminaron sin pasar por `on_progress` (el hilo que llama ya se interrumpió)
+        for future in sorted(set(futures) - reported, key=futures.get):
+            if future.cancelled() or future.exception() is not None: continue
+            idx = futures[future]
+            results[idx] = future.result()
+            if results[idx] is None or not on_progress: continue
+            done += 1
+            try:
+                on_progress(done, total, idx, results[idx])
+            except BaseException:
+                pass    # La interfaz puede fallar otra vez; lo que importa es que el diario lo reciba antes
@@ -0,0 +1,135 @@
+"""Instrumentación de trabajos: tiempos por etapa, latencia del modelo, tokens y caché."""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from .cache import CACHE_DIR
+
+METRICS_DIR = os.path.join(CACHE_DIR, "metrics")
+
+
+def _percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _distribution(values):
+    return {"count": len(values), "sum": sum(values), "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95), "max": max(values, default=0.0)}
+
+
+class Metrics:
+    """Acumulador thread-safe de métricas de un trabajo (auditoría, maquetación, EPUB...)."""
+
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stages = {}        # nombre -> segundos acumulados
+        self.counters = {}      # nombre -> valor acumulado
+        self.latencies = []     # segundos por llamada al modelo (solo llamadas reales)
+        self.first_output = []  # segundos hasta el primer fragmento en modo streaming
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_call(self, latency, prompt_chars, response_chars, usage=None):
+        """Registra una llamada real al modelo; `usage` es `response.usage_metadata`.
+
+        `prompt_chars` es todo lo que viaja en la petición, instrucciones de sistema incluidas;
+        `prompt_tokens` (de `usage`) es lo que factura la API.
+        """
+        with self.lock:
+            self.latencies.append(latency)
+        self.incr("model_calls")
+        self.incr("prompt_chars", prompt_chars)
+        self.incr("response_chars", response_chars)
+        if usage is not None:
+            self.incr("prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+            self.incr("response_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+            self.incr("cached_tokens", getattr(usage, "cached_content_token_count", 0) or 0)
+
+    def record_first_output(self, seconds):
+        """Tiempo hasta el primer texto visible de una llamada en streaming."""
+        with self.lock:
+            self.first_output.append(seconds)
+
+    def summary(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            first_output = list(self.first_output)
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+        return {
+            "job": self.job,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "wall_seconds": time.time() - self.started,
+            "stages": stages,
+            "counters": counters,
+            "latency": _distribution(latencies),
+            "first_output": _distribution(first_output),
+        }
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Formato de texto de Prometheus (node_exporter textfile collector)."""
+        s = self.summary()
+        job = s["job"].replace('"', "'")
+        lines = [
+            "# HELP nativeflow_stage_seconds Tiempo de pared por etapa.",
+            "# TYPE nativeflow_stage_seconds gauge",
+        ]
+        lines += [f'nativeflow_stage_seconds{{job="{job}",stage="{name}"}} {secs:.6f}'
+                  for name, secs in sorted(s["stages"].items())]
+        lines += ["# HELP nativeflow_job_seconds Duración total del trabajo.",
+                  "# TYPE nativeflow_job_seconds gauge",
+                  f'nativeflow_job_seconds{{job="{job}"}} {s["wall_seconds"]:.6f}']
+        for metric, key, help_text in (("model_latency", "latency", "Latencia de las llamadas al modelo."),
+                                       ("model_first_output", "first_output", "Tiempo hasta el primer fragmento (streaming).")):
+            dist = s[key]
+            lines += [f"# HELP nativeflow_{metric}_seconds {help_text}",
+                      f"# TYPE nativeflow_{metric}_seconds summary"]
+            for q in ("p50", "p95"):
+                lines.append(f'nativeflow_{metric}_seconds{{job="{job}",quantile="0.{q[1:]}"}} {dist[q]:.6f}')
+            lines += [f'nativeflow_{metric}_seconds_sum{{job="{job}"}} {dist["sum"]:.6f}',
+                      f'nativeflow_{metric}_seconds_count{{job="{job}"}} {dist["count"]}']
+        for name, value in sorted(s["counters"].items()):
+            metric = f"nativeflow_{name}_total"
+            lines += [f"# TYPE {metric} counter", f'{metric}{{job="{job}"}} {value}']
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=None):
+        """Escribe <job>-<fecha>.json y .prom en `directory`; devuelve la ruta base."""
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        base = os.path.join(directory, f"{self.job}-{stamp}")
+        with open(base + ".json", "w", encoding="utf-8") as fh:
+            fh.write(self.to_json())
+        with open(base + ".prom", "w", encoding="utf-8") as fh:
+            fh.write(self.to_prometheus())
+        return base
+
+
+def timed(metrics, name):
+    """`with timed(metrics, "etapa"):` que no hace nada si `metrics` es None."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
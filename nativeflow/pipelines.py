@@ -0,0 +1,67 @@
+"""Registro de pipelines sin IA (bytes de entrada -> bytes de salida) para CLI y lotes."""
+import importlib
+import os
+import time
+
+from .metrics import Metrics
+
+# nombre -> ("módulo:función", extensión de salida); se importan al usarse
+PIPELINES = {
+    "kdp": ("nativeflow.layout:kdp_layout", ".docx"),
+    "clean": ("nativeflow.cleaner:nuclear_clean_docx", ".docx"),
+    "workbook": ("nativeflow.workbook:classic_clean", ".docx"),
+    "epub": ("nativeflow.epub_builder:docx_to_epub", ".epub"),
+}
+
+
+def pipeline_function(name):
+    module, func = PIPELINES[name][0].split(":")
+    return getattr(importlib.import_module(module), func)
+
+
+def run_pipeline(name, data, **options):
+    return pipeline_function(name)(data, **options)
+
+
+def output_name(name, filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return stem + PIPELINES[name][1]
+
+
+def process_bytes(name, filename, data, options, metrics_dir=None):
+    """Aplica el pipeline a un archivo en memoria; pensado para ejecutarse en un proceso hijo.
+
+    Nunca lanza: devuelve (filename, nombre de salida, bytes o None, error o None, segundos).
+    Con `metrics_dir` exporta las métricas del archivo en JSON y formato Prometheus.
+    """
+    t0 = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    metrics = Metrics(f"{name}-{stem}") if metrics_dir else None
+    try:
+        options = dict(options)
+        if name == "epub" and not options.get("title"):
+            options["title"] = stem
+        result = run_pipeline(name, data, metrics=metrics, **options)
+        if metrics is not None: metrics.export(metrics_dir)
+        return filename, output_name(name, filename), result, None, time.perf_counter() - t0
+    except Exception as e:
+        return filename, None, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+
+
+def process_file(name, src, out_dir, options, metrics_dir=None):
+    """Como `process_bytes`, pero lee y escribe en disco.
+
+    Nunca lanza: devuelve (src, ruta de salida o None, error o None, segundos).
+    """
+    t0 = time.perf_counter()
+    try:
+        with open(src, "rb") as fh:
+            data = fh.read()
+        _, out_name, result, error, _ = process_bytes(name, src, data, options, metrics_dir)
+        if error: return src, None, error, time.perf_counter() - t0
+        dst = os.path.join(out_dir, out_name)
+        with open(dst, "wb") as fh:
+            fh.write(result)
+        return src, dst, None, time.perf_counter() - t0
+    except Exception as e:
+        return src, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
@@ -0,0 +1,116 @@
+"""Cascada de auditoría: un filtro barato decide los párrafos limpios y solo escala los dudosos.
+
+Niveles: heurística local (sin llamadas) y modelo rápido por lotes. Lo que ninguno da por
+limpio pasa al modelo pro, que es el único que escribe explicaciones en el reporte. La
+heurística solo aprueba con evidencia positiva (párrafos sin nada que auditar); lo que no
+sabe juzgar (tono, pronombres...) sigue al modelo rápido o al pro.
+"""
+import re
+
+from .audit import DEFAULT_BATCH_CHARS, BATCH_INSTRUCTIONS, batch_prompt, build_batches, parse_batch_reply
+
+TIER_HEURISTIC = "heurística"
+TIER_SCREEN = "modelo rápido"
+
+# Veredictos de HeuristicScreen.classify (None = no lo sabe juzgar)
+CLEAN, ISSUE = "CLEAN", "ISSUE"
+
+# Señales de "Espanglish" y tono como datos: ajustables sin tocar el código
+HEURISTIC_RULES = {
+    # Palabras funcionales inglesas que no existen en español (sin "he", "a", "me"...)
+    "english_words": ["the", "of", "and", "with", "you", "your", "is", "are", "this", "that", "for",
+                      "my", "she", "his", "her", "it", "was", "were", "be", "have", "what", "when"],
+    # ... y españolas que no existen en inglés: solo la mezcla de ambas es una señal (vale para
+    # manuscritos en cualquiera de los dos idiomas)
+    "spanish_words": ["el", "los", "las", "que", "con", "por", "para", "una", "pero", "muy", "está", "también"],
+    # Vocabulario de negocios impropio de un libro infantil
+    "business_words": ["sinergia", "apalancar", "stakeholders", "kpi", "roi", "negocio", "ventas",
+                       "cliente", "rentabilidad", "mercado", "estrategia", "proactivo", "deadline"],
+    # Calcos habituales del inglés
+    "calques": [r"\bel (?:la )?\w+ de el\b", r"\brealizar\b", r"\bbasado en\b", r"\ben orden a\b",
+                r"\bhacer sentido\b", r"\baplicar para\b", r"\bser consciente de que\b",
+                r"\bthe \w+ing of the\b"],
+    "trivial_words": 3,     # Sin señales y con tan pocas palabras (o ninguna) no hay tono ni pronombres que auditar
+    "max_chars": 700,       # Los párrafos muy largos siempre se escalan
+    "threshold": 1,         # Señales necesarias para mandar un párrafo directo al modelo pro
+}
+
+WORD = re.compile(r"[^\W\d_]+")
+
+SCREEN_INSTRUCTIONS = """Eres un filtro previo rápido. Marca como ISSUE cualquier párrafo con la más mínima
+duda según los criterios; solo los claramente perfectos son CLEAN. La explicación puede ser una palabra."""
+
+
+class HeuristicScreen:
+    """Puntuación local compilada a partir de HEURISTIC_RULES (una regex por tipo de señal)."""
+
+    def __init__(self, rules=None):
+        self.rules = dict(HEURISTIC_RULES, **(rules or {}))
+        words = lambda ws: re.compile(r"\b(?:" + "|".join(map(re.escape, ws)) + r")\b") if ws else None
+        self.english = words(self.rules["english_words"])
+        self.spanish = words(self.rules["spanish_words"])
+        self.business = words(self.rules["business_words"])
+        self.calques = re.compile("|".join(self.rules["calques"])) if self.rules["calques"] else None
+
+    def score(self, text):
+        lower = text.lower()
+        score = 0
+        for pattern in (self.business, self.calques):
+            if pattern is not None: score += len(pattern.findall(lower))
+        mixed = self.english is not None and self.spanish is not None
+        if mixed and self.english.search(lower) and self.spanish.search(lower): score += 1
+        if len(text) > self.rules["max_chars"]: score += self.rules["threshold"]
+        return score
+
+    def classify(self, text):
+        """ISSUE con señales; CLEAN solo si el párrafo no tiene nada que auditar; si no, None."""
+        if self.score(text) >= self.rules["threshold"]: return ISSUE
+        if len(WORD.findall(text)) <= self.rules["trivial_words"]: return CLEAN
+        return None
+
+
+class Cascade:
+    """Niveles baratos previos al modelo pro para `audit_manuscript(cascade=...)`.
+
+    `heuristic` (HeuristicScreen) y `screen_call(prompt, system=None)` son opcionales e independientes;
+    ambos se pueden sustituir por dobles en pruebas.
+    """
+
+    def __init__(self, heuristic=None, screen_call=None):
+        self.heuristic = heuristic
+        self.screen_call = screen_call
+
+    def run(self, items, audit_prompt, executor, max_chars=DEFAULT_BATCH_CHARS, journal=None, on_progress=None):
+        """Reparte [(id, texto)] entre los niveles baratos.
+
+        Los ids ya presentes en `journal` no se filtran (el nivel pro los recupera del
+        diario). Devuelve (decididos {id: nivel}, escalados [(id, texto)], llamadas al
+        modelo rápido). Lo decidido se guarda como CLEAN en el diario.
+        """
+        decided, escalate, todo = {}, [], []
+        for pid, text in items:
+            verdict = self.heuristic.classify(text) if self.heuristic is not None else None
+            if journal is not None and pid in journal: escalate.append((pid, text))
+            elif verdict == CLEAN: decided[pid] = TIER_HEURISTIC
+            elif verdict == ISSUE: escalate.append((pid, text))     # Con señales claras, sin pasar por el filtro
+            else: todo.append((pid, text))
+
+        calls = 0
+        if self.screen_call is not None and todo:
+            batches = build_batches(todo, max_chars)
+            system = f"{audit_prompt}\n\n{SCREEN_INSTRUCTIONS}\n\n{BATCH_INSTRUCTIONS}"
+            calls = len(batches)
+
+            def on_batch(done, total, idx, reply):
+                for pid, verdict in parse_batch_reply(reply, [pid for pid, _ in batches[idx]]).items():
+                    if verdict == "CLEAN": decided[pid] = TIER_SCREEN
+                if on_progress: on_progress(done, total, "filtro")
+
+            executor.map(lambda prompt: self.screen_call(prompt, system=system), [batch_prompt(b) for b in batches],
+                         on_progress=on_batch)
+        # Sin respuesta válida del filtro (o sin filtro) el párrafo sube al nivel pro
+        escalate += [(pid, text) for pid, text in todo if pid not in decided]
+        escalate.sort()
+        if journal is not None:
+            for pid in decided: journal.record(pid, "CLEAN")
+        return decided, escalate, calls
@@ -0,0 +1,67 @@
+"""Módulo 1 (corrección): reescritura párrafo a párrafo con estilo nativo."""
+from .dedup import fan_out, group_duplicates, match_case, representatives
+from .docx_tools import load_docx, save_docx
+from .journal import map_with_journal
+from .metrics import timed
+from .text import clean_markdown
+
+
+def rewrite_prompt_for(text):
+    # El prompt de corrección va como `system`, una vez por trabajo
+    return f"TEXTO ORIGINAL: '{text}'"
+
+
+def parse_overrides(text):
+    """Líneas "número: texto" -> {número de párrafo: texto}; las líneas mal formadas se ignoran."""
+    overrides = {}
+    for line in (text or "").splitlines():
+        number, sep, value = line.partition(":")
+        if sep and number.strip().isdigit() and value.strip():
+            overrides[int(number)] = value.strip()
+    return overrides
+
+
+def rewrite_manuscript(data, rewrite_prompt, call, executor, journal=None, on_progress=None, metrics=None,
+                       doc_cache=None, dedup=False, overrides=None):
+    """Reescribe un .docx (bytes) y devuelve (bytes corregidos, estadísticas).
+
+    `on_progress(done, total, índice, respuesta)` se invoca al terminar cada petición. Con
+    `dedup` los párrafos repetidos (salvo espacios y mayúsculas) se reescriben una vez y
+    el resultado se copia a cada aparición. `overrides` {número de párrafo (desde 1): texto}
+    fija el texto de apariciones concretas; esas no se envían ni se agrupan.
+    """
+    doc = load_docx(data, metrics, doc_cache)
+    overrides = overrides or {}
+    paragraphs = doc.paragraphs
+    items = [(i, p.text) for i, p in enumerate(paragraphs) if len(p.text) > 10 and i + 1 not in overrides]
+    unique, copies = group_duplicates(items) if dedup else (items, {})
+    jobs = [(i, rewrite_prompt_for(text)) for i, text in unique]
+
+    fn = lambda job: call(job[1], system=rewrite_prompt)
+    with timed(metrics, "dispatch"):
+        if journal is not None:
+            results, resumed = map_with_journal(executor, fn, jobs, [i for i, _ in jobs], journal,
+                                                on_progress=on_progress)
+        else:
+            results, resumed = executor.map(fn, jobs, on_progress=on_progress), 0
+    # Cancelado antes de empezar (None): el párrafo y sus copias se quedan con el original
+    rewritten = fan_out({i: res for (i, _), res in zip(jobs, results) if res is not None}, copies)
+    stats = {"resumed": resumed, "duplicates": len(items) - len(unique), "overrides": 0}
+
+    originals, duplicate_of = dict(items), representatives(copies)
+    with timed(metrics, "apply_edits"):
+        for i, res in rewritten.items():
+            clean = clean_markdown(res)
+            if "[ERROR" in clean: continue
+            # Solo las copias escritas distinto que su representante adaptan las mayúsculas
+            rep = duplicate_of.get(i)
+            if rep is not None and originals[i] != originals[rep]: clean = match_case(originals[i], clean)
+            paragraphs[i].text = clean
+        for number, text in overrides.items():
+            if 0 < number <= len(paragraphs):
+                paragraphs[number - 1].text = text
+                stats["overrides"] += 1
+    if metrics is not None and dedup:
+        metrics.incr("duplicate_items", stats["duplicates"])
+        metrics.incr("dedup_calls_saved", stats["duplicates"])
+    return save_docx(doc, metrics), stats
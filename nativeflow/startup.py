@@ -0,0 +1,66 @@
+"""Tiempos de arranque del proceso: importaciones perezosas, cliente del modelo y primer pintado."""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def process_age():
+    """Segundos desde que arrancó el proceso (Linux, vía /proc); None si no se puede saber."""
+    try:
+        with open("/proc/self/stat") as fh:
+            # El nombre del proceso va entre paréntesis y puede tener espacios
+            fields = fh.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as fh:
+            uptime = float(fh.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    """Registro de un proceso: qué se importó, cuándo y cuánto costó (como `-X importtime`)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = time.perf_counter()
+        self.entries = []       # (etiqueta, segundos, módulos nuevos, paquetes nuevos)
+        self.first_paint = None
+        self.last_run = None
+        self.runs = 0
+
+    @contextmanager
+    def imports(self, label):
+        """Mide un bloque de imports; solo se anota si cargó módulos nuevos."""
+        before = set(sys.modules)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            new = set(sys.modules) - before
+            if new:
+                packages = sorted({name.split(".")[0] for name in new if not name.startswith("_")})
+                self.record(label, seconds, len(new), packages)
+
+    def record(self, label, seconds, modules=0, packages=()):
+        with self.lock:
+            self.entries.append((label, seconds, modules, list(packages)))
+
+    def finish_run(self, run_seconds):
+        """Cierra una ejecución del script; la primera fija el primer pintado."""
+        with self.lock:
+            self.runs += 1
+            self.last_run = run_seconds
+            if self.first_paint is None:
+                age = process_age()
+                self.first_paint = age if age is not None else time.perf_counter() - self.created
+
+    def summary(self):
+        with self.lock:
+            return {"first_paint": self.first_paint, "runs": self.runs,
+                    "last_run": self.last_run, "entries": list(self.entries)}
+
+
+STARTUP = StartupReport()
@@ -0,0 +1,16 @@
+"""Limpieza de texto plano compartida por los módulos."""
+import re
+
+
+def nuclear_clean(text):
+    if not text: return text
+    text = text.replace('\n', ' ').replace('\r', ' ').replace('\v', ' ').replace('\f', ' ')
+    return " ".join(text.split())
+
+
+def clean_markdown(text):
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'__(.*?)__', r'\1', text)
+    text = re.sub(r'^#+\s*', '', text)
+    return nuclear_clean(text).strip()
@@ -0,0 +1,178 @@
+"""Módulo 3: limpieza de cuadernos de ejercicios para eBook (clásica y con IA)."""
+import re
+
+from .dedup import fan_out, group_duplicates
+from .docx_tools import EditBuffer, load_docx, save_docx
+from .journal import content_hash, map_with_journal
+from .metrics import timed
+from .text import clean_markdown
+
+DEFAULT_CTA = "🛑 (Ejercicio): Completa esto en tu Cuaderno."
+BOILERPLATE = ["espacio para dibujar", "recorta esta página", "pega aquí"]
+EXERCISE_KEYWORDS = ["ejercicio:", "dibuja", "escribe tu", "completa", "querido", "prometo", "mi monstruo suena", "mi monstruo se ve"]
+
+# Reglas de detección como datos: ExerciseRules(dict(EXERCISE_RULES, ...)) permite ajustarlas
+EXERCISE_RULES = {
+    "protect": ["qr", "amazon"],            # Nunca son ejercicio (enlaces de Amazon y QR)
+    "boilerplate": BOILERPLATE,             # Se borran antes de adaptar con IA
+    "keywords": EXERCISE_KEYWORDS,
+    "question_prefixes": ["¿", "•", "-"],   # Pregunta con viñeta: empieza así y contiene "?"
+    "fill_chars": "_.-",                    # Líneas para rellenar (____, ...., ----)
+    "fill_min_run": 3,                      # Detección de ejercicios (pestaña IA)
+    "cta_min_run": 4,                       # Líneas que la limpieza clásica cambia por el CTA
+    "label_max_len": 100,                   # Etiqueta corta con ":" ...
+    "lookahead": 3,                         # ... seguida de una línea para rellenar
+}
+
+
+class ExerciseRules:
+    """Motor de reglas compilado: una sola expresión regular clasifica cada párrafo.
+
+    Todas las palabras clave (protegidas, relleno y de ejercicio) y las líneas para
+    rellenar van en una alternancia dentro de un lookahead, así que `finditer` encuentra
+    también coincidencias solapadas en una única pasada sobre el texto en minúsculas.
+    Si dos reglas de grupos distintos empiezan en la misma posición, gana la primera.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = dict(EXERCISE_RULES, **(rules or {}))
+        r = self.rules
+        self.fill_min_run, self.cta_min_run = r["fill_min_run"], r["cta_min_run"]
+        run = min(self.fill_min_run, self.cta_min_run)
+        groups = [("protect", self._literals(r["protect"])),
+                  ("boilerplate", self._literals(r["boilerplate"])),
+                  ("run", f"[{re.escape(r['fill_chars'])}]{{{run},}}" if r["fill_chars"] else ""),
+                  ("keyword", self._literals(r["keywords"]))]
+        # Filtro por primer carácter: descarta rápido las posiciones que no pueden empezar regla
+        first = {w[0].lower() for k in ("protect", "boilerplate", "keywords") for w in r[k] if w} | set(r["fill_chars"])
+        guard = f"(?=[{re.escape(''.join(sorted(first)))}])" if first else ""
+        self.pattern = re.compile(guard + "(?=" + "|".join(f"(?P<{name}>{rx})" for name, rx in groups if rx) + ")")
+        self.question_prefixes = tuple(r["question_prefixes"])
+
+    @staticmethod
+    def _literals(words):
+        return "|".join(re.escape(w.lower()) for w in sorted(words, key=len, reverse=True))
+
+    def scan(self, text):
+        """Conjunto de reglas que cumple el texto: protect, boilerplate, keyword, fill, cta."""
+        flags, longest = set(), 0
+        for m in self.pattern.finditer(text.lower()):
+            if m.lastgroup == "run": longest = max(longest, len(m.group("run")))
+            else: flags.add(m.lastgroup)
+        if longest >= self.fill_min_run: flags.add("fill")
+        if longest >= self.cta_min_run: flags.add("cta")
+        return flags
+
+    def classify(self, texts):
+        return [self.scan(t) for t in texts]
+
+    def find_exercises(self, texts, flags=None):
+        """Índices de los párrafos que pertenecen a un ejercicio (`flags` de `classify`)."""
+        if flags is None: flags = self.classify(texts)
+        # Lookahead memoizado: cada vecino se escaneó una sola vez en `classify`
+        has_fill = ["fill" in f for f in flags]
+        label_max_len, lookahead = self.rules["label_max_len"], self.rules["lookahead"]
+        exercise_indices = []
+        for i, (raw, f) in enumerate(zip(texts, flags)):
+            text = raw.strip()
+            if len(text) < 2 or "protect" in f: continue
+
+            if ("fill" in f or "keyword" in f
+                    or (text.startswith(self.question_prefixes) and "?" in text)
+                    or (":" in text and len(text) < label_max_len and any(has_fill[i+1:i+1+lookahead]))):
+                exercise_indices.append(i)
+        return exercise_indices
+
+
+EXERCISE_ENGINE = ExerciseRules()
+
+
+def classic_clean(data, cta_text=DEFAULT_CTA, metrics=None, engine=EXERCISE_ENGINE, doc_cache=None):
+    """Reemplaza las líneas de ejercicio (____, ...., ----) por un CTA estático."""
+    doc = load_docx(data, metrics, doc_cache)
+    with timed(metrics, "clean"):
+        for p in doc.paragraphs:
+            if "cta" in engine.scan(p.text): p.text = cta_text
+    return save_docx(doc, metrics)
+
+
+def find_exercise_indices(texts, engine=EXERCISE_ENGINE):
+    """Índices de los párrafos (por texto) que pertenecen a un ejercicio."""
+    return engine.find_exercises(texts)
+
+
+def group_blocks(exercise_indices, max_gap=2):
+    """Agrupa índices consecutivos (separados como mucho por `max_gap`) en bloques."""
+    blocks = []
+    if exercise_indices:
+        current_block = [exercise_indices[0]]
+        for idx in exercise_indices[1:]:
+            if idx - current_block[-1] <= max_gap:
+                current_block.append(idx)
+            else:
+                blocks.append(current_block)
+                current_block = [idx]
+        blocks.append(current_block)
+    return blocks
+
+
+def adapt_workbook(data, kindle_prompt, call, executor, journal=None, on_block=None, metrics=None,
+                   engine=EXERCISE_ENGINE, doc_cache=None, dedup=False):
+    """Convierte los bloques de ejercicios en narrativa con el modelo.
+
+    `call(prompt, system=kindle_prompt)` devuelve el texto del modelo o "[ERROR ...]". `on_block(done, total,
+    índice, respuesta)` se invoca al terminar cada bloque; `índice` es el número del bloque en
+    el manuscrito (con `dedup`, el de su primera aparición). Devuelve (bytes del .docx,
+    estadísticas); si no hay bloques, los bytes son None. Con `dedup` los bloques repetidos
+    (salvo espacios y mayúsculas) se adaptan una vez y todos reciben la misma narrativa.
+    """
+    doc = load_docx(data, metrics, doc_cache)
+    # Todas las ediciones se encolan y se aplican juntas al final
+    edits = EditBuffer(doc)
+
+    # PASO 0: Clasificación en una pasada y Limpieza Nuclear Segura (borrados encolados)
+    with timed(metrics, "detect"):
+        doc_paras, texts, flags = [], [], []
+        for p in doc.paragraphs:
+            text = p.text
+            f = engine.scan(text)
+            if "boilerplate" in f:
+                edits.delete(p)
+            else:
+                doc_paras.append(p); texts.append(text); flags.append(f)
+
+        # PASO 1 y 2: Identificar los párrafos de ejercicio y agruparlos en bloques
+        blocks = group_blocks(engine.find_exercises(texts, flags))
+    stats = {"blocks": len(blocks), "resumed": 0, "duplicates": 0}
+    if not blocks: return None, stats
+
+    # PASO 3: Adaptar bloques (en orden natural: las ediciones van a referencias estables)
+    block_texts = [(b, "\n".join([texts[i].strip() for i in block if texts[i].strip()]))
+                   for b, block in enumerate(blocks)]
+    unique, copies = group_duplicates(block_texts) if dedup else (block_texts, {})
+    stats["duplicates"] = len(blocks) - len(unique)
+    prompts = [f"BLOQUE COMPLETO A ADAPTAR:\n{block_text}" for _, block_text in unique]
+    fn = lambda prompt: call(prompt, system=kindle_prompt)
+    block_keys = [content_hash(block_text)[:16] for _, block_text in unique]
+    # El executor numera las peticiones; los mensajes por bloque necesitan su número en el manuscrito
+    progress = on_block and (lambda done, total, idx, res: on_block(done, total, unique[idx][0], res))
+
+    with timed(metrics, "dispatch"):
+        if journal is not None:
+            results, stats["resumed"] = map_with_journal(executor, fn, prompts, block_keys, journal,
+                                                         on_progress=progress)
+        else:
+            results = executor.map(fn, prompts, on_progress=progress)
+    results = fan_out({b: res for (b, _), res in zip(unique, results)}, copies)
+    if metrics is not None and dedup:
+        metrics.incr("duplicate_items", stats["duplicates"])
+        metrics.incr("dedup_calls_saved", stats["duplicates"])
+
+    with timed(metrics, "apply_edits"):
+        for b, block in enumerate(blocks):
+            res = results.get(b)
+            if res is None or "[ERROR" in res: continue
+            # Pegar la narrativa final en el primer párrafo del bloque y borrar el resto
+            edits.merge([doc_paras[i] for i in block], clean_markdown(res))
+        edits.apply()
+    return save_docx(doc, metrics), stats
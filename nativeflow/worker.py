@@ -0,0 +1,194 @@
+"""Procesos trabajadores de la cola: ejecutan auditorías, reescrituras y adaptaciones.
+
+La interfaz arranca los suyos al encolar el primer trabajo; también se pueden lanzar
+aparte (p. ej. en otra máquina que comparta el directorio de caché):
+
+    GOOGLE_API_KEY=... python -m nativeflow.worker --processes 2 --threads 4
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+from .cache import ResponseCache
+from .jobqueue import JobQueue, SharedRateLimiter
+from .journal import JobJournal, content_hash
+from .llm import DEFAULT_WORKERS, InstructedModels, LLMError, LLMExecutor, call_model, gemini_model
+from .metrics import Metrics
+
+MODEL_NAME = "models/gemini-2.5-pro"
+HEARTBEAT_SECONDS = 2.0
+
+
+def load_factory(spec):
+    """Resuelve "módulo:función", la fábrica del modelo (p. ej. benchmarks.stub_model:StubModel).
+
+    Se llama como `fábrica(nombre, api_key=..., system_instruction=...)`.
+    """
+    module, func = spec.split(":")
+    return getattr(importlib.import_module(module), func)
+
+
+# Cada tipo de trabajo: fn(job, data, call, executor, report, metrics, make_call) -> (nombre, bytes, stats)
+# `report(done, total, fase)` anota el avance; `make_call(modelo)` da la llamada de otro modelo.
+def run_audit(job, data, call, executor, report, metrics, make_call):
+    from .audit import audit_manuscript
+    from .fingerprints import FingerprintStore
+    from .prescreen import Cascade, HeuristicScreen
+    opts = job["options"]
+    cascade = None
+    if opts.get("heuristic") or opts.get("screen_model"):
+        cascade = Cascade(HeuristicScreen() if opts.get("heuristic") else None,
+                          make_call(opts["screen_model"]) if opts.get("screen_model") else None)
+    fingerprints = FingerprintStore(opts["settings"], job["filename"]) if opts.get("diff_audit") else None
+    report_bytes, stats = audit_manuscript(data, opts["prompt"], call, executor, batch=opts.get("batch", True),
+                                           max_chars=opts.get("max_chars", 6000),
+                                           journal=JobJournal("audit", content_hash(data), opts["settings"]),
+                                           on_progress=report, metrics=metrics, fingerprints=fingerprints,
+                                           cascade=cascade, dedup=opts.get("dedup", False))
+    return "Reporte_Auditoria_Pro.docx", report_bytes, stats
+
+
+def run_rewrite(job, data, call, executor, report, metrics, make_call):
+    from .rewrite import rewrite_manuscript
+    opts = job["options"]
+    rewritten, stats = rewrite_manuscript(data, opts["prompt"], call, executor,
+                                          journal=JobJournal("rewrite", content_hash(data), opts["prompt"]),
+                                          on_progress=lambda d, t, i, r: report(d, t, "párrafos"), metrics=metrics,
+                                          dedup=opts.get("dedup", False),
+                                          overrides={int(k): v for k, v in opts.get("overrides", {}).items()})
+    return "Libro_Corregido_Nativo.docx", rewritten, stats
+
+
+def run_adapt(job, data, call, executor, report, metrics, make_call):
+    from .workbook import adapt_workbook
+    opts = job["options"]
+    adapted, stats = adapt_workbook(data, opts["prompt"], call, executor,
+                                    journal=JobJournal("adapt", content_hash(data), opts["prompt"]),
+                                    on_block=lambda d, t, i, r: report(d, t, "bloques"), metrics=metrics,
+                                    dedup=opts.get("dedup", False))
+    return "eBook_Adaptado.docx", adapted, stats
+
+
+JOB_KINDS = {"audit": run_audit, "rewrite": run_rewrite, "adapt": run_adapt}
+
+
+class Worker:
+    """Un proceso trabajador: toma trabajos de la cola hasta que se le pide parar."""
+
+    def __init__(self, api_key=None, threads=DEFAULT_WORKERS, directory=None, model_factory=None, poll=2.0):
+        self.api_key = api_key
+        self.threads = threads
+        self.poll = poll
+        self.queue = JobQueue(directory)
+        self.limiter = SharedRateLimiter(self.queue.path)
+        self.cache = None       # ResponseCache, se abre con el primer trabajo que la use
+        self.factory = model_factory or gemini_model
+        self.models = {}        # nombre -> InstructedModels (un modelo por prompt, creado una vez)
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def make_call(self, model_name, metrics, errors, cache=None):
+        if model_name not in self.models:
+            self.models[model_name] = InstructedModels(
+                lambda system: self.factory(model_name, api_key=self.api_key, system_instruction=system))
+        models = self.models[model_name]
+
+        def call(prompt, system=None):
+            try:
+                return call_model(models.get(system), prompt, limiter=self.limiter, cache=cache, metrics=metrics,
+                                  system=system)
+            except LLMError as e:
+                errors.append(str(e))
+                return "[ERROR API]"
+        return call
+
+    def execute(self, job):
+        job_id, opts = job["id"], job["options"]
+        metrics = Metrics(f"queue_{job['kind']}_{job_id}")
+        errors, cancel = [], threading.Event()
+        state = {"done": 0, "total": 0, "phase": "", "beat": 0.0}
+        # Como en la interfaz, la caché de respuestas es opcional por trabajo
+        if opts.get("use_cache") and self.cache is None: self.cache = ResponseCache()
+        cache = self.cache if opts.get("use_cache") else None
+
+        def report(done, total, phase=""):
+            state.update(done=done, total=total, phase=phase)
+
+        def on_tick():
+            # Latido + avance + cancelación pedida desde la interfaz, como mucho cada HEARTBEAT_SECONDS
+            now = time.monotonic()
+            if now - state["beat"] < HEARTBEAT_SECONDS: return
+            state["beat"] = now
+            if self.queue.progress(job_id, state["done"], state["total"], state["phase"]): cancel.set()
+
+        executor = LLMExecutor(self.threads, cancel=cancel, on_tick=on_tick, tick=0.5)
+        try:
+            call = self.make_call(opts.get("model_name", MODEL_NAME), metrics, errors, cache)
+            name, data, stats = JOB_KINDS[job["kind"]](job, self.queue.input_data(job_id), call, executor, report,
+                                                       metrics, lambda model: self.make_call(model, metrics, errors, cache))
+            stats = dict(stats, api_errors=list(dict.fromkeys(errors))[:5], metrics=metrics.summary())
+            stem = os.path.splitext(os.path.basename(job["filename"]))[0]
+            self.queue.progress(job_id, state["done"], state["total"], state["phase"])
+            self.queue.finish(job_id, f"{stem}_{name}", data, stats=stats, cancelled=executor.cancelled)
+        except Exception as e:
+            self.queue.finish(job_id, error=f"{type(e).__name__}: {e}")
+        finally:
+            metrics.export()
+
+    def run(self, stop=None, once=False):
+        """Bucle principal; con `once` termina cuando la cola queda vacía."""
+        while stop is None or not stop.is_set():
+            self.queue.requeue_stale()
+            job = self.queue.claim(self.name)
+            if job is None:
+                if once: return
+                time.sleep(self.poll)
+                continue
+            self.execute(job)
+
+
+def run_worker(stop=None, factory_spec=None, **kwargs):
+    # Punto de entrada de cada proceso (con "spawn" todo lo que recibe debe ser serializable)
+    factory = load_factory(factory_spec) if factory_spec else None
+    Worker(model_factory=factory, **kwargs).run(stop)
+
+
+def start_workers(processes, api_key=None, threads=DEFAULT_WORKERS, directory=None, factory_spec=None):
+    """Arranca `processes` trabajadores en segundo plano; devuelve (procesos, evento de parada)."""
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    procs = [ctx.Process(target=run_worker, daemon=True, name=f"nativeflow-worker-{i}",
+                         kwargs=dict(stop=stop, factory_spec=factory_spec, api_key=api_key, threads=threads,
+                                     directory=directory))
+             for i in range(processes)]
+    for proc in procs: proc.start()
+    return procs, stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nativeflow.worker", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=DEFAULT_WORKERS, help="Llamadas simultáneas por proceso")
+    parser.add_argument("--queue-dir", help="Directorio de la cola (por defecto, el de la caché)")
+    parser.add_argument("--model-factory", help='"módulo:función" que crea el modelo (por defecto, Gemini)')
+    args = parser.parse_args(argv)
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key and not args.model_factory:
+        print("Falta GOOGLE_API_KEY en el entorno", file=sys.stderr)
+        return 1
+    procs, stop = start_workers(args.processes, api_key, args.threads, args.queue_dir, args.model_factory)
+    try:
+        for proc in procs: proc.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for proc in procs: proc.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+from nativeflow.cache import ResponseCache
+
+
+def test_eviction_drops_least_recently_used_and_keeps_the_size_limit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"), max_bytes=300)
+    for i in range(3): cache.put(f"k{i}", "x" * 100)
+    cache.get("k0")                 # k1 pasa a ser la menos usada
+    cache.put("k3", "x" * 100)
+    assert cache.get("k1") is None
+    assert all(cache.get(k) for k in ("k0", "k2", "k3"))
+    assert cache.stats()["bytes"] == cache.total == 300
+
+
+def test_replacing_a_key_does_not_count_its_size_twice(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"), max_bytes=300)
+    for _ in range(5): cache.put("k", "x" * 100)
+    cache.put("otra", "x" * 100)
+    assert cache.stats() == {"entries": 2, "bytes": 200, "hits": 0, "misses": 0}
+
+
+def test_total_is_loaded_from_an_existing_file(tmp_path):
+    ResponseCache(str(tmp_path / "c.sqlite")).put("k", "x" * 100)
+    assert ResponseCache(str(tmp_path / "c.sqlite")).total == 100
@@ -0,0 +1,26 @@
+from io import BytesIO
+
+import pytest
+
+from nativeflow.epub_builder import shrink_image
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(fmt, size=(400, 300), frames=1):
+    images = [Image.new("RGB", size, (40 * k, 90, 200)).convert("P") for k in range(frames)]
+    out = BytesIO()
+    images[0].save(out, fmt, **({"save_all": True, "append_images": images[1:]} if frames > 1 else {}))
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("frames", [1, 3])
+def test_gif_is_passed_through(frames):
+    data = encode("GIF", frames=frames)
+    assert shrink_image(data, "image/gif", 100) == (data, "image/gif")
+
+
+def test_png_is_resized_as_png():
+    data, media_type = shrink_image(encode("PNG"), "image/png", 100)
+    assert media_type == "image/png"
+    with Image.open(BytesIO(data)) as im: assert (im.format, im.width) == ("PNG", 100)
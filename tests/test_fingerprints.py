@@ -0,0 +1,25 @@
+from nativeflow.fingerprints import FingerprintStore, paragraph_hash
+
+TEXT = "Había una vez un monstruo azul que respiraba despacio cuando llegaba la noche."
+
+
+def test_verdicts_are_shared_across_file_names(tmp_path):
+    digest = paragraph_hash(TEXT)
+    FingerprintStore("prompt", "libro.docx", directory=tmp_path).update([(1, digest)], {digest: "ISSUE: tono"})
+    renamed = FingerprintStore("prompt", "libro (2).docx", directory=tmp_path)
+    assert renamed.get(digest) == "ISSUE: tono"
+    assert renamed.paragraphs == []     # El resumen de cambios sigue siendo por archivo
+    assert FingerprintStore("prompt", "libro.docx", directory=tmp_path).paragraphs == [(1, digest)]
+
+
+def test_verdicts_depend_on_settings(tmp_path):
+    digest = paragraph_hash(TEXT)
+    FingerprintStore("prompt", "libro.docx", directory=tmp_path).update([(1, digest)], {digest: "CLEAN"})
+    assert digest not in FingerprintStore("otro prompt", "libro.docx", directory=tmp_path)
+
+
+def test_concurrent_stores_keep_each_others_verdicts(tmp_path):
+    a, b = FingerprintStore("prompt", "a.docx", directory=tmp_path), FingerprintStore("prompt", "b.docx", directory=tmp_path)
+    a.update([], {"h1": "CLEAN"})
+    b.update([], {"h2": "CLEAN"})
+    assert {"h1", "h2"} <= set(FingerprintStore("prompt", directory=tmp_path).verdicts)
@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from docx import Document
+from docx.oxml import OxmlElement
+
+from nativeflow.layout import kdp_layout
+
+
+def manuscript(paragraphs, heading_style=True, empty_runs=False):
+    doc = Document()
+    if not heading_style:
+        style = doc.styles['Heading 1'].element
+        style.getparent().remove(style)
+    for text in paragraphs:
+        if not empty_runs:
+            doc.add_paragraph(text)
+            continue
+        # Un run con <w:t/> vacío (t.text es None) entre dos mitades del texto, como los que deja Word
+        p = doc.add_paragraph(text[:len(text) // 2])
+        p.add_run()._r.append(OxmlElement('w:t'))
+        p.add_run(text[len(text) // 2:])
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue()
+
+
+BODY = ["Había una vez un monstruo azul que respiraba despacio cuando llegaba la noche.",
+        "Contaba hasta diez y la calma volvía a su pecho poco a poco, sin prisa."]
+
+
+BROKEN = ["Había una vez un monstruo azul que respiraba", "despacio cuando llegaba la noche."]
+
+
+def texts(data):
+    return [p.text.replace("\u00A0", " ") for p in Document(BytesIO(data)).paragraphs]
+
+
+def test_kdp_layout_without_heading_1_style_stitches_broken_lines():
+    assert texts(kdp_layout(manuscript(BROKEN, heading_style=False))) == [" ".join(BROKEN)]
+
+
+def test_kdp_layout_without_heading_1_style_keeps_lines_without_reconstruct():
+    assert texts(kdp_layout(manuscript(BROKEN, heading_style=False), reconstruct=False)) == BROKEN
+
+
+def test_kdp_layout_with_empty_runs():
+    data = kdp_layout(manuscript(["Capítulo 1"] + BODY, empty_runs=True), reconstruct=False, soft_hyphens=True, lang="es")
+    assert [t.replace("\u00AD", "") for t in texts(data)] == ["\nCAPÍTULO 1"] + BODY
+
+
+def test_kdp_layout_turns_chapter_lines_into_heading_1():
+    result = Document(BytesIO(kdp_layout(manuscript(["Capítulo 1"] + BODY), reconstruct=False)))
+    assert result.paragraphs[0].style.name == "Heading 1"
+    assert result.paragraphs[0].text == "\nCAPÍTULO 1"
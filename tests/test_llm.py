@@ -0,0 +1,25 @@
+import threading
+import time
+
+import pytest
+
+from nativeflow.llm import LLMExecutor
+
+
+def test_in_flight_results_are_reported_when_the_caller_is_interrupted():
+    calls, reported, lock = [], [], threading.Lock()
+
+    def fn(item):
+        with lock: calls.append(item)
+        time.sleep(0 if item == 0 else 0.2)     # El primero termina mientras los demás siguen en curso
+        return f"r{item}"
+
+    def on_progress(done, total, idx, result):
+        reported.append(idx)
+        if len(reported) == 1: raise KeyboardInterrupt    # Como el rerun de Streamlit al pulsar "Cancelar"
+
+    with pytest.raises(KeyboardInterrupt):
+        LLMExecutor(4).map(fn, range(8), on_progress=on_progress)
+    # Todo lo que llegó al modelo (y se facturó) pasa por on_progress; lo que no empezó, no
+    assert sorted(reported) == sorted(calls)
+    assert len(calls) < 8
@@ -0,0 +1,29 @@
+from io import BytesIO
+
+from docx import Document
+
+from nativeflow.llm import LLMExecutor
+from nativeflow.rewrite import rewrite_manuscript
+
+
+def manuscript(paragraphs):
+    doc = Document()
+    for text in paragraphs: doc.add_paragraph(text)
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue()
+
+
+def rewrite(paragraphs, dedup):
+    data, _ = rewrite_manuscript(manuscript(paragraphs), "Reescribe.", lambda prompt, system=None: "Texto reescrito.",
+                                 LLMExecutor(2), dedup=dedup)
+    return [p.text for p in Document(BytesIO(data)).paragraphs]
+
+
+def test_model_text_is_kept_for_uppercase_paragraphs():
+    assert rewrite(["RESPIRA HONDO Y CUENTA HASTA DIEZ"], dedup=False) == ["Texto reescrito."]
+    assert rewrite(["RESPIRA HONDO Y CUENTA HASTA DIEZ"] * 2, dedup=True) == ["Texto reescrito."] * 2
+
+
+def test_uppercase_copy_of_lowercase_representative_is_uppercased():
+    result = rewrite(["Respira hondo y cuenta hasta diez", "RESPIRA HONDO Y CUENTA HASTA DIEZ"], dedup=True)
+    assert result == ["Texto reescrito.", "TEXTO REESCRITO."]
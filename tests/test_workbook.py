@@ -0,0 +1,29 @@
+from io import BytesIO
+
+from docx import Document
+
+from nativeflow.llm import LLMExecutor
+from nativeflow.workbook import adapt_workbook
+
+PROSE = "El monstruo azul respiraba despacio mientras la lluvia caía sobre el jardín de la casa."
+
+
+def workbook(questions):
+    doc = Document()
+    for question in questions:
+        for _ in range(3): doc.add_paragraph(PROSE)     # Separa los bloques (más de dos párrafos)
+        for text in ("Ejercicio: escribe tu respuesta", "Querido ____________________", question,
+                     "__________________________"):
+            doc.add_paragraph(text)
+    doc.add_paragraph(PROSE)
+    bio = BytesIO(); doc.save(bio)
+    return bio.getvalue()
+
+
+def test_on_block_reports_manuscript_block_numbers_with_dedup():
+    reported = []
+    data = workbook(["¿Cómo se siente tu monstruo hoy?", "¿Cómo se siente tu monstruo hoy?", "¿Qué color tiene tu calma?"])
+    _, stats = adapt_workbook(data, "Adapta.", lambda prompt, system=None: "Narrativa.", LLMExecutor(2),
+                              on_block=lambda done, total, idx, res: reported.append(idx), dedup=True)
+    assert (stats["blocks"], stats["duplicates"]) == (3, 1)
+    assert sorted(reported) == [0, 2]